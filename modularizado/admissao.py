@@ -0,0 +1,110 @@
+"""
+Módulo de controle de admissão para requisições que usam o LLM.
+Limita as gerações simultâneas, mantém uma fila de espera com tamanho e prazo máximos
+e recusa (429 + Retry-After) quando o servidor está saturado, em vez de enfileirar sem limite.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from config import ADMISSAO_LIMITE, ADMISSAO_FILA, ADMISSAO_PRAZO_FILA
+from metricas import registro
+
+
+class AdmissaoRecusada(Exception):
+    """
+    Requisição recusada pelo controle de admissão.
+
+    Atributos:
+        motivo: "fila_cheia" ou "prazo_fila"
+        retry_after: Sugestão de espera, em segundos, para o cliente tentar de novo
+    """
+
+    def __init__(self, motivo: str, retry_after: int) -> None:
+        super().__init__(f"Servidor ocupado ({motivo}). Tente novamente em {retry_after}s.")
+        self.motivo = motivo
+        self.retry_after = retry_after
+
+
+class ControleAdmissao:
+    """
+    Semáforo com fila limitada: até `limite` requisições ativas, até `fila_max` esperando
+    e no máximo `prazo_fila` segundos de espera por vaga.
+    """
+
+    def __init__(self, limite: int = ADMISSAO_LIMITE, fila_max: int = ADMISSAO_FILA,
+                 prazo_fila: float = ADMISSAO_PRAZO_FILA, nome: str = "llm") -> None:
+        self.limite = max(1, limite)
+        self.fila_max = max(0, fila_max)
+        self.prazo_fila = prazo_fila
+        self.ativos = 0
+        self.na_fila = 0
+        self._cond = threading.Condition()
+        # Média móvel do tempo de ocupação de uma vaga (para estimar o Retry-After)
+        self._tempo_medio = 5.0
+
+        rotulos = {"limitador": nome}
+        registro.medidor("admissao_ativos", "Requisições LLM em execução").observar(lambda: self.ativos, rotulos)
+        registro.medidor("admissao_fila", "Requisições LLM esperando vaga").observar(lambda: self.na_fila, rotulos)
+        registro.medidor("admissao_limite", "Limite de requisições LLM simultâneas").definir(self.limite, rotulos)
+        self._recusadas = registro.contador("admissao_recusadas_total", "Requisições recusadas pelo controle de admissão")
+        self._admitidas = registro.contador("admissao_admitidas_total", "Requisições admitidas pelo controle de admissão")
+        self._rotulos = rotulos
+
+    def _estimar_retry_after(self) -> int:
+        ondas = (self.na_fila + 1) / self.limite
+        return max(1, min(60, math.ceil(self._tempo_medio * ondas)))
+
+    def adquirir(self) -> None:
+        """
+        Ocupa uma vaga, esperando na fila se necessário.
+
+        Raises:
+            AdmissaoRecusada: fila cheia ou prazo de espera esgotado
+        """
+        with self._cond:
+            if self.ativos < self.limite and self.na_fila == 0:
+                self.ativos += 1
+                self._admitidas.incrementar(rotulos=self._rotulos)
+                return
+
+            if self.na_fila >= self.fila_max:
+                self._recusadas.incrementar(rotulos={**self._rotulos, "motivo": "fila_cheia"})
+                raise AdmissaoRecusada("fila_cheia", self._estimar_retry_after())
+
+            self.na_fila += 1
+            try:
+                conseguiu = self._cond.wait_for(lambda: self.ativos < self.limite, timeout=self.prazo_fila)
+            finally:
+                self.na_fila -= 1
+
+            if not conseguiu:
+                self._recusadas.incrementar(rotulos={**self._rotulos, "motivo": "prazo_fila"})
+                raise AdmissaoRecusada("prazo_fila", self._estimar_retry_after())
+
+            self.ativos += 1
+            self._admitidas.incrementar(rotulos=self._rotulos)
+
+    def liberar(self, duracao: float = None) -> None:
+        with self._cond:
+            self.ativos -= 1
+            if duracao is not None:
+                self._tempo_medio = 0.8 * self._tempo_medio + 0.2 * duracao
+            self._cond.notify()
+
+    @contextmanager
+    def vaga(self) -> Iterator[None]:
+        """
+        Uso: `with admissao_llm.vaga(): ...` (libera a vaga mesmo se houver erro).
+        """
+        self.adquirir()
+        inicio = time.monotonic()
+        try:
+            yield
+        finally:
+            self.liberar(time.monotonic() - inicio)
+
+
+admissao_llm = ControleAdmissao()
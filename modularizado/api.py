@@ -1,31 +1,46 @@
-from typing import Optional, Dict
+from typing import Optional, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Tuple
 
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from pydantic import BaseModel, ValidationError
 from dotenv import load_dotenv
 import os
 import re
+import asyncio
+import itertools
 import json
+import time
 import unicodedata
-import google.generativeai as genai
-from google.cloud import speech
-from groq import Groq
 
-from ingesta import processar_arquivos
-from rag import buscar_contexto
+from ingesta import atualizar_indice
+from banco_dados import obter_colecao_global
+from rag import buscar_trechos_lote, buscar_trechos_multi
 from verificador_base_fixa import buscar_resposta_fixa
 from resposta_ia import stream_resposta
 from sessoes import session_store
-from config import GROQ_API_KEY, MODELO_IA
+from llm_gateway import gateway
 from google_maps import gerar_links_orgaos
-from contexto_conversa import formatar_historico_conversa
+from localidades import carregar_municipios, resolver_localidade
+from metricas import registro
+from instrumentacao import TemposTurno, medir_etapa
+from montagem_prompt import montar_contexto_prompt
+from compressao_contexto import comprimir_para_pergunta
+from config import COMPRESSAO_CONTEXTO, LOTE_MAX_PERGUNTAS, LOTE_PARALELISMO, MUNICIPIOS_MINIMO
+from admissao import admissao_llm, AdmissaoRecusada
+from etapas import GrafoEtapas
+from executores import pool, PoolSaturado
+from fluxo_resposta import AcumuladorResposta
+from logs import obter_logger, MiddlewareIdRequisicao
+from transcricao import (
+    ErroTranscricao, FormatoAudio, formato_do_mime, ler_upload, transcrever, transcrever_stream, verificar_credenciais,
+)
+from aquecimento import aquecer, prontidao
 
 
 load_dotenv()
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-client_groq = Groq(api_key=GROQ_API_KEY)
+
+logger = obter_logger("api")
 
 
 class Perfil(BaseModel):
@@ -47,6 +62,16 @@ class ChatRequest(BaseModel):
     transcricao: Optional[str] = None
 
 
+class ItemLote(BaseModel):
+    pergunta: str
+    perfil: Optional[Perfil] = None
+    id: Optional[str] = None          # identificador do parceiro, devolvido na linha da resposta
+
+
+class LoteRequest(BaseModel):
+    perguntas: List[ItemLote]
+
+
 class SessionRequest(BaseModel):
     session_id: str
     perfil: Perfil
@@ -99,29 +124,9 @@ def tentar_preencher_perfil_livre(texto: str) -> Dict:
         elif "idos" in texto_lower:
             perfil["papel"] = "idoso"
 
-        estados = [
-            "acre", "alagoas", "amapa", "amazonas", "bahia", "ceara", "distrito federal", "espirito santo", "goias",
-            "maranhao", "mato grosso", "mato grosso do sul", "minas gerais", "para", "paraiba", "parana",
-            "pernambuco", "piaui", "rio de janeiro", "rio grande do norte", "rio grande do sul", "rondonia",
-            "roraima", "santa catarina", "sao paulo", "sergipe", "tocantins"
-        ]
-        siglas = ["ac", "al", "ap", "am", "ba", "ce", "df", "es", "go", "ma", "mt", "ms", "mg", "pa", "pb", "pr",
-                  "pe", "pi", "rj", "rn", "rs", "ro", "rr", "sc", "sp", "se", "to"]
-        
-        # Normaliza brasilia/brasília para distrito federal
-        if "brasilia" in texto_lower or "brasília" in texto_lower:
-            perfil["localidade"] = "distrito federal"
-        else:
-            for estado in estados:
-                if estado in texto_lower:
-                    perfil["localidade"] = estado
-                    break
-            if "localidade" not in perfil:
-                tokens = [t.strip(",. ").lower() for t in texto.split()]
-                for t in tokens:
-                    if t in siglas:
-                        perfil["localidade"] = t
-                        break
+        localidade = resolver_localidade(texto)
+        if localidade.uf:
+            perfil["localidade"] = localidade.descricao()
 
         if "problema" not in perfil or not perfil.get("problema"):
             if len(partes) >= 2:
@@ -188,17 +193,15 @@ def extrair_perfil_llm(texto: str) -> Dict:
     Texto: {texto}
     """
     try:
-        completion = client_groq.chat.completions.create(
-            model=MODELO_IA,
-            messages=[{"role": "user", "content": prompt}],
+        content = gateway.completar(
+            [{"role": "user", "content": prompt}],
             temperature=0.1,
             top_p=0.1,
-        )
-        content = completion.choices[0].message.content or "{}"
+        ) or "{}"
         data = json.loads(content)
         return {k: v for k, v in data.items() if v}
     except Exception as e:
-        print(f"[perfil_llm][erro] {type(e).__name__}: {e}")
+        logger.warning("falha na extração de perfil por LLM", extra={"erro": f"{type(e).__name__}: {e}"})
         return {}
 
 
@@ -221,13 +224,11 @@ Responda APENAS com uma palavra: "titular" ou "responsavel"
 Se não conseguir determinar com certeza, responda "titular".
 """
     try:
-        completion = client_groq.chat.completions.create(
-            model=MODELO_IA,
-            messages=[{"role": "user", "content": prompt}],
+        content = gateway.completar(
+            [{"role": "user", "content": prompt}],
             temperature=0.1,
             top_p=0.1,
-        )
-        content = completion.choices[0].message.content or "titular"
+        ) or "titular"
         content = content.strip().lower()
         # Remove possíveis espaços ou pontuação
         content = re.sub(r'[^\w]', '', content)
@@ -235,11 +236,16 @@ Se não conseguir determinar com certeza, responda "titular".
             return "responsavel"
         return "titular"
     except Exception as e:
-        print(f"[detectar_papel_llm][erro] {type(e).__name__}: {e}")
+        logger.warning("falha na detecção de papel por LLM", extra={"erro": f"{type(e).__name__}: {e}"})
         return None
 
 
-def preencher_resposta_curta(pergunta: str, perfil: Dict) -> Dict:
+def preencher_resposta_curta(pergunta: str, perfil: Dict, usar_llm: bool = True) -> Dict:
+    """
+    Preenche campos simples do perfil (nome, papel, localidade) a partir de respostas curtas.
+    Com usar_llm=False não chama detectar_papel_llm (o chat faz essa chamada depois da extração do
+    perfil por LLM, só se ela não trouxer o papel).
+    """
     texto = pergunta.strip()
     lower = texto.lower()
 
@@ -265,24 +271,16 @@ def preencher_resposta_curta(pergunta: str, perfil: Dict) -> Dict:
             perfil["papel"] = "responsavel"
         elif any(ind in lower for ind in indicadores_titular):
             perfil["papel"] = "titular"
-        else:
+        elif usar_llm:
             # Se não detectou, usa LLM para detectar
             papel_detectado = detectar_papel_llm(texto)
             if papel_detectado:
                 perfil["papel"] = papel_detectado
 
     if not perfil.get("localidade"):
-        # Normaliza brasilia/brasília para distrito federal
-        if "brasilia" in lower or "brasília" in lower:
-            perfil["localidade"] = "distrito federal"
-        else:
-            siglas = ["ac", "al", "ap", "am", "ba", "ce", "df", "es", "go", "ma", "mt", "ms",
-                      "mg", "pa", "pb", "pr", "pe", "pi", "rj", "rn", "rs", "ro", "rr", "sc", "sp", "se", "to"]
-            tokens = [t.strip(",. ").lower() for t in texto.split()]
-            for t in tokens:
-                if t in siglas:
-                    perfil["localidade"] = t
-                    break
+        localidade = resolver_localidade(texto)
+        if localidade.uf:
+            perfil["localidade"] = localidade.descricao()
 
     return perfil
 
@@ -350,6 +348,127 @@ def classificar_subtrilha(texto: str) -> Optional[str]:
     return None
 
 
+CAMPOS_PERFIL = ["nome", "genero", "papel", "idade", "problema", "localidade"]
+
+PEDIDOS_LOCALIZACAO = [
+    "me manda", "manda a", "envie a", "mostra a", "me mostra",
+    "localização", "localizacao", "endereço", "endereco",
+    "próximo", "proximo", "mais próximo", "perto", "mais perto",
+    "onde fica", "onde está", "qual endereço", "qual o endereço"
+]
+PEDIDOS_LOCALIZACAO_NORM = [
+    unicodedata.normalize("NFKD", termo.lower()).encode("ascii", "ignore").decode("ascii")
+    for termo in PEDIDOS_LOCALIZACAO
+] + ["localiza", "localiz", "locaz", "loca", "onde fica", "onde esta", "onde ta"]
+
+
+def mesclar_perfil_llm(perfil: Dict, llm_extra: Dict, papel_llm: Optional[str] = None) -> Dict:
+    """
+    Retorna uma cópia do perfil com os campos extraídos pelo LLM, sem sobrescrever o que já existe.
+    O papel detectado por detectar_papel_llm só é usado se a extração não trouxe papel.
+    """
+    mesclado = dict(perfil)
+    for k, v in (llm_extra or {}).items():
+        if v and not mesclado.get(k):
+            mesclado[k] = v
+    if papel_llm and not mesclado.get("papel"):
+        mesclado["papel"] = papel_llm
+    return mesclado
+
+
+MAX_CARACTERES_HISTORICO_BUSCA = 300
+
+
+def montar_query_busca(pergunta: str, perfil_dict: Dict, mensagens_recentes: list) -> str:
+    # Monta query de busca melhorada combinando pergunta atual com contexto da conversa
+    query_busca = pergunta
+
+    # Se a pergunta atual parece ser uma resposta (curta, sem verbo de ação),
+    # combina com o intent/eixo anterior ou histórico recente
+    palavras_pergunta = pergunta.lower().strip().split()
+    historico_para_busca = " ".join(mensagens_recentes)
+    # Só o fim do histórico: um texto longo dilui o embedding e custa mais para calcular
+    if len(historico_para_busca) > MAX_CARACTERES_HISTORICO_BUSCA:
+        historico_para_busca = historico_para_busca[-MAX_CARACTERES_HISTORICO_BUSCA:].split(" ", 1)[-1]
+
+    # Se a pergunta é muito curta (1-2 palavras) e há um intent/eixo salvo ou histórico,
+    # provavelmente é uma resposta a uma pergunta anterior
+    if len(palavras_pergunta) <= 2 and (perfil_dict.get("intent") or perfil_dict.get("eixo") or historico_para_busca):
+        termos_contexto = []
+        if perfil_dict.get("eixo"):
+            termos_contexto.append(perfil_dict.get("eixo"))
+        if perfil_dict.get("intent") and len(perfil_dict.get("intent", "").split()) > 2:
+            termos_contexto.append(perfil_dict.get("intent"))
+        if historico_para_busca:
+            termos_contexto.append(historico_para_busca)
+
+        if termos_contexto:
+            query_busca = f"{' '.join(termos_contexto)} {pergunta}"
+
+    # Adiciona localidade à busca se disponível
+    localidade = (perfil_dict.get("localidade") or "").lower()
+    if localidade and localidade not in query_busca.lower():
+        query_busca = f"{query_busca} {localidade}"
+
+    return query_busca
+
+
+def montar_consultas_busca(pergunta: str, perfil_dict: Dict, mensagens_recentes: list) -> List[str]:
+    """
+    Variações da consulta buscadas juntas: a query combinada com o contexto da conversa,
+    o eixo do assunto e a pergunta original (antes eram tentativas em sequência).
+    """
+    consultas = [montar_query_busca(pergunta, perfil_dict, mensagens_recentes)]
+    eixo = perfil_dict.get("eixo")
+    if eixo and eixo != "OUTRO":
+        consultas.append(eixo)
+    consultas.append(pergunta)
+    return list(dict.fromkeys(c for c in consultas if c and c.strip()))
+
+
+def buscar_contexto_turno(pergunta: str, perfil_dict: Dict, mensagens_recentes: list,
+                          session_id: Optional[str], tempos: Optional[TemposTurno] = None) -> list:
+    """
+    Busca os trechos do turno em uma única ida ao banco vetorial: embeddings das variações
+    em lote e rankings fundidos por RRF.
+    """
+    consultas = montar_consultas_busca(pergunta, perfil_dict, mensagens_recentes)
+    with medir_etapa("busca", tempos):
+        return buscar_trechos_multi(consultas, session_id=session_id, tempos=tempos)
+
+
+def gerar_links_pedido(pergunta: str, perfil_dict: Dict) -> list:
+    """
+    Gera links do Google Maps APENAS se houver pedido EXPLÍCITO de localização.
+    Não gera links para perguntas gerais como "como tirar cpf".
+    """
+    pergunta_lower = pergunta.lower()
+    pergunta_norm = unicodedata.normalize("NFKD", pergunta_lower).encode("ascii", "ignore").decode("ascii")
+
+    tem_pedido_explicito = any(termo in pergunta_lower for termo in PEDIDOS_LOCALIZACAO)
+    if not tem_pedido_explicito:
+        tem_pedido_explicito = any(termo in pergunta_norm for termo in PEDIDOS_LOCALIZACAO_NORM)
+
+    if not tem_pedido_explicito:
+        return []
+
+    # Combina pergunta com contexto para melhor detecção do órgão
+    pergunta_com_contexto = pergunta
+    if perfil_dict.get("eixo"):
+        pergunta_com_contexto = f"{pergunta} {perfil_dict.get('eixo')}"
+    if perfil_dict.get("intent"):
+        pergunta_com_contexto = f"{pergunta_com_contexto} {perfil_dict.get('intent')}"
+
+    links_maps = gerar_links_orgaos(pergunta_com_contexto, perfil_dict.get("localidade"), forcar_geracao=True)
+
+    # Se não gerou links mas há eixo no perfil, tenta gerar baseado no eixo
+    if not links_maps and perfil_dict.get("eixo"):
+        pergunta_artificial = f"{perfil_dict.get('eixo')} {pergunta}"
+        links_maps = gerar_links_orgaos(pergunta_artificial, perfil_dict.get("localidade"), forcar_geracao=True)
+
+    return links_maps
+
+
 app = FastAPI(title="Assistente Cidadão", version="1.0.0")
 
 app.add_middleware(
@@ -359,69 +478,68 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Define o request_id (X-Request-ID) que aparece em todas as linhas de log da requisição
+app.add_middleware(MiddlewareIdRequisicao)
+
+# Tarefas de fundo da inicialização (referência mantida para não serem coletadas)
+tarefas_inicializacao = set()
+
+
+@app.on_event("startup")
+def verificar_municipios():
+    """
+    Avisa quando o municipios.tsv está incompleto: a API sobe com a lista parcial, mas as cidades
+    que faltam não são reconhecidas no perfil nem nos links do Maps.
+    """
+    total = len(carregar_municipios())
+    if total < MUNICIPIOS_MINIMO:
+        logger.warning(
+            "municipios.tsv incompleto: cidades fora da lista não serão reconhecidas "
+            "(rode python atualizar_municipios.py)",
+            extra={"municipios": total, "minimo": MUNICIPIOS_MINIMO},
+        )
+    else:
+        logger.info("municipios carregados", extra={"municipios": total})
+
 
 # Inicialização automática: processa documentos na inicialização
 @app.on_event("startup")
 async def inicializar_banco_vetorial():
     """
     Inicializa o banco vetorial processando os documentos na pasta documentos/
-    quando o servidor inicia.
+    e aquece o worker. Roda em segundo plano no pool de ingestão: /health responde
+    logo e /ready só passa a responder 200 quando tudo termina.
+    """
+    tarefa = asyncio.create_task(preparar_worker())
+    tarefas_inicializacao.add(tarefa)
+    tarefa.add_done_callback(tarefas_inicializacao.discard)
+
+
+async def preparar_worker():
+    await pool("ingestao").executar(preparar_banco_vetorial)
+    await pool("ingestao").executar(aquecer)
+
+
+def preparar_banco_vetorial():
+    """
+    Um worker só (o que pegar a trava) ingere os documentos numa versão nova do índice;
+    os outros esperam a publicação e passam a ler essa versão.
     """
     try:
-        from banco_dados import colecao_global
-        import os
         from config import PASTA_DOCUMENTOS
-        
-        # Verifica se a pasta de documentos existe
-        if not os.path.exists(PASTA_DOCUMENTOS):
-            print(f"[startup] ⚠️ Pasta de documentos não encontrada: {PASTA_DOCUMENTOS}")
-            os.makedirs(PASTA_DOCUMENTOS, exist_ok=True)
-            print(f"[startup] ✅ Pasta criada: {PASTA_DOCUMENTOS}")
-        
-        # Verifica se a coleção já tem documentos
-        count = colecao_global.count()
-        
-        # Verifica se existe o arquivo doc-info.txt
+
         doc_info_path = os.path.join(PASTA_DOCUMENTOS, "doc-info.txt")
-        arquivo_existe = os.path.exists(doc_info_path)
-        
-        print(f"[startup] Verificando banco vetorial...")
-        print(f"[startup] - Chunks no banco: {count}")
-        print(f"[startup] - Arquivo doc-info.txt existe: {arquivo_existe}")
-        print(f"[startup] - Caminho do arquivo: {doc_info_path}")
-        
-        # FORÇA ingestão sempre que o arquivo existir (garante que doc-info.txt seja processado)
-        if arquivo_existe:
-            if count == 0:
-                print("[startup] 🔄 Banco vetorial vazio. Iniciando ingestão automática...")
-            else:
-                print(f"[startup] 🔄 Banco possui {count} chunks, mas forçando reprocessamento para garantir sincronia...")
-            
-            # Limpa a coleção antes de reprocessar (evita duplicatas)
-            try:
-                # Deleta todos os documentos existentes
-                if count > 0:
-                    todos_ids = colecao_global.get()["ids"]
-                    if todos_ids:
-                        colecao_global.delete(ids=todos_ids)
-                        print(f"[startup] 🗑️ Limpou {len(todos_ids)} chunks antigos")
-            except Exception as e:
-                print(f"[startup] ⚠️ Erro ao limpar coleção (pode ignorar): {e}")
-            
-            # Processa os arquivos
-            processar_arquivos()
-            count_apos = colecao_global.count()
-            if count_apos > 0:
-                print(f"[startup] ✅ Ingestão concluída. {count_apos} chunks no banco vetorial.")
-            else:
-                print(f"[startup] ⚠️ Ingestão executada mas nenhum chunk foi criado. Verifique os arquivos.")
-        else:
-            print(f"[startup] ⚠️ Arquivo doc-info.txt não encontrado em {doc_info_path}")
-            print(f"[startup] ⚠️ Banco vetorial não será populado. Verifique se o arquivo está no repositório.")
-    except Exception as e:
-        print(f"[startup] ❌ Erro ao inicializar banco vetorial: {e}")
-        import traceback
-        traceback.print_exc()
+        if not os.path.exists(doc_info_path):
+            logger.warning("doc-info.txt não encontrado", extra={"doc_info": doc_info_path})
+
+        resultado = atualizar_indice()
+        logger.info(
+            "banco vetorial pronto",
+            extra={"status": resultado["status"], "colecao": resultado.get("colecao"),
+                   "chunks": obter_colecao_global().count()},
+        )
+    except Exception:
+        logger.exception("erro ao inicializar banco vetorial")
         # Não bloqueia o servidor se der erro na ingestão
 
 
@@ -430,10 +548,32 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/ready")
+def ready():
+    """
+    Prontidão para o balanceador: 503 enquanto a ingestão e o aquecimento não terminam.
+    """
+    estado = prontidao.resumo()
+    if estado["status"] != "ready":
+        return JSONResponse(status_code=503, content=estado, headers={"Retry-After": "2"})
+    return estado
+
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(registro.exportar(), media_type="text/plain; version=0.0.4")
+
+
+@app.exception_handler(PoolSaturado)
+async def pool_saturado(request, exc: PoolSaturado):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+
 @app.post("/ingest")
-def ingest():
-    processar_arquivos()
-    return {"status": "ingestao_disparada"}
+async def ingest():
+    # Reingere numa versão nova; os outros workers trocam para ela ao ver o ponteiro publicado
+    resultado = await pool("ingestao").executar(atualizar_indice, True)
+    return {"status": resultado["status"], "versao": resultado.get("versao"), "chunks": resultado.get("chunks")}
 
 
 @app.post("/session")
@@ -442,64 +582,159 @@ def set_session(payload: SessionRequest):
     return {"status": "perfil_atualizado"}
 
 
-@app.post("/transcribe")
-async def transcribe(file: UploadFile = File(...)):
+async def _blocos(*blocos: bytes) -> AsyncIterator[bytes]:
+    for bloco in blocos:
+        yield bloco
+
+
+async def origem_audio(request: Request, resposta_em_stream: bool = False) -> Tuple[AsyncIterator[bytes], str, Dict[str, str]]:
+    """
+    Áudio da requisição: multipart (campo `file`, lido em blocos) ou o próprio corpo com
+    Content-Type audio/* (lido conforme chega da rede, sem esperar o upload terminar).
+
+    Args:
+        request: Requisição HTTP
+        resposta_em_stream: O corpo será lido enquanto uma StreamingResponse é enviada
+
+    Returns:
+        (blocos do áudio, tipo MIME, demais campos de texto do formulário)
+    """
+    tipo = request.headers.get("content-type", "")
+    if tipo.startswith("multipart/form-data"):
+        formulario = await request.form()
+        arquivo = formulario.get("file")
+        if arquivo is None or not hasattr(arquivo, "read"):
+            raise ErroTranscricao(400, "Envie o áudio no campo 'file'.")
+        campos = {chave: valor for chave, valor in formulario.items() if isinstance(valor, str)}
+        return ler_upload(arquivo), arquivo.content_type or "", campos
+    versao_asgi = tuple(int(p) for p in request.scope.get("asgi", {}).get("spec_version", "2.0").split("."))
+    if resposta_em_stream and versao_asgi < (2, 4):
+        # Antes do ASGI 2.4 a StreamingResponse disputa o receive() com a leitura do corpo
+        # (para detectar desconexão); nesse caso o corpo é lido inteiro antes da resposta
+        return _blocos(await request.body()), tipo, {}
+    return request.stream(), tipo, {}
+
+
+async def eventos_transcricao_sse(origem: AsyncIterator[bytes], formato: FormatoAudio) -> AsyncIterator[str]:
+    finais = []
     try:
-        if not os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
-            return JSONResponse(status_code=500, content={"detail": "GOOGLE_APPLICATION_CREDENTIALS não configurada para Speech-to-Text."})
-
-        audio_bytes = await file.read()
-        if not audio_bytes:
-            return JSONResponse(status_code=400, content={"detail": "Arquivo de áudio vazio."})
-
-        mime = (file.content_type or "").lower()
-        print(f"[transcribe] mime={mime}, size_bytes={len(audio_bytes)}")
-
-        encoding_map = {
-            "audio/webm": speech.RecognitionConfig.AudioEncoding.WEBM_OPUS,
-            "audio/ogg": speech.RecognitionConfig.AudioEncoding.OGG_OPUS,
-            "audio/opus": speech.RecognitionConfig.AudioEncoding.OGG_OPUS,
-            "audio/wav": speech.RecognitionConfig.AudioEncoding.LINEAR16,
-            "audio/x-wav": speech.RecognitionConfig.AudioEncoding.LINEAR16,
-            "audio/flac": speech.RecognitionConfig.AudioEncoding.FLAC,
-            "audio/mpeg": speech.RecognitionConfig.AudioEncoding.MP3,
-            "audio/mp3": speech.RecognitionConfig.AudioEncoding.MP3,
-        }
-
-        encoding = encoding_map.get(mime)
-        if encoding is None:
-            return JSONResponse(status_code=400, content={"detail": f"Formato de áudio não suportado: {mime}. Use webm/ogg opus, wav, flac ou mp3."})
-
-        client_speech = speech.SpeechClient()
-        audio = speech.RecognitionAudio(content=audio_bytes)
-        sample_rate = 48000 if encoding in (speech.RecognitionConfig.AudioEncoding.WEBM_OPUS, speech.RecognitionConfig.AudioEncoding.OGG_OPUS) else None
-        config = speech.RecognitionConfig(
-            encoding=encoding,
-            language_code="pt-BR",
-            enable_automatic_punctuation=True,
-            audio_channel_count=1,
-            sample_rate_hertz=sample_rate,
-        )
-        response = client_speech.recognize(config=config, audio=audio)
-        textos = [result.alternatives[0].transcript for result in response.results if result.alternatives]
-        texto_final = " ".join(textos).strip()
+        async for texto, final in transcrever_stream(origem, formato):
+            if final:
+                finais.append(texto.strip())
+            yield formatar_sse("final" if final else "partial", {"text": texto})
+        yield formatar_sse("done", {"text": " ".join(t for t in finais if t)})
+    except ErroTranscricao as e:
+        yield formatar_sse("error", {"status": e.status, "detail": e.detalhe})
+    except Exception as e:
+        logger.error("erro na transcrição", extra={"erro": f"{type(e).__name__}: {e}"})
+        yield formatar_sse("error", {"status": 500, "detail": f"Erro na transcrição: {type(e).__name__}: {e}"})
 
-        if not texto_final:
-            print(f"[transcribe] resposta vazia do Speech. response={response}")
-            return JSONResponse(status_code=500, content={"detail": "Transcrição vazia retornada pelo Speech-to-Text."})
 
-        return {"text": texto_final}
+@app.post("/transcribe")
+async def transcribe(request: Request, parcial: bool = False):
+    """
+    Transcreve o áudio enviado em multipart (campo `file`) ou no corpo (Content-Type audio/*).
+    O áudio segue para o Speech-to-Text em streaming, em pedaços, à medida que é lido.
+    Com `?parcial=1` a resposta é SSE (`partial`, `final`, `done`); sem ele, JSON {"text"}.
+    """
+    try:
+        verificar_credenciais()
+        origem, mime, _ = await origem_audio(request, resposta_em_stream=parcial)
+        formato = formato_do_mime(mime)
+        logger.debug("áudio recebido", extra={"mime": mime, "encoding": formato.encoding})
+
+        if parcial:
+            return StreamingResponse(
+                eventos_transcricao_sse(origem, formato),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+        return {"text": await transcrever(origem, formato)}
+    except ErroTranscricao as e:
+        if e.status >= 500:
+            logger.warning("falha na transcrição", extra={"erro": e.detalhe})
+        return JSONResponse(status_code=e.status, content={"detail": e.detalhe})
+    except PoolSaturado:
+        raise
     except Exception as e:
-        print(f"[transcribe][erro] {type(e).__name__}: {e}")
+        logger.error("erro na transcrição", extra={"erro": f"{type(e).__name__}: {e}"})
         return JSONResponse(status_code=500, content={"detail": f"Erro na transcrição: {type(e).__name__}: {e}"})
 
 
-@app.post("/chat")
-def chat(payload: ChatRequest):
+def aplicar_heuristicas_perfil(pergunta: str, perfil_dict: Dict, perfil: Optional[Perfil] = None) -> Dict:
+    """
+    Parte local (sem LLM) do perfil do turno: perfil enviado, eixo/subtrilha/intent e campos
+    detectados no texto. Também usada pelo /chat/lote para montar as consultas antes dos turnos.
+    """
+    if perfil:
+        perfil_dict.update({k: v for k, v in perfil.model_dump().items() if v})
+
+    # Classifica eixo/subtrilha quando a mensagem tem assunto claro; evita marcar "OUTRO" em respostas curtas tipo "sim"
+    pergunta_lower = pergunta.lower().strip()
+    palavras_msg = pergunta_lower.split()
+    respostas_curta = {"sim", "ok", "blz", "beleza", "certo", "isso", "ss", "s", "nao", "não"}
+    tem_assunto_claro = any(
+        chave in pergunta_lower
+        for chave in ["cpf", "rg", "sus", "bolsa", "auxilio", "cadunico", "passaporte", "gov", "imposto"]
+    ) or len(palavras_msg) >= 3 or (len(palavras_msg) >= 2 and not all(p in respostas_curta for p in palavras_msg))
+
+    trocar_assunto = any(frase in pergunta_lower for frase in ["outro assunto", "agora outro", "mudar de assunto"])
+    eixo_detectado = classificar_eixo(pergunta) if tem_assunto_claro else None
+    subtrilha_detectada = classificar_subtrilha(pergunta) if tem_assunto_claro else None
+
+    if eixo_detectado and (trocar_assunto or not perfil_dict.get("eixo")):
+        perfil_dict["eixo"] = eixo_detectado
+    if subtrilha_detectada and not perfil_dict.get("subtrilha"):
+        perfil_dict["subtrilha"] = subtrilha_detectada
+
+    if not perfil_dict.get("intent") and tem_assunto_claro:
+        perfil_dict["intent"] = pergunta
+
+    # Tenta preencher perfil com detecção automática (heurísticas locais)
+    if not all(perfil_dict.get(campo) for campo in CAMPOS_PERFIL):
+        auto = tentar_preencher_perfil_livre(pergunta)
+        if auto:
+            perfil_dict.update(auto)
+
+    # Preenche campos simples; a detecção de papel por LLM roda depois, em paralelo com a busca
+    perfil_dict = preencher_resposta_curta(pergunta, perfil_dict, usar_llm=False)
+
+    if not perfil_dict.get("problema"):
+        perfil_dict["problema"] = pergunta
+    return perfil_dict
+
+
+MENSAGEM_SEM_CONTEXTO = "Não encontrei informações sobre isso nos documentos disponíveis. Pode reformular sua pergunta ou fornecer mais detalhes sobre o que precisa?"
+
+
+def eventos_turno(payload: ChatRequest, tempos: Optional[TemposTurno] = None,
+                  buscar_contexto: Callable[..., list] = buscar_contexto_turno) -> Iterator[Tuple[str, Dict]]:
+    """
+    Executa um turno do chat produzindo eventos na ordem em que as etapas terminam.
+    É a base de /chat (JSON ou texto em streaming), /chat/sse e /chat/lote.
+    A duração de cada etapa vai para o histograma de /metrics e para `tempos` (Server-Timing).
+    `buscar_contexto` tem a assinatura de buscar_contexto_turno (o /chat/lote passa os trechos já buscados).
+
+    Eventos:
+        ("erro", {"status", "detail"}): requisição inválida
+        ("resposta", {"answer"}): resposta pronta, sem LLM (atalhos, BASE_FIXA, dados do perfil)
+        ("stage", {"stage", "status", "ms", "t"}): início/fim de profile, retrieval e generation
+        ("links", {"links"}): saída de gerar_links_orgaos, quando houver pedido de localização
+        ("token", {"text"}): pedaço da resposta gerada
+        ("done", {"timings"}): tempos do turno em ms; "a.b" é uma parte de "a" (ex.: "contexto.busca")
+    """
+    inicio_turno = time.perf_counter()
+    if tempos is None:
+        tempos = TemposTurno()
+
+    def decorrido() -> float:
+        return round((time.perf_counter() - inicio_turno) * 1000, 1)
+
     pergunta = (payload.transcricao or payload.pergunta).strip()
 
     if not pergunta:
-        return JSONResponse(status_code=400, content={"detail": "Pergunta vazia"})
+        yield "erro", {"status": 400, "detail": "Pergunta vazia"}
+        return
 
     perfil_dict: Dict = {}
     hist: list = []
@@ -517,244 +752,409 @@ def chat(payload: ChatRequest):
             dados["history"] = mensagens_recentes
             session_store.upsert(payload.session_id, dados)
 
+    # --- Atalhos baratos: respondidos sem LLM e sem busca ---
+
     # Fallback seguro para perguntas estranhas sobre nome (se não houver nome salvo)
     if "qual" in pergunta.lower() and "meu nome" in pergunta.lower():
         # nome salvo?
         sess_nome = perfil_dict.get("nome")
         if sess_nome:
-            return {"answer": f"Você me disse que seu nome é {sess_nome}."}
-        return {"answer": "Eu não vejo seu nome automaticamente. Posso ajudar com RG, CPF ou Bolsa Família se você quiser."}
+            yield "resposta", {"answer": f"Você me disse que seu nome é {sess_nome}."}
+            return
+        yield "resposta", {"answer": "Eu não vejo seu nome automaticamente. Posso ajudar com RG, CPF ou Bolsa Família se você quiser."}
+        return
 
     resposta_gentil = resposta_smalltalk(pergunta)
     if resposta_gentil:
         salvar_sessao()
-        return {"answer": resposta_gentil}
+        yield "resposta", {"answer": resposta_gentil}
+        return
 
     if pergunta.lower() in ["só isso", "so isso", "mais nada", "acabou?"]:
         salvar_sessao()
-        return {"answer": "Posso detalhar prazos, taxas, documentos ou onde ir no seu estado. O que mais você precisa?"}
-
-    if payload.perfil:
-        perfil_dict.update({k: v for k, v in payload.perfil.model_dump().items() if v})
-        salvar_sessao()
-
-    # Classifica eixo/subtrilha quando a mensagem tem assunto claro; evita marcar "OUTRO" em respostas curtas tipo "sim"
-    pergunta_lower = pergunta.lower().strip()
-    palavras_msg = pergunta_lower.split()
-    respostas_curta = {"sim", "ok", "blz", "beleza", "certo", "isso", "ss", "s", "nao", "não"}
-    tem_assunto_claro = any(
-        chave in pergunta_lower
-        for chave in ["cpf", "rg", "sus", "bolsa", "auxilio", "cadunico", "passaporte", "gov", "imposto"]
-    ) or len(palavras_msg) >= 3 or (len(palavras_msg) >= 2 and not all(p in respostas_curta for p in palavras_msg))
-
-    trocar_assunto = any(frase in pergunta_lower for frase in ["outro assunto", "agora outro", "mudar de assunto"])
-    eixo_detectado = classificar_eixo(pergunta) if tem_assunto_claro else None
-    subtrilha_detectada = classificar_subtrilha(pergunta) if tem_assunto_claro else None
-
-    if eixo_detectado and (trocar_assunto or not perfil_dict.get("eixo")):
-        perfil_dict["eixo"] = eixo_detectado
-    if subtrilha_detectada and not perfil_dict.get("subtrilha"):
-        perfil_dict["subtrilha"] = subtrilha_detectada
-
-    if not perfil_dict.get("intent") and tem_assunto_claro:
-        perfil_dict["intent"] = pergunta
-    salvar_sessao()
-
-    # Tenta preencher perfil com detecção automática
-    if not all(perfil_dict.get(campo) for campo in ["nome", "genero", "papel", "idade", "problema", "localidade"]):
-        auto = tentar_preencher_perfil_livre(pergunta)
-        if auto:
-            perfil_dict.update(auto)
-            salvar_sessao()
-
-    # Tenta extrair campos com LLM se ainda faltar
-    if not all(perfil_dict.get(campo) for campo in ["nome", "genero", "papel", "idade", "problema", "localidade"]):
-        llm_extra = extrair_perfil_llm(pergunta)
-        if llm_extra:
-            for k, v in llm_extra.items():
-                if v and not perfil_dict.get(k):
-                    perfil_dict[k] = v
-            salvar_sessao()
-
-    # Preenche campos simples
-    perfil_dict = preencher_resposta_curta(pergunta, perfil_dict)
-    salvar_sessao()
+        yield "resposta", {"answer": "Posso detalhar prazos, taxas, documentos ou onde ir no seu estado. O que mais você precisa?"}
+        return
 
-    if not perfil_dict.get("problema"):
-        perfil_dict["problema"] = pergunta
-    if not perfil_dict.get("intent") and tem_assunto_claro:
-        perfil_dict["intent"] = pergunta
+    perfil_dict = aplicar_heuristicas_perfil(pergunta, perfil_dict, payload.perfil)
     salvar_sessao()
 
     # Perguntas sobre dados do perfil
     lower = pergunta.lower()
     if "meus dados" in lower or "que dados" in lower:
-        salvar_sessao()
-        return {"answer": f"Você me contou: {resumo_perfil(perfil_dict)}"}
+        yield "resposta", {"answer": f"Você me contou: {resumo_perfil(perfil_dict)}"}
+        return
     if "meu nome" in lower and perfil_dict.get("nome"):
-        salvar_sessao()
-        return {"answer": f"Você me disse que seu nome é {perfil_dict.get('nome')}. Posso seguir na orientação?"}
-
-    # Monta bloco de perfil apenas com campos preenchidos (sem bloquear fluxo se faltar algo)
-    partes_perfil = []
-    if perfil_dict.get('nome'):
-        partes_perfil.append(f"Nome: {perfil_dict.get('nome')}")
-    if perfil_dict.get('localidade'):
-        partes_perfil.append(f"Localidade: {perfil_dict.get('localidade')}")
-    if perfil_dict.get('papel'):
-        partes_perfil.append(f"Situação: {perfil_dict.get('papel')}")
-    if perfil_dict.get('eixo'):
-        partes_perfil.append(f"Assunto: {perfil_dict.get('eixo')}")
-    
-    bloco_perfil = ""
-    if partes_perfil:
-        bloco_perfil = "INFORMAÇÕES DO USUÁRIO:\n- " + "\n- ".join(partes_perfil) + "\n\n"
-
-    faltando = []
-    if not perfil_dict.get("localidade"):
-        faltando.append("Localidade não informada (responder de forma geral).")
-    if not perfil_dict.get("papel"):
-        faltando.append("Papel não informado (se é para você ou dependente).")
-    if not perfil_dict.get("nome"):
-        faltando.append("Nome não informado.")
-    if faltando:
-        bloco_perfil += "DADOS FALTANTES PARA PERSONALIZAR MELHOR:\n- " + "\n- ".join(faltando) + "\n\n"
-
-    if mensagens_recentes:
-        bloco_perfil += "HISTÓRICO RECENTE (últimas 5 mensagens):\n- " + "\n- ".join(mensagens_recentes) + "\n\n"
+        yield "resposta", {"answer": f"Você me disse que seu nome é {perfil_dict.get('nome')}. Posso seguir na orientação?"}
+        return
 
     resposta_fixa = buscar_resposta_fixa(pergunta)
+    tempos.registrar("heuristicas", time.perf_counter() - inicio_turno)
     if resposta_fixa:
-        salvar_sessao()
-        return {"answer": resposta_fixa}
+        yield "resposta", {"answer": resposta_fixa}
+        return
 
-    # Monta query de busca melhorada combinando pergunta atual com contexto da conversa
-    query_busca = pergunta
-    
-    # Se a pergunta atual parece ser uma resposta (curta, sem verbo de ação), 
-    # combina com o intent/eixo anterior ou histórico recente
-    palavras_pergunta = pergunta_lower.split()
-    historico_para_busca = " ".join(mensagens_recentes)
-    
-    # Se a pergunta é muito curta (1-2 palavras) e há um intent/eixo salvo ou histórico,
-    # provavelmente é uma resposta a uma pergunta anterior
-    if len(palavras_pergunta) <= 2 and (perfil_dict.get("intent") or perfil_dict.get("eixo") or historico_para_busca):
-        termos_contexto = []
-        if perfil_dict.get("eixo"):
-            termos_contexto.append(perfil_dict.get("eixo"))
-        if perfil_dict.get("intent") and len(perfil_dict.get("intent", "").split()) > 2:
-            termos_contexto.append(perfil_dict.get("intent"))
-        if historico_para_busca:
-            termos_contexto.append(historico_para_busca)
-        
-        if termos_contexto:
-            query_busca = f"{' '.join(termos_contexto)} {pergunta}"
-    
-    # Adiciona localidade à busca se disponível
-    if perfil_dict.get("localidade") and perfil_dict.get("localidade") not in query_busca.lower():
-        # Normaliza localidade
-        localidade = perfil_dict.get("localidade").lower()
-        if localidade == "brasilia" or localidade == "brasília":
-            localidade = "distrito federal"
-        query_busca = f"{query_busca} {localidade}"
-    
-    # Busca contexto com query melhorada
-    contexto = buscar_contexto(query_busca, session_id=payload.session_id)
-    
-    # Se não encontrou, tenta buscar apenas com o eixo/intent
-    if (not contexto or contexto.strip() == "") and perfil_dict.get("eixo"):
-        contexto = buscar_contexto(perfil_dict.get("eixo"), session_id=payload.session_id)
-    
-    # Se ainda não encontrou, tenta com a pergunta original
-    if (not contexto or contexto.strip() == "") and query_busca != pergunta:
-        contexto = buscar_contexto(pergunta, session_id=payload.session_id)
-
-    # Valida se o contexto achado tem relação com o assunto; se não, descarta para evitar resposta nada a ver
-    if contexto and not contexto_relevante(contexto, pergunta, perfil_dict.get("eixo")):
-        contexto = ""
-    
-    # Se não houver contexto, retorna mensagem clara
-    if not contexto or contexto.strip() == "":
-        return {"answer": "Não encontrei informações sobre isso nos documentos disponíveis. Pode reformular sua pergunta ou fornecer mais detalhes sobre o que precisa?"}
-    
-    # Gera links do Google Maps APENAS se houver pedido EXPLÍCITO de localização
-    # Não gera links para perguntas gerais como "como tirar cpf"
-    pergunta_lower = pergunta.lower()
-    contexto_lower = contexto.lower() if contexto else ""
-    pergunta_norm = unicodedata.normalize("NFKD", pergunta_lower).encode("ascii", "ignore").decode("ascii")
-    
-    # Indicadores de pedido EXPLÍCITO de localização (mais restritivo)
-    pedidos_explicitos = [
-        "me manda", "manda a", "envie a", "mostra a", "me mostra",
-        "localização", "localizacao", "endereço", "endereco",
-        "próximo", "proximo", "mais próximo", "perto", "mais perto",
-        "onde fica", "onde está", "qual endereço", "qual o endereço"
-    ]
-    
-    # Verifica se há pedido EXPLÍCITO na pergunta ou no contexto
-    tem_pedido_explicito = any(termo in pergunta_lower for termo in pedidos_explicitos)
-    pedidos_explicitos_norm = [
-        unicodedata.normalize("NFKD", termo.lower()).encode("ascii", "ignore").decode("ascii")
-        for termo in pedidos_explicitos
-    ]
-    pedidos_extras_norm = ["localiza", "localiz", "locaz", "loca", "onde fica", "onde esta", "onde ta"]
-    if not tem_pedido_explicito:
-        tem_pedido_explicito = any(
-            termo in pergunta_norm for termo in pedidos_explicitos_norm + pedidos_extras_norm
+    # Daqui em diante o turno usa o LLM: passa pelo controle de admissão
+    try:
+        admissao_llm.adquirir()
+    except AdmissaoRecusada as e:
+        logger.info("requisição recusada pela admissão", extra={"motivo": e.motivo})
+        yield "erro", {"status": 429, "detail": str(e), "retry_after": e.retry_after}
+        return
+    inicio_vaga = time.monotonic()
+
+    try:
+        # --- Etapas caras: enriquecimento do perfil por LLM em paralelo com a busca ---
+        # O papel já passou pelos indicadores de palavra-chave (preencher_resposta_curta); a extração
+        # por LLM também traz papel, então detectar_papel_llm é só o último recurso, depois dela
+        perfil_heuristico = dict(perfil_dict)
+        falta_campo = not all(perfil_heuristico.get(campo) for campo in CAMPOS_PERFIL)
+        falta_papel = not perfil_heuristico.get("papel")
+
+        grafo = GrafoEtapas()
+        grafo.adicionar("perfil_llm", lambda _: extrair_perfil_llm(pergunta) if falta_campo else {})
+        grafo.adicionar(
+            "papel_llm",
+            lambda r: detectar_papel_llm(pergunta) if falta_papel and not (r["perfil_llm"] or {}).get("papel") else None,
+            depende_de=["perfil_llm"],
         )
-    
-    # Só gera links se houver pedido EXPLÍCITO
-    links_maps = []
-    if tem_pedido_explicito:
-        # Combina pergunta com contexto para melhor detecção do órgão
-        pergunta_com_contexto = pergunta
-        if perfil_dict.get("eixo"):
-            pergunta_com_contexto = f"{pergunta} {perfil_dict.get('eixo')}"
-        if perfil_dict.get("intent"):
-            pergunta_com_contexto = f"{pergunta_com_contexto} {perfil_dict.get('intent')}"
-        
-        links_maps = gerar_links_orgaos(pergunta_com_contexto, perfil_dict.get("localidade"), forcar_geracao=True)
-        
-        # Se não gerou links mas há eixo no perfil, tenta gerar baseado no eixo
-        if not links_maps and perfil_dict.get("eixo"):
-            eixo = perfil_dict.get("eixo").lower()
-            pergunta_artificial = f"{perfil_dict.get('eixo')} {pergunta}"
-            links_maps = gerar_links_orgaos(pergunta_artificial, perfil_dict.get("localidade"), forcar_geracao=True)
-    
-    bloco_links = ""
-    if links_maps:
-        links_texto = []
-        for link_info in links_maps:
-            links_texto.append(f"{link_info['nome']}: {link_info['link']}")
-        bloco_links = "\n\nLINKS DO GOOGLE MAPS PARA ENCONTRAR OS ÓRGÃOS:\n" + "\n".join(links_texto) + "\n"
-    
-    contexto_final = f"{bloco_perfil}DADOS DOS DOCUMENTOS:\n{contexto}{bloco_links}"
-    
-    # Obtém e formata o histórico da conversa
-    historico_formatado = ""
-    if payload.session_id:
-        historico = session_store.obter_historico(payload.session_id, max_mensagens=8)
-        if historico:
-            historico_formatado = formatar_historico_conversa(historico, max_chars=1500)
-
-    # Classe para acumular resposta durante streaming
-    class AcumuladorResposta:
-        def __init__(self):
-            self.texto = ""
-        
-        def adicionar(self, pedaco: str):
-            self.texto += pedaco
+        grafo.adicionar(
+            "contexto",
+            lambda _: buscar_contexto(
+                pergunta, perfil_heuristico, mensagens_recentes, payload.session_id, tempos
+            ),
+        )
+        grafo.adicionar(
+            "links",
+            lambda r: gerar_links_pedido(pergunta, mesclar_perfil_llm(perfil_heuristico, r["perfil_llm"])),
+            depende_de=["perfil_llm"],
+        )
+        grafo.adicionar(
+            "historico",
+            lambda _: session_store.obter_historico(payload.session_id, max_mensagens=8) if payload.session_id else [],
+        )
+
+        yield "stage", {"stage": "profile", "status": "start", "t": decorrido()}
+        yield "stage", {"stage": "retrieval", "status": "start", "t": decorrido()}
+
+        resultados: Dict = {}
+        for nome, resultado in grafo.executar_iter():
+            resultados[nome] = resultado
+            if nome == "contexto":
+                yield "stage", {"stage": "retrieval", "status": "done", "ms": round(grafo.tempos[nome], 1), "t": decorrido()}
+            elif nome == "papel_llm":
+                ms = grafo.tempos["perfil_llm"] + grafo.tempos["papel_llm"]
+                yield "stage", {"stage": "profile", "status": "done", "ms": round(ms, 1), "t": decorrido()}
+            elif nome == "links" and resultado:
+                yield "links", {"links": resultado}
+        for nome, ms in grafo.tempos.items():
+            tempos.registrar(nome, ms / 1000)
+
+        perfil_dict = mesclar_perfil_llm(perfil_dict, resultados["perfil_llm"], resultados["papel_llm"])
+        salvar_sessao()
 
-    acumulador = AcumuladorResposta()
+        trechos = resultados["contexto"]
 
-    def responder_stream():
-        for pedaco in stream_resposta(pergunta, contexto_final, historico_formatado):
+        # Valida se o contexto achado tem relação com o assunto; se não, descarta para evitar resposta nada a ver
+        if trechos and not contexto_relevante("\n".join(t["texto"] for t in trechos), pergunta, perfil_dict.get("eixo")):
+            trechos = []
+
+        logger.debug(
+            "etapas concluídas",
+            extra={"etapas_ms": {nome: round(ms, 1) for nome, ms in grafo.tempos.items()}, "ate_geracao_ms": decorrido()},
+        )
+
+        # Se não houver contexto, retorna mensagem clara
+        if not trechos:
+            yield "resposta", {"answer": MENSAGEM_SEM_CONTEXTO}
+            return
+
+        # Só as frases dos trechos que têm a ver com a pergunta (e as vizinhas) vão para o prompt
+        if COMPRESSAO_CONTEXTO:
+            with tempos.medir("compressao"):
+                trechos, compressao = comprimir_para_pergunta(pergunta, trechos)
+            logger.info("contexto comprimido", extra=compressao)
+
+        # Monta contexto e histórico dentro do orçamento de tokens de cada seção
+        with tempos.medir("montagem_prompt"):
+            prompt = montar_contexto_prompt(
+                pergunta, perfil_dict, mensagens_recentes, trechos, resultados["links"], resultados["historico"]
+            )
+
+        yield "stage", {"stage": "generation", "status": "start", "t": decorrido()}
+
+        acumulador = AcumuladorResposta()
+        inicio_geracao = time.perf_counter()
+        for pedaco in stream_resposta(pergunta, prompt["contexto"], prompt["historico"]):
+            if not acumulador:
+                tempos.registrar("geracao.ttft", time.perf_counter() - inicio_geracao)
             acumulador.adicionar(pedaco)
-            yield pedaco
-        
+            yield "token", {"text": pedaco}
+        tempos.registrar("geracao", time.perf_counter() - inicio_geracao)
+
         # Após terminar de gerar a resposta, salva no histórico
-        if payload.session_id and acumulador.texto:
+        if payload.session_id and acumulador:
             session_store.adicionar_mensagem(payload.session_id, pergunta, acumulador.texto)
 
-    salvar_sessao()
-    return StreamingResponse(responder_stream(), media_type="text/plain")
+        tempos.registrar("total", time.perf_counter() - inicio_turno)
+        timings = tempos.como_dict()
+        yield "stage", {"stage": "generation", "status": "done", "ms": timings["geracao"], "t": decorrido()}
+        logger.info("turno concluído", extra={"total_ms": timings["total"], "prompt_tokens": prompt["tokens"]})
+        yield "done", {"timings": {**timings, "prompt_tokens": prompt["tokens"]}}
+    finally:
+        admissao_llm.liberar(time.monotonic() - inicio_vaga)
+
+
+def resposta_erro(dados: Dict, tempos: Optional[TemposTurno] = None) -> JSONResponse:
+    headers = cabecalho_server_timing(tempos) if tempos is not None else {}
+    if dados.get("retry_after"):
+        headers["Retry-After"] = str(dados["retry_after"])
+    return JSONResponse(status_code=dados["status"], content={"detail": dados["detail"]}, headers=headers or None)
+
+
+def cabecalho_server_timing(tempos: TemposTurno) -> Dict[str, str]:
+    valor = tempos.server_timing()
+    return {"Server-Timing": valor} if valor else {}
+
+
+@app.post("/chat")
+async def chat(payload: ChatRequest):
+    return await pool("chat").executar(responder_chat, payload)
+
+
+def responder_chat(payload: ChatRequest):
+    # Server-Timing resume as etapas concluídas antes da resposta começar (TTFT e geração vão no /chat/sse)
+    tempos = TemposTurno()
+    eventos = eventos_turno(payload, tempos)
+    for tipo, dados in eventos:
+        if tipo == "erro":
+            return resposta_erro(dados, tempos)
+        if tipo == "resposta":
+            return JSONResponse(dados, headers=cabecalho_server_timing(tempos))
+        if tipo == "stage" and dados["stage"] == "generation":
+            break
+    else:
+        return JSONResponse({"answer": ""}, headers=cabecalho_server_timing(tempos))
+
+    def responder_stream():
+        for tipo, dados in eventos:
+            if tipo == "token":
+                yield dados["text"]
+
+    return StreamingResponse(
+        pool("chat").iterar(responder_stream()),
+        media_type="text/plain",
+        headers=cabecalho_server_timing(tempos),
+    )
+
+
+def formatar_sse(tipo: str, dados: Dict) -> str:
+    return f"event: {tipo}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+
+@app.post("/chat/sse")
+async def chat_sse(payload: ChatRequest):
+    """
+    Variante do /chat em Server-Sent Events: emite `stage`, `links`, `token` e `done`
+    conforme cada etapa termina. Respostas sem LLM vêm como um único `token` seguido de `done`.
+    """
+    return await pool("chat").executar(responder_chat_sse, payload)
+
+
+def sse_turno(eventos: Iterable[Tuple[str, Dict]], inicio: float) -> Iterator[str]:
+    """
+    Converte os eventos de eventos_turno em SSE. Resposta sem LLM vira um `token` seguido de `done`;
+    erro vira `error` (quando a resposta já começou e não dá mais para mudar o status HTTP).
+    """
+    for tipo, dados in eventos:
+        if tipo == "erro":
+            yield formatar_sse("error", dados)
+            return
+        if tipo == "resposta":
+            yield formatar_sse("token", {"text": dados["answer"]})
+            tempo = round((time.perf_counter() - inicio) * 1000, 1)
+            yield formatar_sse("done", {"timings": {"total": tempo}, "llm": False})
+            return
+        yield formatar_sse(tipo, dados)
+
+
+def responder_chat_sse(payload: ChatRequest):
+    inicio = time.perf_counter()
+    eventos = eventos_turno(payload)
+    tipo, dados = next(eventos)
+    if tipo == "erro":
+        return resposta_erro(dados)
+
+    return StreamingResponse(
+        pool("chat").iterar(sse_turno(itertools.chain([(tipo, dados)], eventos), inicio)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def eventos_chat_voz(origem: AsyncIterator[bytes], formato: FormatoAudio,
+                           session_id: Optional[str], perfil: Optional[Perfil]) -> AsyncIterator[str]:
+    inicio = time.perf_counter()
+    tempos = TemposTurno()
+
+    def decorrido() -> float:
+        return round((time.perf_counter() - inicio) * 1000, 1)
+
+    yield formatar_sse("stage", {"stage": "transcription", "status": "start", "t": 0.0})
+    try:
+        with tempos.medir("transcricao"):
+            texto = await transcrever(origem, formato)
+    except ErroTranscricao as e:
+        yield formatar_sse("error", {"status": e.status, "detail": e.detalhe})
+        return
+    except PoolSaturado as e:
+        yield formatar_sse("error", {"status": 503, "detail": str(e)})
+        return
+    except Exception as e:
+        logger.error("erro na transcrição", extra={"erro": f"{type(e).__name__}: {e}"})
+        yield formatar_sse("error", {"status": 500, "detail": f"Erro na transcrição: {type(e).__name__}: {e}"})
+        return
+    yield formatar_sse("stage", {
+        "stage": "transcription", "status": "done", "ms": tempos.como_dict()["transcricao"], "t": decorrido(),
+    })
+    yield formatar_sse("transcript", {"text": texto})
+
+    # O turno começa na mesma conexão assim que o texto final existe; `done` traz também o tempo da transcrição
+    payload = ChatRequest(pergunta=texto, transcricao=texto, session_id=session_id, perfil=perfil)
+    async for evento in pool("chat").iterar(sse_turno(eventos_turno(payload, tempos), inicio)):
+        yield evento
+
+
+@app.post("/chat/voz")
+async def chat_voz(request: Request, session_id: Optional[str] = None):
+    """
+    Turno de voz numa requisição só, sem a ida e volta do /transcribe antes do /chat.
+    Recebe o áudio em multipart (campo `file`, com `session_id` e `perfil` em JSON opcionais)
+    ou no corpo (Content-Type audio/*, com `?session_id=`) e responde em SSE: `transcript` assim
+    que a transcrição termina e, em seguida, os mesmos eventos do /chat/sse sobre o texto transcrito
+    (nos `stage` do turno, `t` conta a partir do fim da transcrição).
+    """
+    try:
+        verificar_credenciais()
+        origem, mime, campos = await origem_audio(request, resposta_em_stream=True)
+        formato = formato_do_mime(mime)
+        perfil = Perfil.model_validate_json(campos["perfil"]) if campos.get("perfil") else None
+    except ErroTranscricao as e:
+        return JSONResponse(status_code=e.status, content={"detail": e.detalhe})
+    except ValidationError as e:
+        return JSONResponse(status_code=400, content={"detail": f"Perfil inválido: {e.errors()[0]['msg']}"})
+
+    return StreamingResponse(
+        eventos_chat_voz(origem, formato, campos.get("session_id") or session_id, perfil),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def consultas_item_lote(item: ItemLote) -> Optional[List[str]]:
+    """
+    Consultas que o turno do item vai buscar (as mesmas de eventos_turno sem sessão),
+    ou None se a pergunta é respondida sem busca (vazia, conversa fiada ou BASE_FIXA).
+    """
+    pergunta = item.pergunta.strip()
+    if not pergunta or resposta_smalltalk(pergunta) or buscar_resposta_fixa(pergunta):
+        return None
+    perfil_dict = aplicar_heuristicas_perfil(pergunta, {}, item.perfil)
+    return montar_consultas_busca(pergunta, perfil_dict, [pergunta])
+
+
+def buscar_contextos_lote(itens: List[ItemLote], tempos: TemposTurno) -> Dict[Tuple[str, ...], list]:
+    """
+    Busca de todas as perguntas do lote numa ida só ao banco vetorial: um lote de embeddings e
+    uma consulta ao Chroma com todos os vetores (rag.buscar_trechos_lote).
+
+    Returns:
+        {consultas do turno: trechos}
+    """
+    grupos = list(dict.fromkeys(
+        tuple(consultas) for consultas in map(consultas_item_lote, itens) if consultas
+    ))
+    with tempos.medir("busca"):
+        trechos = buscar_trechos_lote(grupos, tempos=tempos)
+    return dict(zip(grupos, trechos))
+
+
+def busca_pre_calculada(contextos: Dict[Tuple[str, ...], list]) -> Callable[..., list]:
+    """Substituto de buscar_contexto_turno que devolve os trechos já buscados pelo lote."""
+    def buscar(pergunta: str, perfil_dict: Dict, mensagens_recentes: list,
+               session_id: Optional[str], tempos: Optional[TemposTurno] = None) -> list:
+        chave = tuple(montar_consultas_busca(pergunta, perfil_dict, mensagens_recentes))
+        if chave in contextos:
+            return list(contextos[chave])
+        return buscar_contexto_turno(pergunta, perfil_dict, mensagens_recentes, session_id, tempos)
+    return buscar
+
+
+def responder_item_lote(item: ItemLote, indice: int, buscar_contexto: Callable[..., list]) -> Dict:
+    """Executa o turno de um item do lote até o fim e devolve a linha NDJSON dele."""
+    linha: Dict = {"index": indice, **({"id": item.id} if item.id else {})}
+    tempos = TemposTurno()
+    partes: List[str] = []
+    links: list = []
+    timings: Dict = {}
+    try:
+        for tipo, dados in eventos_turno(ChatRequest(pergunta=item.pergunta, perfil=item.perfil), tempos, buscar_contexto):
+            if tipo == "erro":
+                return {**linha, **dados}
+            if tipo == "resposta":
+                return {**linha, "status": 200, "answer": dados["answer"], "llm": False}
+            if tipo == "links":
+                links = dados["links"]
+            elif tipo == "token":
+                partes.append(dados["text"])
+            elif tipo == "done":
+                timings = dados["timings"]
+    except Exception as e:
+        # Uma pergunta com erro não derruba as outras do lote
+        logger.error("erro em item do lote", extra={"index": indice, "erro": f"{type(e).__name__}: {e}"})
+        return {**linha, "status": 500, "detail": f"{type(e).__name__}: {e}"}
+    return {**linha, "status": 200, "answer": "".join(partes), "links": links, "timings": timings, "llm": True}
+
+
+async def linhas_lote(itens: List[ItemLote], buscar_contexto: Callable[..., list]) -> AsyncIterator[str]:
+    semaforo = asyncio.Semaphore(max(1, LOTE_PARALELISMO))
+
+    async def executar(indice: int, item: ItemLote) -> Dict:
+        async with semaforo:
+            try:
+                return await pool("chat").executar(responder_item_lote, item, indice, buscar_contexto)
+            except PoolSaturado as e:
+                return {"index": indice, **({"id": item.id} if item.id else {}), "status": 503, "detail": str(e)}
+
+    tarefas = [asyncio.ensure_future(executar(indice, item)) for indice, item in enumerate(itens)]
+    try:
+        for proxima in asyncio.as_completed(tarefas):
+            yield json.dumps(await proxima, ensure_ascii=False) + "\n"
+    finally:
+        for tarefa in tarefas:
+            tarefa.cancel()
+
+
+@app.post("/chat/lote")
+async def chat_lote(payload: LoteRequest):
+    """
+    Várias perguntas independentes (sem sessão) numa requisição, para integrações de parceiros.
+    A busca de todas é feita de uma vez (um lote de embeddings, uma consulta ao Chroma); as gerações
+    rodam em paralelo, até LOTE_PARALELISMO por lote e sob o controle de admissão do LLM.
+    Responde em NDJSON, uma linha por pergunta na ordem em que terminam:
+    {"index", "id"?, "status", "answer", "links", "timings", "llm"} ou {"index", "id"?, "status", "detail"}.
+    O Server-Timing traz o tempo da busca em lote.
+    """
+    if not payload.perguntas:
+        return JSONResponse(status_code=400, content={"detail": "Lote vazio"})
+    if len(payload.perguntas) > LOTE_MAX_PERGUNTAS:
+        return JSONResponse(
+            status_code=413, content={"detail": f"Lote com mais de {LOTE_MAX_PERGUNTAS} perguntas"}
+        )
+
+    tempos = TemposTurno()
+    contextos = await pool("chat").executar(buscar_contextos_lote, payload.perguntas, tempos)
+    return StreamingResponse(
+        linhas_lote(payload.perguntas, busca_pre_calculada(contextos)),
+        media_type="application/x-ndjson",
+        headers={**cabecalho_server_timing(tempos), "X-Accel-Buffering": "no"},
+    )
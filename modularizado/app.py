@@ -1,4 +1,4 @@
-from ingesta import processar_arquivos
+from ingesta import atualizar_indice
 from rag import responder
 
 EXEMPLOS = {
@@ -60,7 +60,7 @@ def menu():
         opcao = input("Escolha: ").strip()
 
         if opcao == "1":
-            processar_arquivos()
+            atualizar_indice(forcar=True)
         elif opcao == "2":
             iniciar_chat()
         elif opcao == "3":
@@ -0,0 +1,93 @@
+"""
+Módulo de aquecimento do worker e do estado de prontidão (/ready).
+Antes de receber usuários, o worker carrega o modelo de embeddings do Chroma (consulta sintética),
+abre o SQLite e os segmentos HNSW, aquece caches locais e abre a conexão com o provedor do LLM.
+Assim o primeiro /chat real não paga esses custos.
+"""
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import AQUECIMENTO
+from logs import obter_logger
+
+logger = obter_logger("aquecimento")
+
+
+class EstadoProntidao:
+    """
+    Guarda se o worker já pode receber tráfego e quanto cada etapa do aquecimento levou.
+    """
+
+    def __init__(self) -> None:
+        self.pronto = False
+        self.etapas: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, etapa: str, ms: float, erro: Optional[str] = None) -> None:
+        with self._lock:
+            self.etapas[etapa] = {"ms": round(ms, 1), **({"erro": erro} if erro else {})}
+
+    def marcar_pronto(self) -> None:
+        with self._lock:
+            self.pronto = True
+
+    def resumo(self) -> Dict:
+        with self._lock:
+            return {"status": "ready" if self.pronto else "warming", "etapas": dict(self.etapas)}
+
+
+prontidao = EstadoProntidao()
+
+
+def aquecer_embeddings() -> None:
+    # A primeira consulta carrega o modelo ONNX e abre o SQLite/HNSW da coleção
+    from banco_dados import obter_colecao_global
+    obter_colecao_global().query(query_texts=["como tirar a segunda via do cpf"], n_results=1)
+
+
+def aquecer_caches() -> None:
+    from verificador_base_fixa import buscar_resposta_fixa
+    from montagem_prompt import estimar_tokens
+    from prompt_base import PROMPT_BASE
+    from localidades import resolver_localidade
+    buscar_resposta_fixa("cpf")
+    # Monta o gazetteer (trie + índice de correções) fora do primeiro /chat
+    resolver_localidade("moro em são luís")
+    estimar_tokens(PROMPT_BASE)
+
+
+def aquecer_llm() -> None:
+    from llm_gateway import gateway
+    gateway.aquecer()
+
+
+ETAPAS_AQUECIMENTO: List[Tuple[str, Callable[[], None]]] = [
+    ("embeddings", aquecer_embeddings),
+    ("caches", aquecer_caches),
+    ("llm", aquecer_llm),
+]
+
+
+def aquecer() -> Dict:
+    """
+    Executa as etapas de aquecimento (falhas são registradas, não interrompem as outras)
+    e marca o worker como pronto.
+
+    Returns:
+        Resumo do estado de prontidão
+    """
+    if AQUECIMENTO:
+        for nome, etapa in ETAPAS_AQUECIMENTO:
+            inicio = time.perf_counter()
+            erro = None
+            try:
+                etapa()
+            except Exception as e:
+                erro = f"{type(e).__name__}: {e}"
+                logger.warning("etapa de aquecimento falhou", extra={"etapa": nome, "erro": erro})
+            prontidao.registrar(nome, (time.perf_counter() - inicio) * 1000, erro)
+
+    prontidao.marcar_pronto()
+    logger.info("worker pronto", extra={"etapas": prontidao.resumo()["etapas"]})
+    return prontidao.resumo()
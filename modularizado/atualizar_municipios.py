@@ -0,0 +1,76 @@
+"""
+Atualiza o municipios.tsv (gazetteer de localidades.py) com a lista oficial de municípios do IBGE.
+
+    python atualizar_municipios.py
+    python atualizar_municipios.py --saida /tmp/municipios.tsv
+
+Opcional (ex.: no build do deploy, para atualizar a lista): sai com código 1 e mantém o arquivo
+atual se o download falhar ou vier incompleto.
+"""
+import argparse
+import json
+import sys
+import urllib.request
+from typing import List, Optional, Tuple
+
+from config import MUNICIPIOS_MINIMO
+from localidades import ARQUIVO_MUNICIPIOS
+
+URL_IBGE = "https://servicodados.ibge.gov.br/api/v1/localidades/municipios"
+
+
+def _sigla_uf(municipio: dict) -> Optional[str]:
+    # A API traz a UF pela microrregião e, em municípios novos, só pela região imediata
+    try:
+        return municipio["microrregiao"]["mesorregiao"]["UF"]["sigla"]
+    except (KeyError, TypeError):
+        pass
+    try:
+        return municipio["regiao-imediata"]["regiao-intermediaria"]["UF"]["sigla"]
+    except (KeyError, TypeError):
+        return None
+
+
+def baixar_municipios(url: str = URL_IBGE, timeout: float = 60) -> List[Tuple[str, str]]:
+    """
+    Returns:
+        list: (UF, nome) de cada município, ordenada por UF e nome
+    """
+    with urllib.request.urlopen(url, timeout=timeout) as resposta:
+        dados = json.load(resposta)
+    municipios = []
+    for municipio in dados:
+        uf = _sigla_uf(municipio)
+        if uf:
+            municipios.append((uf, municipio["nome"]))
+    return sorted(municipios)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Baixa a lista de municípios do IBGE para o municipios.tsv")
+    parser.add_argument("--saida", default=ARQUIVO_MUNICIPIOS, help="arquivo TSV gerado")
+    parser.add_argument("--url", default=URL_IBGE, help="API de localidades do IBGE")
+    parser.add_argument("--minimo", type=int, default=MUNICIPIOS_MINIMO,
+                        help="falha se a API devolver menos municípios (env MUNICIPIOS_MINIMO)")
+    args = parser.parse_args()
+
+    try:
+        municipios = baixar_municipios(args.url)
+    except OSError as erro:
+        print(f"Erro ao baixar os municípios do IBGE: {erro}")
+        sys.exit(1)
+    if len(municipios) < args.minimo:
+        # Resposta parcial da API: mantém o arquivo atual em vez de gravar uma lista incompleta
+        print(f"Erro: o IBGE devolveu {len(municipios)} municípios (mínimo {args.minimo}); {args.saida} não foi alterado")
+        sys.exit(1)
+
+    with open(args.saida, "w", encoding="utf-8") as arquivo:
+        arquivo.write("# Municípios brasileiros: UF<TAB>nome (grafia do IBGE).\n")
+        arquivo.write(f"# Gerado por atualizar_municipios.py a partir de {args.url} ({len(municipios)} municípios)\n")
+        for uf, nome in municipios:
+            arquivo.write(f"{uf}\t{nome}\n")
+    print(f"{len(municipios)} municípios gravados em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,167 @@
+import json
+import os
+import threading
+from typing import Dict, Optional
+
 import chromadb
-from config import PASTA_BANCO_VETORIAL
+from config import PASTA_BANCO_VETORIAL, EMBEDDINGS_SOCKET
+from logs import obter_logger
+from metricas import registro
+
+logger = obter_logger("banco_dados")
 
 client_chroma = chromadb.PersistentClient(
     path=PASTA_BANCO_VETORIAL
 )
 
-# Coleção global para documentos base
-colecao_global = client_chroma.get_or_create_collection(
-    name="conhecimento_empresa"
+
+_funcao_embedding_remota = None
+
+
+def opcoes_colecao() -> dict:
+    """
+    Opções comuns às coleções: com EMBEDDINGS_SOCKET definido, os embeddings vêm do serviço
+    compartilhado (servico_embeddings.py) em vez do modelo carregado em cada worker.
+    Todas as coleções usam a mesma instância (e as mesmas conexões por thread).
+    """
+    global _funcao_embedding_remota
+    if not EMBEDDINGS_SOCKET:
+        return {}
+    if _funcao_embedding_remota is None:
+        from servico_embeddings import FuncaoEmbeddingRemota
+        _funcao_embedding_remota = FuncaoEmbeddingRemota(EMBEDDINGS_SOCKET)
+    return {"embedding_function": _funcao_embedding_remota}
+
+
+_funcao_embedding_local = None
+
+
+def funcao_embedding():
+    """
+    Embedding function das coleções, para gerar vetores fora do Chroma (ex.: várias consultas
+    em um lote só): a do serviço compartilhado se configurado, senão o modelo padrão do Chroma.
+    """
+    global _funcao_embedding_local
+    opcoes = opcoes_colecao()
+    if opcoes:
+        return opcoes["embedding_function"]
+    if _funcao_embedding_local is None:
+        from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+        _funcao_embedding_local = DefaultEmbeddingFunction()
+    return _funcao_embedding_local
+
+
+# Coleção global para documentos base. Cada ingestão grava uma versão nova
+# (conhecimento_empresa_v<N>) e só então publica o ponteiro em indice_atual.json;
+# os workers leem o ponteiro e trocam de versão sem reiniciar.
+NOME_COLECAO_GLOBAL = "conhecimento_empresa"
+ARQUIVO_INDICE_ATUAL = os.path.join(PASTA_BANCO_VETORIAL, "indice_atual.json")
+
+
+def nome_versao(versao: int) -> str:
+    return f"{NOME_COLECAO_GLOBAL}_v{versao}"
+
+
+def ler_indice_publicado() -> Optional[Dict]:
+    """
+    Lê o ponteiro da versão publicada da coleção global.
+
+    Returns:
+        {"colecao", "versao", "chunks", "impressao", ...} ou None se nenhuma versão foi publicada
+    """
+    try:
+        with open(ARQUIVO_INDICE_ATUAL, encoding="utf-8") as arquivo:
+            dados = json.load(arquivo)
+        return dados if dados.get("colecao") else None
+    except (OSError, ValueError):
+        return None
+
+
+def publicar_indice(versao: int, **dados) -> Dict:
+    """
+    Publica uma versão já completa da coleção global (troca atômica do ponteiro)
+    e remove as versões antigas, mantendo a anterior para quem ainda a estiver lendo.
+    """
+    info = {"colecao": nome_versao(versao), "versao": versao, **dados}
+    temporario = f"{ARQUIVO_INDICE_ATUAL}.{os.getpid()}.tmp"
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        json.dump(info, arquivo, ensure_ascii=False)
+    os.replace(temporario, ARQUIVO_INDICE_ATUAL)
+
+    manter = {nome_versao(versao), nome_versao(versao - 1)}
+    for existente in client_chroma.list_collections():
+        nome = getattr(existente, "name", existente)
+        if nome.startswith(f"{NOME_COLECAO_GLOBAL}_v") and nome not in manter:
+            try:
+                client_chroma.delete_collection(nome)
+            except Exception as e:
+                logger.warning("erro ao remover versão antiga do índice", extra={"colecao": nome, "erro": str(e)})
+    return info
+
+
+class IndiceGlobal:
+    """
+    Resolve a coleção global publicada. A cada acesso confere o ponteiro (um stat, sem abrir o
+    arquivo) e, se outro processo publicou uma versão nova, passa a usá-la.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._assinatura = None
+        self._colecao = None
+        self.info: Dict = {}
+
+    @property
+    def versao(self) -> int:
+        return self.info.get("versao", 0)
+
+    def _assinatura_ponteiro(self):
+        try:
+            estado = os.stat(ARQUIVO_INDICE_ATUAL)
+            return estado.st_mtime_ns, estado.st_size
+        except OSError:
+            return None
+
+    def colecao(self):
+        assinatura = self._assinatura_ponteiro()
+        if self._colecao is not None and assinatura == self._assinatura:
+            return self._colecao
+
+        with self._lock:
+            if self._colecao is not None and assinatura == self._assinatura:
+                return self._colecao
+            info = ler_indice_publicado() if assinatura else None
+            try:
+                if info:
+                    colecao = client_chroma.get_collection(name=info["colecao"], **opcoes_colecao())
+                else:
+                    # Nenhuma versão publicada ainda: usa a coleção original
+                    colecao = client_chroma.get_or_create_collection(name=NOME_COLECAO_GLOBAL, **opcoes_colecao())
+            except Exception as e:
+                if self._colecao is None:
+                    raise
+                logger.warning("não foi possível abrir a versão publicada; mantendo a atual",
+                               extra={"colecao": info and info.get("colecao"), "erro": str(e)})
+                return self._colecao
+
+            if self._colecao is not None and colecao.name != self._colecao.name:
+                logger.info("nova versão do índice global", extra={"colecao": colecao.name, "versao": (info or {}).get("versao")})
+            self._colecao, self._assinatura, self.info = colecao, assinatura, info or {}
+            return colecao
+
+
+indice_global = IndiceGlobal()
+registro.medidor("indice_global_versao", "Versão da coleção global em uso neste worker").observar(
+    lambda: indice_global.versao
 )
 
+
+def obter_colecao_global():
+    """
+    Retorna a versão publicada da coleção global (use no lugar de guardar a coleção em variável).
+    """
+    return indice_global.colecao()
+
 def obter_colecao_usuario(session_id: str = None):
     """
     Retorna a coleção específica do usuário baseada no session_id.
@@ -22,12 +174,13 @@ def obter_colecao_usuario(session_id: str = None):
         Collection: Coleção do ChromaDB para o usuário específico
     """
     if not session_id:
-        return colecao_global
+        return obter_colecao_global()
     
     # Cria uma coleção única para cada usuário
     nome_colecao = f"usuario_{session_id}"
     return client_chroma.get_or_create_collection(
-        name=nome_colecao
+        name=nome_colecao,
+        **opcoes_colecao()
     )
 
 def adicionar_documento_usuario(session_id: str, documento: str, metadados: dict = None, doc_id: str = None):
@@ -61,8 +214,12 @@ def adicionar_documento_usuario(session_id: str, documento: str, metadados: dict
         
         return True
     except Exception as e:
-        print(f"Erro ao adicionar documento do usuário: {e}")
+        logger.error("erro ao adicionar documento do usuário", extra={"session_id": session_id, "erro": str(e)})
         return False
 
-# Mantém compatibilidade com código antigo
-colecao = colecao_global
+def __getattr__(nome: str):
+    # Mantém compatibilidade com código antigo (`from banco_dados import colecao_global`):
+    # resolvido a cada import, sempre na versão publicada
+    if nome in ("colecao_global", "colecao"):
+        return obter_colecao_global()
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
@@ -0,0 +1,322 @@
+"""
+Benchmark de recuperação (qualidade + velocidade) sobre o doc-info.txt.
+Usa um conjunto de perguntas de ouro (perguntas_ouro.json), cada uma associada aos módulos do
+documento que deveriam ser recuperados, e mede recall@k, MRR, latência por consulta e tamanho do índice.
+Varre combinações de tamanho de chunk/overlap (ingesta.dividir_texto), n_results e modo de busca.
+
+Uso:
+    python benchmark_rag.py
+    python benchmark_rag.py --chunks 500,1000 --overlaps 100,200 --n-results 3,5,8 --json
+"""
+import argparse
+import itertools
+import json
+import os
+import re
+import shutil
+import statistics
+import tempfile
+import time
+from typing import Callable, Dict, List, Set, Tuple
+
+import chromadb
+
+from config import BASE_DIR, PASTA_DOCUMENTOS
+from ingesta import dividir_texto
+from montagem_prompt import estimar_tokens
+from compressao_contexto import comprimir_para_pergunta, dividir_frases, termos
+from rag import buscar_trechos, buscar_trechos_multi
+
+
+ARQUIVO_OURO = os.path.join(BASE_DIR, "perguntas_ouro.json")
+PADRAO_MODULO = re.compile(r"^MÓDULO (\d+):", re.MULTILINE)
+# Um chunk "pertence" a um módulo se compartilha com ele pelo menos esta fração do seu texto
+FRACAO_MINIMA_MODULO = 0.25
+
+
+def _modo_rag(pergunta: str, colecao, n_results: int) -> List[Dict]:
+    return buscar_trechos(pergunta, n_results=n_results, colecao=colecao, refinar=False)
+
+
+def _consultas_chat(pergunta: str) -> List[str]:
+    # Mesmas variações do /chat (sem histórico): pergunta + eixo
+    from api import classificar_eixo, montar_consultas_busca
+    return montar_consultas_busca(pergunta, {"eixo": classificar_eixo(pergunta)}, [])
+
+
+def _modo_multi(pergunta: str, colecao, n_results: int) -> List[Dict]:
+    return buscar_trechos_multi(_consultas_chat(pergunta), n_results=n_results, colecao=colecao, refinar=False)
+
+
+def _modo_refinado(pergunta: str, colecao, n_results: int) -> List[Dict]:
+    # Como o /chat: multi + limite de distância, k adaptativo e MMR
+    return buscar_trechos_multi(_consultas_chat(pergunta), n_results=n_results, colecao=colecao)
+
+
+# Modos de busca comparáveis no benchmark: nome -> função(pergunta, colecao, n_results) -> trechos
+MODOS_BUSCA: Dict[str, Callable[[str, object, int], List[Dict]]] = {
+    "rag": _modo_rag,
+    "multi": _modo_multi,
+    "refinado": _modo_refinado,
+}
+
+
+def mapear_modulos(texto: str) -> List[Tuple[int, int, int]]:
+    """
+    Localiza os módulos do documento.
+
+    Returns:
+        Lista de (numero_modulo, inicio, fim) em posições de caractere; o cabeçalho antes do
+        primeiro módulo é o módulo 0
+    """
+    inicios = [(0, 0)] + [(int(m.group(1)), m.start()) for m in PADRAO_MODULO.finditer(texto)]
+    spans = []
+    for i, (numero, inicio) in enumerate(inicios):
+        fim = inicios[i + 1][1] if i + 1 < len(inicios) else len(texto)
+        if fim > inicio:
+            spans.append((numero, inicio, fim))
+    return spans
+
+
+def modulos_do_chunk(inicio: int, fim: int, spans: List[Tuple[int, int, int]]) -> Set[int]:
+    modulos = set()
+    tamanho = max(1, fim - inicio)
+    for numero, ini_mod, fim_mod in spans:
+        sobreposicao = min(fim, fim_mod) - max(inicio, ini_mod)
+        if sobreposicao > 0 and (sobreposicao / tamanho >= FRACAO_MINIMA_MODULO or sobreposicao == fim_mod - ini_mod):
+            modulos.add(numero)
+    return modulos
+
+
+def construir_indice(texto: str, tamanho_chunk: int, overlap: int, pasta: str):
+    """
+    Cria um índice Chroma isolado (em `pasta`) com os chunks do documento.
+
+    Returns:
+        (colecao, mapa texto_do_chunk -> módulos, estatísticas do índice)
+    """
+    spans = mapear_modulos(texto)
+    chunks = dividir_texto(texto, tamanho_chunk=tamanho_chunk, overlap=overlap)
+    passo = tamanho_chunk - overlap
+
+    modulos_por_texto: Dict[str, Set[int]] = {}
+    for i, chunk in enumerate(chunks):
+        inicio = i * passo
+        modulos_por_texto.setdefault(chunk, set()).update(modulos_do_chunk(inicio, inicio + len(chunk), spans))
+
+    cliente = chromadb.PersistentClient(path=pasta)
+    colecao = cliente.get_or_create_collection(name="benchmark")
+    inicio_indexacao = time.perf_counter()
+    colecao.upsert(
+        documents=chunks,
+        ids=[f"chunk_{i}" for i in range(len(chunks))],
+        metadatas=[{"parte": i} for i in range(len(chunks))],
+    )
+    tempo_indexacao = time.perf_counter() - inicio_indexacao
+
+    bytes_disco = sum(
+        os.path.getsize(os.path.join(raiz, nome))
+        for raiz, _, nomes in os.walk(pasta)
+        for nome in nomes
+    )
+    estatisticas = {
+        "chunks": len(chunks),
+        "caracteres": sum(len(c) for c in chunks),
+        "bytes_disco": bytes_disco,
+        "indexacao_ms": round(tempo_indexacao * 1000, 1),
+    }
+    return colecao, modulos_por_texto, estatisticas
+
+
+def avaliar(colecao, modulos_por_texto: Dict[str, Set[int]], perguntas: List[Dict],
+            modo: Callable, n_results: int) -> Dict:
+    """
+    Roda as perguntas de ouro e calcula recall@k, MRR e latência.
+
+    recall@k: fração dos módulos esperados cobertos pelos k trechos retornados (média por pergunta).
+    MRR: média de 1/posição do primeiro trecho de um módulo esperado (0 se nenhum).
+    Também mede quantos trechos e quantos tokens (estimados) iriam para o prompt.
+    """
+    recalls, reciprocos, latencias, quantidades, tokens = [], [], [], [], []
+    falhas = []
+
+    for item in perguntas:
+        esperados = set(item["modulos"])
+        inicio = time.perf_counter()
+        trechos = modo(item["pergunta"], colecao, n_results)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        quantidades.append(len(trechos[:n_results]))
+        tokens.append(sum(estimar_tokens(t["texto"]) for t in trechos[:n_results]))
+
+        cobertos: Set[int] = set()
+        reciproco = 0.0
+        for posicao, trecho in enumerate(trechos[:n_results], start=1):
+            modulos = modulos_por_texto.get(trecho["texto"], set())
+            if modulos & esperados and not reciproco:
+                reciproco = 1.0 / posicao
+            cobertos |= modulos & esperados
+
+        recalls.append(len(cobertos) / len(esperados))
+        reciprocos.append(reciproco)
+        if not reciproco:
+            falhas.append(item["pergunta"])
+
+    latencias_ordenadas = sorted(latencias)
+    p95 = latencias_ordenadas[min(len(latencias) - 1, int(0.95 * len(latencias)))]
+    return {
+        "recall_k": round(statistics.mean(recalls), 3),
+        "mrr": round(statistics.mean(reciprocos), 3),
+        "latencia_ms_media": round(statistics.mean(latencias), 2),
+        "latencia_ms_p50": round(statistics.median(latencias), 2),
+        "latencia_ms_p95": round(p95, 2),
+        "trechos_medio": round(statistics.mean(quantidades), 2),
+        "tokens_contexto_medio": round(statistics.mean(tokens)),
+        "falhas": falhas,
+    }
+
+
+def _modulos_da_frase(frase: str, texto: str, spans: List[Tuple[int, int, int]]) -> Set[int]:
+    # As frases podem ter sido coladas com espaço no lugar de quebra de linha: procura pelo começo
+    posicao = texto.find(frase[:40])
+    if posicao < 0:
+        return set()
+    return {numero for numero, inicio, fim in spans if inicio <= posicao < fim}
+
+
+def _f1_termos(a: str, b: str) -> float:
+    termos_a, termos_b = termos(a), termos(b)
+    comuns = len(termos_a & termos_b)
+    if not comuns:
+        return 0.0
+    precisao, revocacao = comuns / len(termos_b), comuns / len(termos_a)
+    return 2 * precisao * revocacao / (precisao + revocacao)
+
+
+def avaliar_compressao(colecao, texto: str, perguntas: List[Dict], modo: Callable, n_results: int,
+                       respostas_llm: bool = False) -> Dict:
+    """
+    Compara o contexto recuperado com o comprimido (compressao_contexto) em cada pergunta de ouro.
+
+    razao: tokens antes / tokens depois (média).
+    recall_comprimido: fração dos módulos esperados que ainda aparecem nas frases mantidas.
+    equivalencia: fração das perguntas em que o comprimido cobre os mesmos módulos esperados que o original.
+    f1_respostas (com respostas_llm): sobreposição de termos entre as respostas do LLM com cada contexto.
+    """
+    spans = mapear_modulos(texto)
+    razoes, tokens_antes, tokens_depois, recalls, equivalentes, f1s = [], [], [], [], [], []
+
+    for item in perguntas:
+        esperados = set(item["modulos"])
+        trechos = modo(item["pergunta"], colecao, n_results)[:n_results]
+        comprimidos, estatisticas = comprimir_para_pergunta(item["pergunta"], trechos)
+
+        def cobertos(lista: List[Dict]) -> Set[int]:
+            modulos: Set[int] = set()
+            for trecho in lista:
+                for frase in dividir_frases(trecho["texto"]):
+                    modulos |= _modulos_da_frase(frase, texto, spans)
+            return modulos & esperados
+
+        antes, depois = cobertos(trechos), cobertos(comprimidos)
+        tokens_antes.append(estatisticas["tokens_antes"])
+        tokens_depois.append(estatisticas["tokens_depois"])
+        razoes.append(estatisticas["razao"] or 1.0)
+        recalls.append(len(depois) / len(esperados))
+        equivalentes.append(antes == depois)
+
+        if respostas_llm and trechos:
+            from resposta_ia import stream_resposta
+            original = "".join(stream_resposta(item["pergunta"], "\n---\n".join(t["texto"] for t in trechos),
+                                               coalescer=False))
+            reduzida = "".join(stream_resposta(item["pergunta"], "\n---\n".join(t["texto"] for t in comprimidos),
+                                               coalescer=False))
+            f1s.append(_f1_termos(original, reduzida))
+
+    resultado = {
+        "tokens_antes_medio": round(statistics.mean(tokens_antes)),
+        "tokens_depois_medio": round(statistics.mean(tokens_depois)),
+        "razao_media": round(statistics.mean(razoes), 2),
+        "recall_comprimido": round(statistics.mean(recalls), 3),
+        "equivalencia": round(sum(equivalentes) / len(equivalentes), 3),
+    }
+    if f1s:
+        resultado["f1_respostas"] = round(statistics.mean(f1s), 3)
+    return resultado
+
+
+def _lista_int(valor: str) -> List[int]:
+    return [int(v) for v in valor.split(",") if v.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de recuperação sobre o doc-info.txt")
+    parser.add_argument("--documento", default=os.path.join(PASTA_DOCUMENTOS, "doc-info.txt"))
+    parser.add_argument("--ouro", default=ARQUIVO_OURO, help="arquivo JSON com as perguntas de ouro")
+    parser.add_argument("--chunks", type=_lista_int, default=[500, 1000], help="tamanhos de chunk (vírgula)")
+    parser.add_argument("--overlaps", type=_lista_int, default=[100, 200], help="overlaps (vírgula)")
+    parser.add_argument("--n-results", type=_lista_int, default=[3, 5], help="valores de n_results (vírgula)")
+    parser.add_argument("--modos", default=",".join(MODOS_BUSCA), help="modos de busca (vírgula)")
+    parser.add_argument("--compressao", action="store_true",
+                        help="mede também a compressão do contexto (razão, módulos mantidos)")
+    parser.add_argument("--respostas-llm", action="store_true",
+                        help="com --compressao, gera as respostas com e sem compressão e compara (usa o LLM)")
+    parser.add_argument("--json", action="store_true", help="imprime os resultados em JSON")
+    args = parser.parse_args()
+
+    with open(args.documento, "r", encoding="utf-8") as f:
+        texto = f.read()
+    with open(args.ouro, "r", encoding="utf-8") as f:
+        perguntas = json.load(f)["perguntas"]
+
+    modos = [m.strip() for m in args.modos.split(",") if m.strip()]
+    desconhecidos = [m for m in modos if m not in MODOS_BUSCA]
+    if desconhecidos:
+        parser.error(f"modos desconhecidos: {', '.join(desconhecidos)} (disponíveis: {', '.join(MODOS_BUSCA)})")
+
+    resultados = []
+    for tamanho_chunk, overlap in itertools.product(args.chunks, args.overlaps):
+        if overlap >= tamanho_chunk:
+            continue
+        pasta = tempfile.mkdtemp(prefix="benchmark_rag_")
+        try:
+            colecao, modulos_por_texto, indice = construir_indice(texto, tamanho_chunk, overlap, pasta)
+            for modo, n_results in itertools.product(modos, args.n_results):
+                metricas = avaliar(colecao, modulos_por_texto, perguntas, MODOS_BUSCA[modo], n_results)
+                if args.compressao:
+                    metricas["compressao"] = avaliar_compressao(
+                        colecao, texto, perguntas, MODOS_BUSCA[modo], n_results, args.respostas_llm
+                    )
+                resultados.append({
+                    "chunk": tamanho_chunk, "overlap": overlap, "modo": modo, "n_results": n_results,
+                    "indice": indice, **metricas,
+                })
+        finally:
+            shutil.rmtree(pasta, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(resultados, ensure_ascii=False, indent=2))
+        return
+
+    print(f"[benchmark] {len(perguntas)} perguntas de ouro sobre {os.path.basename(args.documento)}")
+    print(f"{'chunk':>6} {'overlap':>7} {'modo':>8} {'k':>3} {'recall@k':>9} {'MRR':>6} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'trechos':>7} {'tokens':>6} {'chunks':>6} {'disco KB':>9}")
+    for r in resultados:
+        print(f"{r['chunk']:>6} {r['overlap']:>7} {r['modo']:>8} {r['n_results']:>3} {r['recall_k']:>9.3f} "
+              f"{r['mrr']:>6.3f} {r['latencia_ms_p50']:>8.2f} {r['latencia_ms_p95']:>8.2f} "
+              f"{r['trechos_medio']:>7.2f} {r['tokens_contexto_medio']:>6} "
+              f"{r['indice']['chunks']:>6} {r['indice']['bytes_disco'] / 1024:>9.1f}")
+
+    if args.compressao:
+        print("[benchmark] compressão do contexto")
+        print(f"{'chunk':>6} {'overlap':>7} {'modo':>8} {'k':>3} {'tokens':>7} {'comprim.':>8} {'razão':>6} "
+              f"{'recall@k':>9} {'rec.comp':>8} {'equival.':>8} {'F1 resp':>7}")
+        for r in resultados:
+            c = r["compressao"]
+            f1 = f"{c['f1_respostas']:>7.3f}" if "f1_respostas" in c else f"{'-':>7}"
+            print(f"{r['chunk']:>6} {r['overlap']:>7} {r['modo']:>8} {r['n_results']:>3} "
+                  f"{c['tokens_antes_medio']:>7} {c['tokens_depois_medio']:>8} {c['razao_media']:>6.2f} "
+                  f"{r['recall_k']:>9.3f} {c['recall_comprimido']:>8.3f} {c['equivalencia']:>8.3f} {f1}")
+
+
+if __name__ == "__main__":
+    main()
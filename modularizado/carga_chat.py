@@ -0,0 +1,163 @@
+"""
+Teste de carga do POST /chat com sessões de várias mensagens.
+Cada usuário virtual percorre conversas realistas (mesma session_id entre os turnos) e mede
+latência total, tempo até o primeiro byte da resposta (TTFT), vazão e taxa de erro.
+
+Uso (com o servidor LLM falso, sem rede):
+    python servidor_llm_falso.py --ttft-ms 300 --token-ms 20 &
+    LLM_BASE_URL=http://127.0.0.1:8765 GROQ_API_KEY=falsa uvicorn api:app --port 8000 &
+    python carga_chat.py --url http://127.0.0.1:8000 --usuarios 20 --sessoes 5
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional
+
+import httpx
+
+
+CONVERSAS: List[List[str]] = [
+    ["oi", "como faço para tirar o RG?", "moro em São Luís", "quais documentos preciso levar?", "onde fica o posto?"],
+    ["quero tirar o CPF do meu filho", "ele tem 10 anos", "moro em Imperatriz", "precisa agendar?"],
+    ["meu nome é Ana", "como emitir a carteira de trabalho digital?", "e se eu não tiver celular?"],
+    ["preciso da segunda via da certidão de nascimento", "nasci em Caxias", "quanto custa?", "só isso, obrigado"],
+    ["como tirar passaporte?", "moro em Teresina", "quanto tempo demora?", "onde fica a polícia federal?"],
+    ["perdi meu título de eleitor", "como consigo outro?", "posso fazer pela internet?"],
+]
+
+
+def percentil(valores: List[float], p: float) -> Optional[float]:
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, math.ceil(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+class ResultadosCarga:
+    """Acumula as medições de todas as threads."""
+
+    def __init__(self) -> None:
+        self.latencias: List[float] = []
+        self.ttfts: List[float] = []
+        self.status = Counter()
+        self.bytes_recebidos = 0
+        self._lock = threading.Lock()
+
+    def registrar(self, status: str, latencia: Optional[float] = None, ttft: Optional[float] = None,
+                  tamanho: int = 0) -> None:
+        with self._lock:
+            self.status[status] += 1
+            if latencia is not None:
+                self.latencias.append(latencia)
+            if ttft is not None:
+                self.ttfts.append(ttft)
+            self.bytes_recebidos += tamanho
+
+    def resumo(self, duracao: float) -> Dict:
+        total = sum(self.status.values())
+        ok = self.status.get("200", 0)
+
+        def ms(valor):
+            return round(valor * 1000, 1) if valor is not None else None
+
+        return {
+            "requisicoes": total,
+            "duracao_s": round(duracao, 2),
+            "vazao_rps": round(ok / duracao, 2) if duracao else 0.0,
+            "taxa_erro": round((total - ok) / total, 4) if total else 0.0,
+            "status": dict(self.status),
+            "latencia_ms": {f"p{p}": ms(percentil(self.latencias, p)) for p in (50, 95, 99)},
+            "ttft_ms": {f"p{p}": ms(percentil(self.ttfts, p)) for p in (50, 95, 99)},
+            "bytes_recebidos": self.bytes_recebidos,
+        }
+
+
+def executar_turno(cliente: httpx.Client, url: str, pergunta: str, session_id: str,
+                   resultados: ResultadosCarga) -> None:
+    inicio = time.perf_counter()
+    ttft = None
+    tamanho = 0
+    try:
+        with cliente.stream("POST", url, json={"pergunta": pergunta, "session_id": session_id}) as resposta:
+            for pedaco in resposta.iter_bytes():
+                if pedaco and ttft is None:
+                    ttft = time.perf_counter() - inicio
+                tamanho += len(pedaco)
+            status = str(resposta.status_code)
+    except httpx.TimeoutException:
+        status = "timeout"
+    except httpx.HTTPError:
+        status = "conexao"
+    latencia = time.perf_counter() - inicio
+    if status == "200":
+        resultados.registrar(status, latencia, ttft, tamanho)
+    else:
+        resultados.registrar(status)
+
+
+def usuario_virtual(url: str, sessoes: int, pausa_ms: float, prazo: float, resultados: ResultadosCarga,
+                    aleatorio: random.Random, fim: Optional[float]) -> None:
+    with httpx.Client(timeout=prazo) as cliente:
+        for _ in range(sessoes):
+            conversa = aleatorio.choice(CONVERSAS)
+            session_id = f"carga-{uuid.uuid4().hex[:12]}"
+            for pergunta in conversa:
+                if fim is not None and time.monotonic() >= fim:
+                    return
+                executar_turno(cliente, url, pergunta, session_id, resultados)
+                if pausa_ms:
+                    # Tempo de "digitação" entre mensagens da mesma sessão
+                    time.sleep(aleatorio.expovariate(1000 / pausa_ms))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Teste de carga do /chat com sessões de várias mensagens")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="endereço base da API")
+    parser.add_argument("--endpoint", default="/chat")
+    parser.add_argument("--usuarios", type=int, default=10, help="usuários simultâneos")
+    parser.add_argument("--sessoes", type=int, default=3, help="conversas por usuário")
+    parser.add_argument("--pausa-ms", type=float, default=500, help="pausa média entre mensagens")
+    parser.add_argument("--duracao", type=float, default=None, help="para após N segundos")
+    parser.add_argument("--prazo", type=float, default=60, help="timeout por requisição, em segundos")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="imprime o resumo em JSON")
+    args = parser.parse_args()
+
+    url = args.url.rstrip("/") + args.endpoint
+    resultados = ResultadosCarga()
+    fim = time.monotonic() + args.duracao if args.duracao else None
+
+    threads = []
+    inicio = time.perf_counter()
+    for i in range(args.usuarios):
+        aleatorio = random.Random(args.semente + i)
+        thread = threading.Thread(
+            target=usuario_virtual,
+            args=(url, args.sessoes, args.pausa_ms, args.prazo, resultados, aleatorio, fim),
+            daemon=True,
+        )
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    resumo = resultados.resumo(time.perf_counter() - inicio)
+
+    if args.json:
+        print(json.dumps(resumo, ensure_ascii=False, indent=2))
+        return
+    print(f"[carga] {resumo['requisicoes']} requisições em {resumo['duracao_s']}s "
+          f"({args.usuarios} usuários, {resumo['vazao_rps']} req/s)")
+    print(f"[carga] taxa de erro: {resumo['taxa_erro'] * 100:.2f}%  status: {resumo['status']}")
+    for nome in ("latencia_ms", "ttft_ms"):
+        valores = resumo[nome]
+        print(f"[carga] {nome}: p50={valores['p50']}  p95={valores['p95']}  p99={valores['p99']}")
+
+
+if __name__ == "__main__":
+    main()
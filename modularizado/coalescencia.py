@@ -0,0 +1,167 @@
+"""
+Módulo de coalescência (single-flight) de gerações idênticas e simultâneas.
+Quando várias pessoas mandam a mesma pergunta, com o mesmo contexto, ao mesmo tempo,
+só uma chamada ao LLM é feita e todos os assinantes recebem os pedaços conforme chegam.
+"""
+import hashlib
+import re
+import threading
+import unicodedata
+from typing import Callable, Dict, Iterator, List, Optional
+
+from logs import obter_logger
+
+logger = obter_logger("coalescencia")
+
+
+def normalizar_pergunta(pergunta: str) -> str:
+    """
+    Normaliza a pergunta para comparação: minúsculas, sem acentos, sem pontuação e com espaços simples.
+    """
+    texto = unicodedata.normalize("NFKD", pergunta.lower()).encode("ascii", "ignore").decode("ascii")
+    texto = re.sub(r"[^\w\s]", " ", texto)
+    return " ".join(texto.split())
+
+
+def chave_geracao(pergunta: str, contexto: str, historico: str = "") -> str:
+    """
+    Monta a chave de coalescência.
+
+    Args:
+        pergunta: Pergunta do usuário (normalizada aqui)
+        contexto: Contexto final do prompt; já inclui os trechos recuperados e os campos
+                  de perfil que entram no prompt (nome, localidade, situação, assunto)
+        historico: Histórico formatado da conversa (vazio na primeira pergunta)
+
+    Returns:
+        Hash hexadecimal que identifica a geração
+    """
+    h = hashlib.sha256()
+    for parte in (normalizar_pergunta(pergunta), contexto or "", historico or ""):
+        h.update(parte.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class Voo:
+    """
+    Uma geração em andamento. Os pedaços ficam guardados para que quem assinar depois
+    receba tudo desde o início e, em seguida, os próximos pedaços em tempo real.
+    """
+
+    def __init__(self) -> None:
+        self._pedacos: List[str] = []
+        self._cond = threading.Condition()
+        self._terminou = False
+        self._erro: Optional[BaseException] = None
+        self.assinantes = 0
+
+    def publicar(self, pedaco: str) -> None:
+        with self._cond:
+            self._pedacos.append(pedaco)
+            self._cond.notify_all()
+
+    def finalizar(self, erro: Optional[BaseException] = None) -> None:
+        with self._cond:
+            self._terminou = True
+            self._erro = erro
+            self._cond.notify_all()
+
+    @property
+    def abandonado(self) -> bool:
+        with self._cond:
+            return self.assinantes == 0
+
+    def _entrar(self) -> None:
+        with self._cond:
+            self.assinantes += 1
+
+    def assinar(self) -> Iterator[str]:
+        """
+        Produz os pedaços da geração na ordem. Propaga o erro da geração, se houver.
+        A assinatura já deve ter sido contada com _entrar().
+        """
+        indice = 0
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: indice < len(self._pedacos) or self._terminou)
+                    novos = self._pedacos[indice:]
+                    terminou = self._terminou
+                    erro = self._erro
+                indice += len(novos)
+                for pedaco in novos:
+                    yield pedaco
+                if terminou and not novos:
+                    if erro is not None:
+                        raise erro
+                    return
+        finally:
+            with self._cond:
+                self.assinantes -= 1
+
+
+class CoalescedorGeracoes:
+    """
+    Agrupa gerações com a mesma chave enquanto estão em andamento (não é cache:
+    quando a geração termina a chave é liberada e a próxima pergunta gera de novo).
+    """
+
+    def __init__(self) -> None:
+        self._voos: Dict[str, Voo] = {}
+        self._lock = threading.Lock()
+        self.geracoes = 0
+        self.coalescidas = 0
+
+    def executar(self, chave: str, produtor: Callable[[], Iterator[str]]) -> Iterator[str]:
+        """
+        Retorna um iterador com os pedaços da geração identificada por `chave`.
+        Se já existe uma geração igual em andamento, assina a ela; senão inicia `produtor`
+        em uma thread própria (a geração não depende do ritmo de leitura de nenhum assinante).
+        """
+        with self._lock:
+            voo = self._voos.get(chave)
+            lider = voo is None
+            if lider:
+                voo = Voo()
+                self._voos[chave] = voo
+                self.geracoes += 1
+            else:
+                self.coalescidas += 1
+            voo._entrar()
+
+        if lider:
+            threading.Thread(target=self._produzir, args=(chave, voo, produtor), daemon=True).start()
+        else:
+            logger.debug("pergunta idêntica em andamento", extra={"assinantes": voo.assinantes})
+
+        return voo.assinar()
+
+    def _produzir(self, chave: str, voo: Voo, produtor: Callable[[], Iterator[str]]) -> None:
+        erro = None
+        pedacos = produtor()
+        try:
+            for pedaco in pedacos:
+                voo.publicar(pedaco)
+                # Todos os assinantes desistiram (ex.: conexões fechadas): para de gastar o LLM.
+                # A checagem é feita sob o lock para ninguém assinar um voo já cancelado.
+                if voo.abandonado:
+                    with self._lock:
+                        cancelar = voo.abandonado
+                        if cancelar and self._voos.get(chave) is voo:
+                            del self._voos[chave]
+                    if cancelar:
+                        break
+        except BaseException as e:
+            erro = e
+        finally:
+            close = getattr(pedacos, "close", None)
+            if close:
+                close()
+            with self._lock:
+                if self._voos.get(chave) is voo:
+                    del self._voos[chave]
+            voo.finalizar(erro)
+
+
+geracoes = CoalescedorGeracoes()
@@ -0,0 +1,228 @@
+"""
+Módulo de compressão extrativa do contexto antes da geração.
+Cada trecho recuperado tem ~1000 caracteres, boa parte sem relação com a pergunta. Aqui os trechos
+são quebrados em frases, cada frase recebe uma nota (sobreposição de palavras com a pergunta +
+similaridade do embedding com o da pergunta, que já está em cache da busca) e só as melhores
+entram no prompt, junto com as frases vizinhas para o texto continuar fazendo sentido.
+
+Os trechos vêm de uma base fixa de documentos e se repetem entre turnos: os embeddings das frases
+ficam num cache LRU por texto, e só as frases nunca vistas passam pelo modelo.
+"""
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from banco_dados import funcao_embedding
+from config import COMPRESSAO_CACHE_FRASES, COMPRESSAO_MAX_TOKENS
+from logs import obter_logger
+from metricas import registro
+from montagem_prompt import estimar_tokens
+from rag import embeddar_consultas
+
+logger = obter_logger("compressao")
+
+_cache_frases: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_lock_cache = threading.Lock()
+_frases_cache = registro.contador(
+    "compressao_frases_cache_total", "Frases avaliadas na compressão, por acerto/falta no cache de embeddings"
+)
+_razao_compressao = registro.histograma(
+    "compressao_contexto_razao", "Tokens dos trechos antes / depois da compressão",
+    limites=(1.0, 1.25, 1.5, 2.0, 3.0, 4.0, 6.0, 8.0),
+)
+
+# Peso da sobreposição de palavras na nota da frase (o resto é a similaridade do embedding)
+PESO_LEXICO = 0.5
+# Frases menores que isso (ex.: numeração solta) não são avaliadas sozinhas
+MIN_CARACTERES_FRASE = 12
+
+_RE_FRASE = re.compile(r"(?<=[.!?;])\s+|\n+")
+_RE_PALAVRA = re.compile(r"\w+")
+STOPWORDS = {
+    "a", "o", "as", "os", "um", "uma", "de", "do", "da", "dos", "das", "em", "no", "na", "nos", "nas",
+    "por", "para", "pra", "com", "sem", "e", "ou", "que", "se", "eu", "meu", "minha", "me", "voce",
+    "ao", "aos", "como", "qual", "quais", "onde", "quando", "isso", "esse", "essa", "este", "esta",
+    "ja", "nao", "sim", "mais", "muito", "tem", "ter", "ser", "estou", "faco", "fazer", "posso",
+}
+
+
+def _normalizar(texto: str) -> str:
+    sem_acento = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in sem_acento if not unicodedata.combining(c))
+
+
+def termos(texto: str) -> set:
+    return {p for p in _RE_PALAVRA.findall(_normalizar(texto)) if p not in STOPWORDS and len(p) > 1}
+
+
+def dividir_frases(texto: str) -> List[str]:
+    """
+    Quebra um trecho em frases (pontuação final ou quebra de linha); pedaços muito curtos
+    são grudados na frase anterior.
+    """
+    frases: List[str] = []
+    for pedaco in _RE_FRASE.split(texto):
+        pedaco = pedaco.strip()
+        if not pedaco:
+            continue
+        if frases and len(pedaco) < MIN_CARACTERES_FRASE:
+            frases[-1] = f"{frases[-1]} {pedaco}"
+        else:
+            frases.append(pedaco)
+    return frases
+
+
+def embeddar_frases(frases: List[str]) -> np.ndarray:
+    """
+    Embeddings das frases, calculando num lote só as que não estão no cache.
+
+    Returns:
+        Matriz com um vetor por frase, na mesma ordem
+    """
+    unicas = list(dict.fromkeys(frases))
+    with _lock_cache:
+        vetores = {f: _cache_frases[f] for f in unicas if f in _cache_frases}
+        for frase in vetores:
+            _cache_frases.move_to_end(frase)
+
+    faltando = [f for f in unicas if f not in vetores]
+    _frases_cache.incrementar(len(vetores), {"resultado": "acerto"})
+    _frases_cache.incrementar(len(faltando), {"resultado": "falta"})
+    if faltando:
+        novos = [np.asarray(v, dtype=np.float32) for v in funcao_embedding()(faltando)]
+        vetores.update(zip(faltando, novos))
+        with _lock_cache:
+            for frase, vetor in zip(faltando, novos):
+                _cache_frases[frase] = vetor
+            while len(_cache_frases) > COMPRESSAO_CACHE_FRASES:
+                _cache_frases.popitem(last=False)
+
+    return np.stack([vetores[f] for f in frases])
+
+
+def _notas_semanticas(frases: List[str], vetor_consulta) -> Optional[np.ndarray]:
+    try:
+        vetores = embeddar_frases(frases)
+    except Exception as e:
+        logger.debug("embeddings das frases indisponíveis; usando só a nota lexical", extra={"erro": str(e)})
+        return None
+    consulta = np.asarray(vetor_consulta, dtype=np.float32)
+    normas = np.linalg.norm(vetores, axis=1) * (np.linalg.norm(consulta) or 1.0)
+    return (vetores @ consulta) / np.where(normas == 0, 1, normas)
+
+
+def pontuar_frases(pergunta: str, frases: List[str], vetor_consulta=None) -> List[float]:
+    """
+    Nota de cada frase para a pergunta: fração dos termos da pergunta presentes na frase e,
+    se houver o vetor da pergunta, similaridade de cosseno com o embedding da frase.
+    """
+    termos_pergunta = termos(pergunta)
+    lexicas = [
+        len(termos_pergunta & termos(frase)) / len(termos_pergunta) if termos_pergunta else 0.0
+        for frase in frases
+    ]
+    semanticas = _notas_semanticas(frases, vetor_consulta) if vetor_consulta is not None else None
+    if semanticas is None:
+        return lexicas
+    return [PESO_LEXICO * lex + (1 - PESO_LEXICO) * float(sem) for lex, sem in zip(lexicas, semanticas)]
+
+
+def comprimir_trechos(pergunta: str, trechos: List[Dict], max_tokens: int = COMPRESSAO_MAX_TOKENS,
+                      vetor_consulta=None) -> Tuple[List[Dict], Dict]:
+    """
+    Mantém só as frases mais relevantes dos trechos (e as vizinhas delas) dentro de `max_tokens`.
+
+    Args:
+        pergunta: Pergunta do usuário
+        trechos: Trechos {"texto", "distancia", ...} já selecionados pela busca
+        max_tokens: Orçamento de tokens (estimados) para todas as frases mantidas
+        vetor_consulta: Embedding da pergunta (sem ele a nota é só lexical)
+
+    Returns:
+        (trechos com o texto comprimido, na mesma ordem e sem os que ficaram vazios,
+         estatísticas {"tokens_antes", "tokens_depois", "razao", "frases"})
+    """
+    tokens_antes = sum(estimar_tokens(t["texto"]) for t in trechos)
+    if not trechos or tokens_antes <= max_tokens:
+        return trechos, {"tokens_antes": tokens_antes, "tokens_depois": tokens_antes, "razao": 1.0, "frases": None}
+
+    # (índice do trecho, posição da frase no trecho, texto)
+    frases: List[Tuple[int, int, str]] = [
+        (i, j, frase) for i, trecho in enumerate(trechos) for j, frase in enumerate(dividir_frases(trecho["texto"]))
+    ]
+    notas = pontuar_frases(pergunta, [f[2] for f in frases], vetor_consulta)
+    posicao = {(i, j): k for k, (i, j, _) in enumerate(frases)}
+
+    mantidas = set()
+    restante = max_tokens
+
+    def manter(k: int) -> bool:
+        nonlocal restante
+        if k in mantidas:
+            return True
+        custo = estimar_tokens(frases[k][2]) + 1
+        if custo > restante:
+            return False
+        mantidas.add(k)
+        restante -= custo
+        return True
+
+    for k in sorted(range(len(frases)), key=lambda k: -notas[k]):
+        if restante <= 0 or notas[k] <= 0:
+            break
+        if not manter(k):
+            continue
+        i, j, _ = frases[k]
+        # Vizinhas da mesma fonte dão o contexto da frase (ex.: o passo anterior de uma lista)
+        for vizinha in ((i, j - 1), (i, j + 1)):
+            if vizinha in posicao:
+                manter(posicao[vizinha])
+
+    por_trecho: Dict[int, List[int]] = {}
+    for k in sorted(mantidas):
+        i, j, _ = frases[k]
+        por_trecho.setdefault(i, []).append(j)
+
+    comprimidos = []
+    for i, trecho in enumerate(trechos):
+        texto, anterior = "", None
+        for j in por_trecho.get(i, []):
+            frase = frases[posicao[(i, j)]][2]
+            if anterior is None:
+                texto = frase
+            else:
+                # Frases seguidas continuam na mesma linha; um salto no trecho vira quebra de linha
+                separador = " " if j == anterior + 1 else "\n"
+                texto = f"{texto}{separador}{frase}"
+            anterior = j
+        if texto:
+            comprimidos.append({**trecho, "texto": texto})
+
+    tokens_depois = sum(estimar_tokens(t["texto"]) for t in comprimidos)
+    estatisticas = {
+        "tokens_antes": tokens_antes,
+        "tokens_depois": tokens_depois,
+        "razao": round(tokens_antes / tokens_depois, 2) if tokens_depois else None,
+        "frases": f"{len(mantidas)}/{len(frases)}",
+    }
+    return comprimidos, estatisticas
+
+
+def comprimir_para_pergunta(pergunta: str, trechos: List[Dict],
+                            max_tokens: int = COMPRESSAO_MAX_TOKENS) -> Tuple[List[Dict], Dict]:
+    """
+    comprimir_trechos usando o embedding da pergunta guardado pela busca do turno.
+    """
+    try:
+        vetor_consulta = embeddar_consultas([pergunta.strip()])[0]
+    except Exception as e:
+        logger.debug("embedding da pergunta indisponível; usando só a nota lexical", extra={"erro": str(e)})
+        vetor_consulta = None
+    comprimidos, estatisticas = comprimir_trechos(pergunta, trechos, max_tokens, vetor_consulta)
+    if estatisticas["razao"]:
+        _razao_compressao.observar(estatisticas["razao"])
+    return comprimidos, estatisticas
@@ -11,3 +11,68 @@ PASTA_BANCO_VETORIAL = os.path.join(BASE_DIR, "banco_vetorial")
 MODELO_IA = "openai/gpt-oss-120b"
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+
+# Gateway de LLM (llm_gateway.py). LLM_BASE_URL permite apontar para um servidor local/falso.
+LLM_BASE_URL = os.getenv("LLM_BASE_URL") or None
+LLM_PRAZO_SEGUNDOS = float(os.getenv("LLM_PRAZO_SEGUNDOS", "30"))
+LLM_TENTATIVAS = int(os.getenv("LLM_TENTATIVAS", "3"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "1") == "1"
+
+# Controle de admissão das requisições que usam o LLM (admissao.py)
+ADMISSAO_LIMITE = int(os.getenv("ADMISSAO_LIMITE", "8"))
+ADMISSAO_FILA = int(os.getenv("ADMISSAO_FILA", "16"))
+ADMISSAO_PRAZO_FILA = float(os.getenv("ADMISSAO_PRAZO_FILA", "10"))
+
+# /chat/lote: perguntas por requisição e gerações simultâneas de um lote (abaixo do ADMISSAO_LIMITE,
+# para um lote grande não ocupar todas as vagas do chat interativo)
+LOTE_MAX_PERGUNTAS = int(os.getenv("LOTE_MAX_PERGUNTAS", "50"))
+LOTE_PARALELISMO = int(os.getenv("LOTE_PARALELISMO", "4"))
+
+# Pools de threads isolados por tipo de carga (executores.py)
+POOL_CHAT = int(os.getenv("POOL_CHAT", "32"))
+POOL_ETAPAS = int(os.getenv("POOL_ETAPAS", "32"))
+POOL_TRANSCRICAO = int(os.getenv("POOL_TRANSCRICAO", "8"))
+POOL_INGESTAO = int(os.getenv("POOL_INGESTAO", "1"))
+POOL_FILA_MAX = int(os.getenv("POOL_FILA_MAX", "16"))
+
+# Serviço de embeddings compartilhado (servico_embeddings.py). Vazio = cada worker carrega o modelo.
+EMBEDDINGS_SOCKET = os.getenv("EMBEDDINGS_SOCKET", "")
+EMBEDDINGS_MAX_LOTE = int(os.getenv("EMBEDDINGS_MAX_LOTE", "64"))
+EMBEDDINGS_ESPERA_MS = float(os.getenv("EMBEDDINGS_ESPERA_MS", "5"))
+
+# Quanto um worker espera pela ingestão de outro (líder) antes de seguir com a versão publicada
+INDICE_ESPERA_LIDER = float(os.getenv("INDICE_ESPERA_LIDER", "600"))
+
+# Seleção dos trechos da busca (relevancia.py): distância máxima aceita (L2² do Chroma, 0 a 4)
+# e peso da relevância contra a diversidade no MMR
+RAG_DISTANCIA_MAXIMA = float(os.getenv("RAG_DISTANCIA_MAXIMA", "1.5"))
+RAG_MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", "0.7"))
+
+# Compressão extrativa do contexto (compressao_contexto.py): orçamento de tokens das frases mantidas
+COMPRESSAO_CONTEXTO = os.getenv("COMPRESSAO_CONTEXTO", "1") == "1"
+COMPRESSAO_MAX_TOKENS = int(os.getenv("COMPRESSAO_MAX_TOKENS", "400"))
+# Embeddings de frases dos trechos guardados entre turnos (~1,5 KB cada com o modelo padrão)
+COMPRESSAO_CACHE_FRASES = int(os.getenv("COMPRESSAO_CACHE_FRASES", "8192"))
+
+# Transcrição de WAV longo: segmentos cortados nos silêncios (segmentacao_audio.py), reconhecidos em paralelo
+VAD_SEGMENTO_MAX_S = float(os.getenv("VAD_SEGMENTO_MAX_S", "15"))
+VAD_SILENCIO_MIN_MS = int(os.getenv("VAD_SILENCIO_MIN_MS", "300"))
+TRANSCRICAO_PARALELISMO = int(os.getenv("TRANSCRICAO_PARALELISMO", "4"))
+
+# Speech-to-Text falso (speech_falso.py) para testar /transcribe sem credenciais
+SPEECH_FALSO = os.getenv("SPEECH_FALSO", "0") == "1"
+SPEECH_FALSO_TEXTO = os.getenv("SPEECH_FALSO_TEXTO", "Como faço para tirar a segunda via do CPF?")
+SPEECH_FALSO_LATENCIA_MS = float(os.getenv("SPEECH_FALSO_LATENCIA_MS", "200"))
+SPEECH_FALSO_MS_POR_KB = float(os.getenv("SPEECH_FALSO_MS_POR_KB", "1"))
+
+# Gazetteer de localidades.py: o IBGE lista 5.570 municípios; com menos que isso no municipios.tsv a API
+# avisa na inicialização que cidades fora da lista não serão reconhecidas
+MUNICIPIOS_MINIMO = int(os.getenv("MUNICIPIOS_MINIMO", "5500"))
+
+# Aquecimento na inicialização (aquecimento.py); /ready só responde 200 depois dele
+AQUECIMENTO = os.getenv("AQUECIMENTO", "1") == "1"
+
+# Logs estruturados (logs.py)
+LOG_NIVEL = os.getenv("LOG_NIVEL", "INFO").upper()
+LOG_FILA_MAX = int(os.getenv("LOG_FILA_MAX", "10000"))
+LOG_AMOSTRA_DEBUG = float(os.getenv("LOG_AMOSTRA_DEBUG", "0.1"))
@@ -1,17 +1,21 @@
 """
 Módulo para gerenciar contexto de conversa com janela deslizante (sliding window).
 """
-from typing import List, Tuple, Optional
+from typing import Callable, List, Tuple, Optional
 
+from localidades import resolver_localidade
 
-def formatar_historico_conversa(historico: List[Tuple[str, str]], max_chars: int = 2000) -> str:
+
+def formatar_historico_conversa(historico: List[Tuple[str, str]], max_chars: int = 2000,
+                                medir: Callable[[str], int] = len) -> str:
     """
     Formata o histórico de conversa em um texto legível, limitando o tamanho.
     Usa janela deslizante: mantém as mensagens mais recentes que cabem no limite.
     
     Args:
         historico: Lista de tuplas (pergunta, resposta)
-        max_chars: Número máximo de caracteres no histórico formatado
+        max_chars: Tamanho máximo do histórico formatado, na unidade de `medir`
+        medir: Função que mede cada mensagem (padrão: caracteres; ex.: estimar_tokens)
     
     Returns:
         String formatada com o histórico da conversa
@@ -26,7 +30,7 @@ def formatar_historico_conversa(historico: List[Tuple[str, str]], max_chars: int
     # Começa pelas mensagens mais recentes e vai adicionando até o limite
     for pergunta, resposta in reversed(historico):
         mensagem = f"Usuario: {pergunta}\nAssistente: {resposta}\n---\n"
-        tamanho_mensagem = len(mensagem)
+        tamanho_mensagem = medir(mensagem)
         
         # Se adicionar esta mensagem ultrapassar o limite, para
         if tamanho_total + tamanho_mensagem > max_chars and mensagens_formatadas:
@@ -80,18 +84,15 @@ def extrair_resumo_conversa(historico: List[Tuple[str, str]]) -> str:
             documentos.append("CNPJ")
         
         # Detecta localidades
-        estados = ["maranhao", "para", "sao paulo", "rio de janeiro", "minas gerais", 
-                   "bahia", "ceara", "parana", "rio grande do sul", "santa catarina"]
-        for estado in estados:
-            if estado in pergunta_lower:
-                localidades.append(estado.title())
-                break
+        localidade = resolver_localidade(pergunta).descricao()
+        if localidade:
+            localidades.append(localidade)
     
     resumo_partes = []
     if documentos:
         resumo_partes.append(f"Documentos mencionados: {', '.join(set(documentos))}")
     if localidades:
-        resumo_partes.append(f"Localidades mencionadas: {', '.join(set(localidades))}")
+        resumo_partes.append(f"Localidades mencionadas: {'; '.join(set(localidades))}")
     
     if resumo_partes:
         return "CONTEXTO DA CONVERSA: " + " | ".join(resumo_partes)
@@ -0,0 +1,104 @@
+"""
+Módulo para executar as etapas de um turno do chat como um pequeno grafo de dependências.
+Etapas independentes rodam em paralelo; cada etapa só começa quando suas dependências terminam.
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from executores import pool
+from instrumentacao import dentro_da_etapa
+
+
+class Etapa:
+    """
+    Uma etapa do turno: nome, função a executar e nomes das etapas das quais depende.
+    A função recebe um dicionário com os resultados das dependências.
+    """
+
+    def __init__(self, nome: str, funcao: Callable[[Dict[str, Any]], Any], depende_de: Iterable[str] = ()):
+        self.nome = nome
+        self.funcao = funcao
+        self.depende_de = list(depende_de)
+
+
+class GrafoEtapas:
+    """
+    Agenda etapas respeitando as dependências e executa as independentes em paralelo.
+    Guarda o tempo (em ms) de cada etapa em `tempos` para medição de latência; o que cada etapa
+    mede por dentro (medir_etapa) leva o nome dela na frente (ex.: "contexto.busca").
+    """
+
+    def __init__(self, executor=None) -> None:
+        self._etapas: Dict[str, Etapa] = {}
+        # Qualquer objeto com `submit` (ThreadPoolExecutor ou PoolIsolado); padrão: pool "etapas"
+        self._executor = executor or pool("etapas")
+        self.tempos: Dict[str, float] = {}
+
+    def adicionar(self, nome: str, funcao: Callable[[Dict[str, Any]], Any], depende_de: Iterable[str] = ()) -> None:
+        if nome in self._etapas:
+            raise ValueError(f"Etapa duplicada: {nome}")
+        self._etapas[nome] = Etapa(nome, funcao, depende_de)
+
+    def _executar_etapa(self, etapa: Etapa, entradas: Dict[str, Any]) -> Any:
+        inicio = time.perf_counter()
+        try:
+            with dentro_da_etapa(etapa.nome):
+                return etapa.funcao(entradas)
+        finally:
+            self.tempos[etapa.nome] = (time.perf_counter() - inicio) * 1000
+
+    def executar(self) -> Dict[str, Any]:
+        """
+        Executa todas as etapas e retorna um dicionário {nome_etapa: resultado}.
+        Se uma etapa falhar, a exceção é propagada depois que as etapas em andamento terminam.
+
+        Returns:
+            Dicionário com o resultado de cada etapa
+        """
+        return dict(self.executar_iter())
+
+    def executar_iter(self) -> Iterator[Tuple[str, Any]]:
+        """
+        Executa as etapas e produz (nome_etapa, resultado) assim que cada uma termina,
+        para que quem chama possa reagir (ex.: emitir um evento) sem esperar o grafo inteiro.
+        """
+        for etapa in self._etapas.values():
+            for dep in etapa.depende_de:
+                if dep not in self._etapas:
+                    raise ValueError(f"Etapa '{etapa.nome}' depende de etapa inexistente '{dep}'")
+
+        resultados: Dict[str, Any] = {}
+        pendentes: List[Etapa] = list(self._etapas.values())
+        em_andamento = {}
+        erro: Optional[BaseException] = None
+
+        while pendentes or em_andamento:
+            if erro is None:
+                prontas = [e for e in pendentes if all(d in resultados for d in e.depende_de)]
+                for etapa in prontas:
+                    pendentes.remove(etapa)
+                    entradas = {d: resultados[d] for d in etapa.depende_de}
+                    futuro = self._executor.submit(self._executar_etapa, etapa, entradas)
+                    em_andamento[futuro] = etapa.nome
+
+            if not em_andamento:
+                if pendentes and erro is None:
+                    nomes = ", ".join(e.nome for e in pendentes)
+                    raise ValueError(f"Dependência circular entre etapas: {nomes}")
+                break
+
+            concluidos, _ = wait(list(em_andamento), return_when=FIRST_COMPLETED)
+            for futuro in concluidos:
+                nome = em_andamento.pop(futuro)
+                try:
+                    resultados[nome] = futuro.result()
+                except BaseException as e:
+                    if erro is None:
+                        erro = e
+                    continue
+                if erro is None:
+                    yield nome, resultados[nome]
+
+        if erro is not None:
+            raise erro
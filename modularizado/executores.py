@@ -0,0 +1,121 @@
+"""
+Módulo de pools de threads isolados por tipo de carga (bulkheads).
+Chat, transcrição, ingestão e as etapas internas do chat têm pools próprios e limitados,
+para que uma rajada em um subsistema (ex.: uploads de áudio) não trave os outros
+nem o event loop. Cada pool expõe ocupação e fila em /metrics.
+"""
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Optional
+
+from config import POOL_CHAT, POOL_ETAPAS, POOL_TRANSCRICAO, POOL_INGESTAO, POOL_FILA_MAX
+from metricas import registro
+
+
+class PoolSaturado(Exception):
+    """O pool atingiu o limite de tarefas esperando; a requisição deve ser recusada (503)."""
+
+    def __init__(self, nome: str) -> None:
+        super().__init__(f"Pool '{nome}' saturado. Tente novamente em instantes.")
+        self.nome = nome
+
+
+class PoolIsolado:
+    """
+    ThreadPoolExecutor com tamanho fixo, fila opcionalmente limitada e métricas de saturação.
+    Compatível com a interface `submit` de concurrent.futures (usado por GrafoEtapas).
+    """
+
+    def __init__(self, nome: str, max_workers: int, fila_max: Optional[int] = None) -> None:
+        self.nome = nome
+        self.max_workers = max_workers
+        self.fila_max = fila_max
+        self.ativos = 0
+        self.na_fila = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"pool-{nome}")
+
+        rotulos = {"pool": nome}
+        registro.medidor("pool_ativos", "Tarefas em execução no pool").observar(lambda: self.ativos, rotulos)
+        registro.medidor("pool_fila", "Tarefas esperando thread no pool").observar(lambda: self.na_fila, rotulos)
+        registro.medidor("pool_capacidade", "Número de threads do pool").definir(max_workers, rotulos)
+        registro.medidor("pool_saturacao", "Fração das threads do pool ocupadas").observar(
+            lambda: self.ativos / self.max_workers, rotulos
+        )
+        self._recusadas = registro.contador("pool_recusadas_total", "Tarefas recusadas por pool saturado")
+        self._rotulos = rotulos
+
+    def _executar(self, funcao: Callable, args, kwargs) -> Any:
+        with self._lock:
+            self.na_fila -= 1
+            self.ativos += 1
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.ativos -= 1
+
+    def submit(self, funcao: Callable, *args, **kwargs) -> Future:
+        with self._lock:
+            if self.fila_max is not None and self.na_fila >= self.fila_max:
+                self._recusadas.incrementar(rotulos=self._rotulos)
+                raise PoolSaturado(self.nome)
+            self.na_fila += 1
+        try:
+            # Copia o contexto de quem submeteu (ex.: request_id dos logs) para a thread do pool
+            contexto = contextvars.copy_context()
+            return self._executor.submit(contexto.run, self._executar, funcao, args, kwargs)
+        except BaseException:
+            with self._lock:
+                self.na_fila -= 1
+            raise
+
+    async def executar(self, funcao: Callable, *args, **kwargs) -> Any:
+        """
+        Executa uma função bloqueante neste pool sem bloquear o event loop.
+        """
+        return await asyncio.wrap_future(self.submit(funcao, *args, **kwargs))
+
+    async def iterar(self, iterador: Iterable) -> AsyncIterator:
+        """
+        Consome um iterador síncrono (ex.: gerador de streaming) chamando next() neste pool,
+        para usar em StreamingResponse sem ocupar o threadpool padrão.
+        """
+        iterador = iter(iterador)
+        fim = object()
+        try:
+            while True:
+                item = await self.executar(next, iterador, fim)
+                if item is fim:
+                    break
+                yield item
+        finally:
+            # Cliente desconectou: fecha o gerador (libera admissão, cancela o LLM) fora do event loop
+            fechar = getattr(iterador, "close", None)
+            if fechar is not None:
+                self._executor.submit(_fechar_silenciosamente, fechar)
+
+
+def _fechar_silenciosamente(fechar: Callable[[], None]) -> None:
+    try:
+        fechar()
+    except Exception:
+        pass
+
+
+POOLS: Dict[str, PoolIsolado] = {
+    # Requisições de chat (heurísticas, espera de admissão e streaming da resposta)
+    "chat": PoolIsolado("chat", POOL_CHAT),
+    # Etapas paralelas de um turno (LLM de perfil, busca, links); separado para não disputar com "chat"
+    "etapas": PoolIsolado("etapas", POOL_ETAPAS),
+    # Speech-to-Text: poucas threads e fila curta, rajadas de áudio são recusadas cedo
+    "transcricao": PoolIsolado("transcricao", POOL_TRANSCRICAO, fila_max=POOL_FILA_MAX),
+    # Ingestão de documentos: uma por vez
+    "ingestao": PoolIsolado("ingestao", POOL_INGESTAO, fila_max=POOL_FILA_MAX),
+}
+
+
+def pool(nome: str) -> PoolIsolado:
+    return POOLS[nome]
@@ -0,0 +1,181 @@
+"""
+Módulo do estágio de streaming da resposta: remove markdown de forma segura entre pedaços
+e agrupa os deltas minúsculos do LLM em envios maiores (menos escritas e menos framing HTTP).
+"""
+import queue
+import threading
+import time
+from typing import Iterable, Iterator, List, Optional
+
+
+class RemovedorMarkdown:
+    """
+    Máquina de estados que remove markdown do texto em streaming, mesmo quando a marcação
+    chega quebrada entre dois pedaços (ex.: "*" em um delta e "*" no seguinte, ou "#" no fim de um
+    pedaço e o espaço no começo do próximo).
+
+    Remove: asteriscos (negrito/itálico), crases e marcadores de título ("#", "##"... no início da linha).
+    Mantém: "#" que não é título (ex.: "#1"), listas com "-" e links.
+    """
+
+    def __init__(self) -> None:
+        self._inicio_linha = True
+        self._hashes_pendentes = 0
+
+    def processar(self, pedaco: str) -> str:
+        saida: List[str] = []
+        for caractere in pedaco:
+            if self._hashes_pendentes:
+                if caractere == "#":
+                    self._hashes_pendentes += 1
+                    continue
+                if caractere == " ":
+                    # Era um título markdown: descarta os "#" e o espaço
+                    self._hashes_pendentes = 0
+                    self._inicio_linha = False
+                    continue
+                saida.append("#" * self._hashes_pendentes)
+                self._hashes_pendentes = 0
+
+            if caractere in "*`":
+                continue
+            if caractere == "#" and self._inicio_linha:
+                self._hashes_pendentes = 1
+                continue
+
+            saida.append(caractere)
+            if caractere == "\n":
+                self._inicio_linha = True
+            elif not (self._inicio_linha and caractere in " \t"):
+                self._inicio_linha = False
+        return "".join(saida)
+
+    def finalizar(self) -> str:
+        """Devolve o que ficou pendente quando o stream termina."""
+        resto = "#" * self._hashes_pendentes
+        self._hashes_pendentes = 0
+        return resto
+
+
+def limpar_markdown(pedacos: Iterable[str]) -> Iterator[str]:
+    """
+    Aplica RemovedorMarkdown a uma sequência de pedaços, sem produzir pedaços vazios.
+    """
+    removedor = RemovedorMarkdown()
+    for pedaco in pedacos:
+        limpo = removedor.processar(pedaco)
+        if limpo:
+            yield limpo
+    resto = removedor.finalizar()
+    if resto:
+        yield resto
+
+
+class _ErroLeitura:
+    def __init__(self, erro: BaseException) -> None:
+        self.erro = erro
+
+
+_FIM = object()
+
+
+def _ler_pedacos(pedacos: Iterable[str], fila: "queue.Queue", parar: threading.Event) -> None:
+    # Lê o stream numa thread própria para o agrupador poder esperar com prazo (fila.get(timeout=...))
+    iterador = iter(pedacos)
+    try:
+        for pedaco in iterador:
+            fila.put(pedaco)
+            if parar.is_set():
+                break
+        fila.put(_FIM)
+    except BaseException as e:
+        fila.put(_ErroLeitura(e))
+    finally:
+        # Fechado aqui, na thread que o consome (um gerador não pode ser fechado de outra thread)
+        close = getattr(iterador, "close", None)
+        if close:
+            close()
+
+
+def agrupar_pedacos(pedacos: Iterable[str], max_bytes: int = 64, max_ms: float = 20.0) -> Iterator[str]:
+    """
+    Agrupa deltas pequenos e envia quando o buffer passa de `max_bytes` ou quando o pedaço
+    mais antigo do buffer completa `max_ms` esperando, mesmo que o LLM pare de mandar deltas.
+    O primeiro delta sai na hora (não atrasa o primeiro token); o que sobrar no buffer é enviado
+    quando o stream termina.
+
+    Args:
+        pedacos: Deltas de texto vindos do LLM (lidos numa thread à parte)
+        max_bytes: Tamanho (UTF-8) que dispara o envio
+        max_ms: Tempo máximo, em milissegundos, que um pedaço fica retido
+
+    Returns:
+        Iterador com os pedaços agrupados
+    """
+    fila: "queue.Queue" = queue.Queue()
+    parar = threading.Event()
+    threading.Thread(target=_ler_pedacos, args=(pedacos, fila, parar), daemon=True, name="agrupar-pedacos").start()
+
+    buffer: List[str] = []
+    tamanho = 0
+    prazo: Optional[float] = None
+    limite = max_ms / 1000
+    primeiro = True
+
+    try:
+        while True:
+            try:
+                item = fila.get(timeout=None if prazo is None else max(0.0, prazo - time.monotonic()))
+            except queue.Empty:
+                # Prazo do pedaço mais antigo venceu sem novo delta
+                yield "".join(buffer)
+                buffer.clear()
+                tamanho = 0
+                prazo = None
+                continue
+            if item is _FIM:
+                break
+            if isinstance(item, _ErroLeitura):
+                raise item.erro
+            if not item:
+                continue
+            if primeiro:
+                primeiro = False
+                yield item
+                continue
+
+            if not buffer:
+                prazo = time.monotonic() + limite
+            buffer.append(item)
+            tamanho += len(item.encode("utf-8"))
+
+            if tamanho >= max_bytes or time.monotonic() >= prazo:
+                yield "".join(buffer)
+                buffer.clear()
+                tamanho = 0
+                prazo = None
+
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        # Consumidor desistiu (ou o stream acabou): a thread de leitura para no próximo delta
+        parar.set()
+
+
+class AcumuladorResposta:
+    """
+    Acumula a resposta do streaming em uma lista (evita cópias repetidas de `str +=`).
+    """
+
+    def __init__(self) -> None:
+        self._partes: List[str] = []
+
+    def adicionar(self, pedaco: str) -> None:
+        self._partes.append(pedaco)
+
+    @property
+    def texto(self) -> str:
+        return "".join(self._partes)
+
+    def __bool__(self) -> bool:
+        return any(self._partes)
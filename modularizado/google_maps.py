@@ -6,6 +6,8 @@ import re
 import urllib.parse
 from typing import Optional, List, Dict
 
+from localidades import nome_estado, resolver_localidade
+
 
 # Mapeamento de termos para órgãos públicos e suas variações
 ORGAOS_MAP = {
@@ -110,8 +112,7 @@ def extrair_orgaos_mencoes(pergunta: str) -> List[str]:
 
 def extrair_localidade_pergunta(pergunta: str) -> Optional[str]:
     """
-    Tenta extrair cidade/estado mencionado na pergunta.
-    Melhorado para capturar cidades e estados com mais precisão.
+    Tenta extrair cidade/estado mencionado na pergunta (gazetteer compartilhado de localidades.py).
     
     Args:
         pergunta: Texto da pergunta
@@ -119,102 +120,7 @@ def extrair_localidade_pergunta(pergunta: str) -> Optional[str]:
     Returns:
         Localidade extraída (ex: "São Luís, MA" ou "MA")
     """
-    # Estados brasileiros com nomes completos
-    estados = {
-        "acre": "AC", "alagoas": "AL", "amapa": "AP", "amazonas": "AM",
-        "bahia": "BA", "ceara": "CE", "distrito federal": "DF", "espirito santo": "ES",
-        "goias": "GO", "maranhao": "MA", "mato grosso": "MT", "mato grosso do sul": "MS",
-        "minas gerais": "MG", "para": "PA", "paraiba": "PB", "parana": "PR",
-        "pernambuco": "PE", "piaui": "PI", "rio de janeiro": "RJ",
-        "rio grande do norte": "RN", "rio grande do sul": "RS", "rondonia": "RO",
-        "roraima": "RR", "santa catarina": "SC", "sao paulo": "SP",
-        "sergipe": "SE", "tocantins": "TO"
-    }
-    
-    # Cidades principais por estado (para melhorar precisão)
-    cidades_principais = {
-        "MA": ["São Luís", "Imperatriz", "Caxias", "Timon", "Codó"],
-        "PA": ["Belém", "Ananindeua", "Marabá", "Paragominas", "Castanhal"],
-        "SP": ["São Paulo", "Guarulhos", "Campinas", "São Bernardo", "Santo André"],
-        "RJ": ["Rio de Janeiro", "São Gonçalo", "Duque de Caxias", "Nova Iguaçu", "Niterói"],
-        "MG": ["Belo Horizonte", "Uberlândia", "Contagem", "Juiz de Fora", "Betim"],
-        "RS": ["Porto Alegre", "Caxias do Sul", "Pelotas", "Canoas", "Santa Maria"],
-        "PR": ["Curitiba", "Londrina", "Maringá", "Ponta Grossa", "Cascavel"],
-        "BA": ["Salvador", "Feira de Santana", "Vitória da Conquista", "Camaçari", "Juazeiro"],
-        "SC": ["Florianópolis", "Joinville", "Blumenau", "São José", "Chapecó"],
-        "GO": ["Goiânia", "Aparecida de Goiânia", "Anápolis", "Rio Verde", "Luziânia"],
-        "PE": ["Recife", "Jaboatão dos Guararapes", "Olinda", "Caruaru", "Petrolina"],
-        "CE": ["Fortaleza", "Caucaia", "Juazeiro do Norte", "Maracanaú", "Sobral"],
-        "PB": ["João Pessoa", "Campina Grande", "Santa Rita", "Patos", "Bayeux"],
-        "AL": ["Maceió", "Arapiraca", "Rio Largo", "Palmeira dos Índios", "União dos Palmares"],
-        "SE": ["Aracaju", "Nossa Senhora do Socorro", "Lagarto", "Itabaiana", "São Cristóvão"],
-        "RN": ["Natal", "Mossoró", "Parnamirim", "São Gonçalo do Amarante", "Macaíba"],
-        "PI": ["Teresina", "Parnaíba", "Picos", "Piripiri", "Campo Maior"],
-        "TO": ["Palmas", "Araguaína", "Gurupi", "Porto Nacional", "Paraíso do Tocantins"],
-    }
-    
-    siglas = ["ac", "al", "ap", "am", "ba", "ce", "df", "es", "go", "ma", "mt", "ms",
-              "mg", "pa", "pb", "pr", "pe", "pi", "rj", "rn", "rs", "ro", "rr", "sc", "sp", "se", "to"]
-    
-    pergunta_lower = pergunta.lower()
-    
-    # Normaliza brasilia
-    if "brasilia" in pergunta_lower or "brasília" in pergunta_lower:
-        return "Brasília, DF"
-    
-    # Tratamento especial para casos comuns de confusão
-    # "São Maranhão" geralmente significa "São Luís, MA" (capital)
-    if "são maranhao" in pergunta_lower or "sao maranhao" in pergunta_lower:
-        return "São Luís, MA"
-    
-    # "São Pará" pode ser Belém
-    if "são para" in pergunta_lower or "sao para" in pergunta_lower:
-        return "Belém, PA"
-    
-    # Procura padrões como "em [cidade]", "na [cidade]", "de [cidade]"
-    # Ex: "em são luís", "na capital", "de belém"
-    palavras = pergunta_lower.split()
-    cidade_detectada = None
-    estado_detectado = None
-    
-    # Procura estados completos primeiro
-    for estado_nome, sigla in estados.items():
-        if estado_nome in pergunta_lower:
-            estado_detectado = sigla
-            break
-    
-    # Se não encontrou estado completo, procura sigla
-    if not estado_detectado:
-        tokens = [t.strip("., ").lower() for t in pergunta.split()]
-        for token in tokens:
-            if token in siglas:
-                estado_detectado = token.upper()
-                break
-    
-    # Procura cidades conhecidas
-    if estado_detectado and estado_detectado in cidades_principais:
-        for cidade in cidades_principais[estado_detectado]:
-            if cidade.lower() in pergunta_lower:
-                cidade_detectada = cidade
-                break
-    
-    # Se encontrou cidade e estado, retorna ambos
-    if cidade_detectada and estado_detectado:
-        return f"{cidade_detectada}, {estado_detectado}"
-    
-    # Se só encontrou estado, retorna sigla
-    if estado_detectado:
-        return estado_detectado
-    
-    # Tenta extrair cidade genérica antes de preposições
-    preposicoes = ["em", "na", "no", "de", "da", "do", "para", "pra"]
-    for i, palavra in enumerate(palavras):
-        if palavra in preposicoes and i + 1 < len(palavras):
-            cidade_candidata = palavras[i + 1].strip(".,")
-            if len(cidade_candidata) > 2 and estado_detectado:
-                return f"{cidade_candidata.title()}, {estado_detectado}"
-    
-    return None
+    return resolver_localidade(pergunta).formatar()
 
 
 def gerar_link_google_maps(orgao_id: str, localidade: Optional[str] = None) -> str:
@@ -241,18 +147,7 @@ def gerar_link_google_maps(orgao_id: str, localidade: Optional[str] = None) -> s
         
         # Se for só sigla (ex: "MA"), expande para o estado completo
         if len(localidade_clean) == 2:
-            # Mapeamento de siglas para nomes completos
-            sigla_para_estado = {
-                "AC": "Acre", "AL": "Alagoas", "AP": "Amapá", "AM": "Amazonas",
-                "BA": "Bahia", "CE": "Ceará", "DF": "Distrito Federal", "ES": "Espírito Santo",
-                "GO": "Goiás", "MA": "Maranhão", "MT": "Mato Grosso", "MS": "Mato Grosso do Sul",
-                "MG": "Minas Gerais", "PA": "Pará", "PB": "Paraíba", "PR": "Paraná",
-                "PE": "Pernambuco", "PI": "Piauí", "RJ": "Rio de Janeiro",
-                "RN": "Rio Grande do Norte", "RS": "Rio Grande do Sul", "RO": "Rondônia",
-                "RR": "Roraima", "SC": "Santa Catarina", "SP": "São Paulo",
-                "SE": "Sergipe", "TO": "Tocantins"
-            }
-            estado_nome = sigla_para_estado.get(localidade_clean.upper(), localidade_clean)
+            estado_nome = nome_estado(localidade_clean)
             # Para melhor precisão, adiciona termos específicos do órgão
             query = f"{nome_busca} {estado_nome} Brasil"
         else:
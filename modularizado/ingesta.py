@@ -1,10 +1,28 @@
+import hashlib
 import os
-from pypdf import PdfReader
-from docx import Document
-from config import PASTA_DOCUMENTOS
-from banco_dados import colecao_global
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
 
-def dividir_texto(texto, tamanho_chunk=1000, overlap=200):
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos (rode com um worker só)
+    fcntl = None
+
+from config import PASTA_DOCUMENTOS, PASTA_BANCO_VETORIAL, INDICE_ESPERA_LIDER
+from banco_dados import (
+    client_chroma, obter_colecao_global, opcoes_colecao, ler_indice_publicado, publicar_indice, nome_versao,
+)
+from logs import obter_logger
+
+logger = obter_logger("ingesta")
+
+ARQUIVO_TRAVA = os.path.join(PASTA_BANCO_VETORIAL, "ingestao.lock")
+EXTENSOES = (".txt", ".pdf", ".docx")
+TAMANHO_CHUNK = 1000
+OVERLAP = 200
+
+def dividir_texto(texto, tamanho_chunk=TAMANHO_CHUNK, overlap=OVERLAP):
     chunks = []
     inicio = 0
 
@@ -19,13 +37,16 @@ def extrair_texto(caminho_arquivo):
     extensao = os.path.splitext(caminho_arquivo)[1].lower()
 
     try:
+        # Leitores de PDF/DOCX só são importados quando há um arquivo desse tipo
         if extensao == ".pdf":
+            from pypdf import PdfReader
             leitor = PdfReader(caminho_arquivo)
             return "\n".join(
                 [p.extract_text() for p in leitor.pages if p.extract_text()]
             )
 
         if extensao == ".docx":
+            from docx import Document
             doc = Document(caminho_arquivo)
             return "\n".join(p.text for p in doc.paragraphs)
 
@@ -34,43 +55,49 @@ def extrair_texto(caminho_arquivo):
                 return f.read()
 
     except Exception as e:
-        print(f"Erro ao ler {caminho_arquivo}: {e}")
+        logger.error("erro ao ler arquivo", extra={"arquivo": caminho_arquivo, "erro": str(e)})
 
     return None
 
-def processar_arquivos():
+def processar_arquivos(colecao=None) -> int:
     """
     Processa todos os arquivos na pasta de documentos e os adiciona ao banco vetorial.
+
+    Args:
+        colecao: Coleção de destino (padrão: a versão publicada da coleção global)
+
+    Returns:
+        int: Número de chunks gravados
     """
+    colecao = colecao if colecao is not None else obter_colecao_global()
     if not os.path.exists(PASTA_DOCUMENTOS):
         os.makedirs(PASTA_DOCUMENTOS, exist_ok=True)
-        print(f"[ingesta] Pasta criada: {PASTA_DOCUMENTOS}")
-        print("[ingesta] Adicione arquivos e tente novamente.")
-        return
+        logger.warning("pasta de documentos criada; adicione arquivos e tente novamente", extra={"pasta": PASTA_DOCUMENTOS})
+        return 0
 
     arquivos = [
         f for f in os.listdir(PASTA_DOCUMENTOS)
-        if f.endswith((".txt", ".pdf", ".docx"))
+        if f.endswith(EXTENSOES)
     ]
 
     if not arquivos:
-        print(f"[ingesta] ⚠️ Nenhum arquivo encontrado em {PASTA_DOCUMENTOS}")
-        return
+        logger.warning("nenhum arquivo encontrado", extra={"pasta": PASTA_DOCUMENTOS})
+        return 0
 
-    print(f"[ingesta] Encontrados {len(arquivos)} arquivo(s) para processar")
+    logger.info("arquivos encontrados para processar", extra={"arquivos": len(arquivos)})
     total_chunks = 0
 
     for nome in arquivos:
         caminho = os.path.join(PASTA_DOCUMENTOS, nome)
-        print(f"[ingesta] Processando: {nome}")
+        logger.debug("processando arquivo", extra={"arquivo": nome})
         texto = extrair_texto(caminho)
 
         if not texto:
-            print(f"[ingesta] ⚠️ Não foi possível extrair texto de {nome}")
+            logger.warning("não foi possível extrair texto", extra={"arquivo": nome})
             continue
 
         if len(texto.strip()) == 0:
-            print(f"[ingesta] ⚠️ Arquivo {nome} está vazio")
+            logger.warning("arquivo vazio", extra={"arquivo": nome})
             continue
 
         chunks = dividir_texto(texto)
@@ -78,16 +105,113 @@ def processar_arquivos():
         metadados = [{"origem": nome, "parte": i} for i in range(len(chunks))]
 
         try:
-            colecao_global.upsert(
+            colecao.upsert(
                 documents=chunks,
                 ids=ids,
                 metadatas=metadados
             )
             total_chunks += len(chunks)
-            print(f"[ingesta] ✅ {nome}: {len(chunks)} chunks salvos ({len(texto)} caracteres)")
-        except Exception as e:
-            print(f"[ingesta] ❌ Erro ao salvar {nome}: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.info("chunks salvos", extra={"arquivo": nome, "chunks": len(chunks), "caracteres": len(texto)})
+        except Exception:
+            logger.exception("erro ao salvar chunks", extra={"arquivo": nome})
+
+    logger.info("ingestão finalizada", extra={"chunks": total_chunks})
+    return total_chunks
+
+
+def impressao_documentos() -> str:
+    """
+    Identifica o conteúdo da pasta de documentos (nome, tamanho e data de cada arquivo) e a
+    forma de dividir em chunks. Se não mudou desde a última publicação, não há o que reindexar.
+    """
+    partes = [f"chunk={TAMANHO_CHUNK}/{OVERLAP}"]
+    if os.path.isdir(PASTA_DOCUMENTOS):
+        for nome in sorted(os.listdir(PASTA_DOCUMENTOS)):
+            if nome.endswith(EXTENSOES):
+                estado = os.stat(os.path.join(PASTA_DOCUMENTOS, nome))
+                partes.append(f"{nome}:{estado.st_size}:{estado.st_mtime_ns}")
+    return hashlib.sha1("\n".join(partes).encode("utf-8")).hexdigest()
+
+
+@contextmanager
+def trava_ingestao(prazo: float = INDICE_ESPERA_LIDER) -> Iterator[bool]:
+    """
+    Trava de arquivo que elege o líder da ingestão entre os workers (e processos) que
+    compartilham o banco vetorial. Espera até `prazo` segundos pela trava.
 
-    print(f"[ingesta] ✅ Ingestão finalizada. Total: {total_chunks} chunks processados")
+    Yields:
+        bool: True se este processo ficou com a trava
+    """
+    os.makedirs(PASTA_BANCO_VETORIAL, exist_ok=True)
+    with open(ARQUIVO_TRAVA, "a+") as arquivo:
+        if fcntl is None:
+            yield True
+            return
+
+        limite = time.monotonic() + prazo
+        avisou = False
+        while True:
+            try:
+                fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= limite:
+                    yield False
+                    return
+                if not avisou:
+                    logger.info("outro processo está ingerindo; aguardando a publicação do índice")
+                    avisou = True
+                time.sleep(0.5)
+        try:
+            yield True
+        finally:
+            fcntl.flock(arquivo.fileno(), fcntl.LOCK_UN)
+
+
+def _reindexar(versao: int, impressao: str) -> Dict:
+    nome = nome_versao(versao)
+    # Restos de uma ingestão interrompida com o mesmo número de versão
+    try:
+        client_chroma.delete_collection(nome)
+    except Exception:
+        pass
+    colecao = client_chroma.create_collection(name=nome, **opcoes_colecao())
+
+    total = processar_arquivos(colecao)
+    if total == 0:
+        client_chroma.delete_collection(nome)
+        logger.warning("ingestão não gerou chunks; mantendo a versão publicada do índice")
+        return {"status": "sem_documentos"}
+
+    info = publicar_indice(versao, chunks=total, impressao=impressao, publicado_em=time.time())
+    logger.info("índice publicado", extra={"colecao": nome, "versao": versao, "chunks": total})
+    return {"status": "publicado", **info}
+
+
+def atualizar_indice(forcar: bool = False, prazo: float = INDICE_ESPERA_LIDER) -> Dict:
+    """
+    Garante que a coleção global reflete a pasta de documentos, com uma ingestão só mesmo
+    com vários workers: quem pega a trava ingere numa versão nova e publica; quem chega
+    depois encontra a versão publicada com a mesma impressão dos documentos e só a usa.
+
+    Args:
+        forcar: Reingere mesmo se os documentos não mudaram (ex.: POST /ingest)
+        prazo: Quanto esperar pela ingestão de outro processo
+
+    Returns:
+        dict: {"status": "publicado" | "atualizado" | "sem_documentos" | "ocupado", ...dados da versão}
+    """
+    with trava_ingestao(prazo) as lider:
+        if not lider:
+            logger.warning("ingestão de outro processo não terminou no prazo; usando a versão publicada",
+                           extra={"prazo_s": prazo})
+            return {"status": "ocupado", **(ler_indice_publicado() or {})}
+
+        publicado = ler_indice_publicado()
+        impressao = impressao_documentos()
+        if publicado and publicado.get("impressao") == impressao and not forcar:
+            logger.info("índice global já atualizado", extra={"colecao": publicado["colecao"]})
+            return {"status": "atualizado", **publicado}
+
+        versao = (publicado or {}).get("versao", 0) + 1
+        return _reindexar(versao, impressao)
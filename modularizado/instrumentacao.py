@@ -0,0 +1,110 @@
+"""
+Módulo de medição de latência por etapa do chat.
+Cada etapa medida vira uma observação no histograma `chat_etapa_segundos{etapa=...}` (GET /metrics)
+e, quando há um turno em andamento, entra no resumo do cabeçalho `Server-Timing` daquele turno.
+
+Etapas medidas dentro de outra levam o nome da etapa pai na frente, separado por ponto: a consulta
+ao Chroma feita na busca do contexto vira "contexto.busca.chroma_query". Assim só etapas do mesmo
+nível são somadas ou comparadas; as internas já estão contidas no tempo da etapa pai.
+"""
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from metricas import registro
+
+
+histograma_etapas = registro.histograma(
+    "chat_etapa_segundos", "Duração de cada etapa de um turno do chat, em segundos"
+)
+
+# Nome completo da etapa em andamento; copiado para as threads dos pools junto com o contexto
+_etapa_atual: ContextVar[str] = ContextVar("etapa_atual", default="")
+
+
+def nome_aninhado(etapa: str) -> str:
+    """Nome da etapa com o da etapa em andamento na frente (ex.: "busca" -> "contexto.busca")."""
+    pai = _etapa_atual.get()
+    return f"{pai}.{etapa}" if pai else etapa
+
+
+@contextmanager
+def dentro_da_etapa(etapa: str) -> Iterator[str]:
+    """
+    Marca as medições internas como parte de `etapa`, sem medi-la (para etapas cujo tempo é medido
+    por outro caminho, como as do GrafoEtapas).
+
+    Yields:
+        Nome completo da etapa
+    """
+    nome = nome_aninhado(etapa)
+    token = _etapa_atual.set(nome)
+    try:
+        yield nome
+    finally:
+        _etapa_atual.reset(token)
+
+
+def registrar_etapa(etapa: str, segundos: float, tempos: Optional["TemposTurno"] = None) -> None:
+    """
+    Registra a duração de uma etapa no histograma e, se informado, nos tempos do turno.
+    """
+    if tempos is not None:
+        tempos.registrar(etapa, segundos)
+    else:
+        histograma_etapas.observar(segundos, {"etapa": etapa})
+
+
+@contextmanager
+def medir_etapa(etapa: str, tempos: Optional["TemposTurno"] = None) -> Iterator[None]:
+    """
+    Uso: `with medir_etapa("chroma_query", tempos): ...` (mede mesmo se houver erro).
+    Dentro de outra etapa, o nome registrado é o aninhado (ex.: "contexto.busca.chroma_query").
+    """
+    inicio = time.perf_counter()
+    with dentro_da_etapa(etapa) as nome:
+        try:
+            yield
+        finally:
+            registrar_etapa(nome, time.perf_counter() - inicio, tempos)
+
+
+class TemposTurno:
+    """
+    Tempos das etapas de um turno. Seguro entre threads (as etapas do GrafoEtapas rodam em paralelo);
+    etapas repetidas (ex.: várias consultas ao Chroma) têm as durações somadas.
+    """
+
+    def __init__(self) -> None:
+        self._duracoes: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, etapa: str, segundos: float) -> None:
+        histograma_etapas.observar(segundos, {"etapa": etapa})
+        with self._lock:
+            self._duracoes[etapa] = self._duracoes.get(etapa, 0.0) + segundos
+
+    def medir(self, etapa: str):
+        return medir_etapa(etapa, self)
+
+    def como_dict(self) -> Dict[str, float]:
+        """
+        Returns:
+            {etapa: duração em ms}, na ordem em que as etapas terminaram
+        """
+        with self._lock:
+            return {etapa: round(segundos * 1000, 1) for etapa, segundos in self._duracoes.items()}
+
+    def server_timing(self) -> str:
+        """
+        Valor do cabeçalho Server-Timing (ex.: "heuristicas;dur=1.2, contexto;dur=35.0,
+        contexto.busca;dur=33.1"). Entradas com ponto estão contidas na etapa do prefixo.
+        """
+        partes = []
+        for etapa, ms in self.como_dict().items():
+            nome = re.sub(r"[^A-Za-z0-9_.-]", "_", etapa)
+            partes.append(f"{nome};dur={ms}")
+        return ", ".join(partes)
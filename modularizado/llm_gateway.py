@@ -0,0 +1,391 @@
+"""
+Gateway único para todas as chamadas ao LLM (Groq).
+Compartilha um pool de conexões keep-alive, aplica prazo por chamada, repete falhas
+transitórias com backoff exponencial com jitter, pode disparar uma requisição "hedge"
+quando o primeiro token demora mais que o p95 e abre o circuito durante instabilidades do provedor.
+"""
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, List, Optional
+
+import httpx
+import groq
+from groq import Groq
+
+from config import (
+    GROQ_API_KEY, MODELO_IA, LLM_BASE_URL, LLM_PRAZO_SEGUNDOS, LLM_TENTATIVAS, LLM_HEDGE,
+)
+from logs import obter_logger
+
+logger = obter_logger("llm_gateway")
+
+
+# Erros em que vale a pena tentar de novo (rede, timeout, 429 e 5xx)
+ERROS_TRANSITORIOS = (
+    groq.APIConnectionError,
+    groq.APITimeoutError,
+    groq.RateLimitError,
+    groq.InternalServerError,
+)
+
+
+class CircuitoAberto(Exception):
+    """Provedor de LLM marcado como indisponível; a chamada falha sem ir à rede."""
+
+
+class DisjuntorCircuito:
+    """
+    Circuit breaker simples: depois de `limite_falhas` falhas transitórias seguidas o circuito abre
+    e as chamadas falham na hora. Após `tempo_aberto` segundos uma chamada de teste é liberada;
+    se der certo o circuito fecha, se falhar abre de novo.
+    """
+
+    def __init__(self, limite_falhas: int = 5, tempo_aberto: float = 30.0) -> None:
+        self.limite_falhas = limite_falhas
+        self.tempo_aberto = tempo_aberto
+        self._falhas = 0
+        self._aberto_desde: Optional[float] = None
+        self._teste_em_andamento = False
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self) -> str:
+        with self._lock:
+            if self._aberto_desde is None:
+                return "fechado"
+            if time.monotonic() - self._aberto_desde >= self.tempo_aberto:
+                return "meio_aberto"
+            return "aberto"
+
+    def permitir(self) -> Optional[str]:
+        """
+        Returns:
+            None se a chamada deve falhar; "normal" com o circuito fechado; "teste" para a chamada
+            de teste do meio aberto, que deve terminar em registrar_sucesso/registrar_falha ou liberar_teste
+        """
+        with self._lock:
+            if self._aberto_desde is None:
+                return "normal"
+            if time.monotonic() - self._aberto_desde < self.tempo_aberto:
+                return None
+            # Meio aberto: deixa passar só uma chamada de teste por vez
+            if self._teste_em_andamento:
+                return None
+            self._teste_em_andamento = True
+            return "teste"
+
+    def liberar_teste(self) -> None:
+        """Chamada de teste abandonada (ex.: cliente desconectou): libera a vaga sem mudar o estado."""
+        with self._lock:
+            self._teste_em_andamento = False
+
+    def registrar_sucesso(self) -> None:
+        with self._lock:
+            self._falhas = 0
+            self._aberto_desde = None
+            self._teste_em_andamento = False
+
+    def registrar_falha(self) -> None:
+        with self._lock:
+            self._falhas += 1
+            self._teste_em_andamento = False
+            if self._aberto_desde is not None or self._falhas >= self.limite_falhas:
+                self._aberto_desde = time.monotonic()
+
+
+class JanelaLatencia:
+    """
+    Guarda as últimas amostras de latência (em segundos) para calcular percentis.
+    """
+
+    def __init__(self, tamanho: int = 200) -> None:
+        self._amostras = deque(maxlen=tamanho)
+        self._lock = threading.Lock()
+
+    def adicionar(self, valor: float) -> None:
+        with self._lock:
+            self._amostras.append(valor)
+
+    def __len__(self) -> int:
+        return len(self._amostras)
+
+    def percentil(self, p: float) -> Optional[float]:
+        with self._lock:
+            if not self._amostras:
+                return None
+            ordenadas = sorted(self._amostras)
+        indice = min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))
+        return ordenadas[indice]
+
+
+class _CorridaHedge:
+    """
+    Coordena requisições concorrentes de streaming: a primeira que recebe um token vence
+    e as demais fecham seus streams.
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self.vencedor = None
+        self.erros: List[BaseException] = []
+        self.iniciadas = 0
+        # Quem pediu o stream desistiu (prazo estourado ou erro): tentativas atrasadas fecham o próprio stream
+        self.encerrada = False
+
+    def reivindicar(self, resultado) -> bool:
+        with self._cond:
+            if self.vencedor is not None or self.encerrada:
+                return False
+            self.vencedor = resultado
+            self._cond.notify_all()
+            return True
+
+    def falhar(self, erro: BaseException) -> None:
+        with self._cond:
+            self.erros.append(erro)
+            self._cond.notify_all()
+
+    def encerrar(self) -> None:
+        with self._cond:
+            self.encerrada = True
+
+    def esperar(self, timeout: Optional[float]) -> None:
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self.vencedor is not None or len(self.erros) >= self.iniciadas,
+                timeout=timeout,
+            )
+
+
+class GatewayLLM:
+    """
+    Ponto único de acesso ao LLM. Use `completar` para respostas inteiras e `stream` para streaming.
+    """
+
+    def __init__(self, api_key: Optional[str] = GROQ_API_KEY, base_url: Optional[str] = LLM_BASE_URL,
+                 prazo: float = LLM_PRAZO_SEGUNDOS, tentativas: int = LLM_TENTATIVAS,
+                 hedge: bool = LLM_HEDGE, modelo: str = MODELO_IA) -> None:
+        self.modelo = modelo
+        self.prazo = prazo
+        self.tentativas = max(1, tentativas)
+        self.hedge = hedge
+        # Hedge só depois de ter amostras suficientes para um p95 confiável
+        self.min_amostras_hedge = 20
+        self.min_espera_hedge = 0.3
+        self.backoff_base = 0.25
+        self.backoff_teto = 4.0
+
+        self.disjuntor = DisjuntorCircuito()
+        self.ttft = JanelaLatencia()
+
+        # Pool keep-alive compartilhado por todas as chamadas (evita novo handshake TLS por requisição)
+        self._http = httpx.Client(
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=120),
+            timeout=httpx.Timeout(prazo, connect=5.0),
+        )
+        # Repetições ficam por conta do gateway, não do SDK
+        self._cliente = Groq(api_key=api_key, base_url=base_url, http_client=self._http, max_retries=0)
+
+    # ------------------------------------------------------------------ utilitários
+
+    def _espera_backoff(self, tentativa: int, erro: BaseException) -> float:
+        resposta = getattr(erro, "response", None)
+        retry_after = resposta.headers.get("retry-after") if resposta is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_teto)
+            except ValueError:
+                pass
+        # Backoff exponencial com "full jitter"
+        return random.uniform(0, min(self.backoff_teto, self.backoff_base * (2 ** tentativa)))
+
+    def _verificar_circuito(self) -> bool:
+        """
+        Returns:
+            True se esta é a chamada de teste do circuito meio aberto (libera a vaga no fim)
+        """
+        modo = self.disjuntor.permitir()
+        if modo is None:
+            raise CircuitoAberto("Provedor de LLM indisponível no momento (circuito aberto).")
+        return modo == "teste"
+
+    def aquecer(self) -> None:
+        """
+        Abre uma conexão do pool com o provedor (DNS, TCP e TLS) antes da primeira requisição real.
+        Qualquer resposta HTTP serve; só erros de rede são propagados.
+        """
+        self._http.get(str(self._cliente.base_url), timeout=5.0)
+
+    # ------------------------------------------------------------------ chamadas
+
+    def completar(self, messages: List[Dict], prazo: Optional[float] = None, **parametros) -> str:
+        """
+        Faz uma chamada sem streaming e retorna o texto da resposta.
+
+        Args:
+            messages: Mensagens no formato chat completions
+            prazo: Prazo total em segundos, somando as repetições (padrão: LLM_PRAZO_SEGUNDOS)
+            **parametros: Parâmetros repassados ao provedor (temperature, top_p...)
+
+        Returns:
+            Conteúdo da resposta (string vazia se o modelo não retornar texto)
+        """
+        teste = self._verificar_circuito()
+        parametros.setdefault("model", self.modelo)
+        limite = time.monotonic() + (prazo or self.prazo)
+
+        try:
+            for tentativa in range(self.tentativas):
+                restante = limite - time.monotonic()
+                try:
+                    completion = self._cliente.chat.completions.create(
+                        messages=messages,
+                        timeout=max(restante, 0.1),
+                        **parametros,
+                    )
+                    self.disjuntor.registrar_sucesso()
+                    return completion.choices[0].message.content or ""
+                except ERROS_TRANSITORIOS as e:
+                    self.disjuntor.registrar_falha()
+                    espera = self._espera_backoff(tentativa, e)
+                    if tentativa + 1 >= self.tentativas or time.monotonic() + espera >= limite:
+                        raise
+                    logger.warning(
+                        "tentativa falhou; nova tentativa agendada",
+                        extra={"tentativa": tentativa + 1, "erro": type(e).__name__, "espera_s": round(espera, 2)},
+                    )
+                    time.sleep(espera)
+                    teste = self._verificar_circuito()
+                except groq.APIStatusError:
+                    # O provedor respondeu (ex.: 400/401): não é instabilidade, não conta para o circuito
+                    self.disjuntor.registrar_sucesso()
+                    raise
+                except Exception:
+                    self.disjuntor.registrar_falha()
+                    raise
+            raise RuntimeError("inalcançável")
+        finally:
+            if teste:
+                self.disjuntor.liberar_teste()
+
+    def _tentativa_stream(self, corrida: _CorridaHedge, messages: List[Dict], timeout: float,
+                          parametros: Dict, inicio: float) -> None:
+        stream = None
+        try:
+            stream = self._cliente.chat.completions.create(
+                messages=messages, stream=True, timeout=timeout, **parametros
+            )
+            pedacos = iter(stream)
+            primeiro = ""
+            for chunk in pedacos:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    primeiro = chunk.choices[0].delta.content
+                    break
+            if not corrida.reivindicar((primeiro, stream, pedacos, time.monotonic() - inicio)):
+                stream.close()
+        except BaseException as e:
+            if stream is not None:
+                stream.close()
+            corrida.falhar(e)
+
+    def _abrir_stream(self, messages: List[Dict], timeout: float, parametros: Dict, hedge: bool):
+        corrida = _CorridaHedge()
+        inicio = time.monotonic()
+
+        def disparar():
+            with corrida._cond:
+                corrida.iniciadas += 1
+            threading.Thread(
+                target=self._tentativa_stream,
+                args=(corrida, messages, timeout, parametros, inicio),
+                daemon=True,
+            ).start()
+
+        disparar()
+
+        p95 = self.ttft.percentil(95) if len(self.ttft) >= self.min_amostras_hedge else None
+        if hedge and p95 is not None:
+            corrida.esperar(max(p95, self.min_espera_hedge))
+            if corrida.vencedor is None and len(corrida.erros) < corrida.iniciadas:
+                logger.info("primeiro token passou do p95; disparando requisição hedge", extra={"p95_s": round(p95, 2)})
+                disparar()
+
+        corrida.esperar(timeout)
+        corrida.encerrar()
+        if corrida.vencedor is None:
+            if corrida.erros:
+                raise corrida.erros[0]
+            raise groq.APITimeoutError(request=httpx.Request("POST", str(self._cliente.base_url)))
+        return corrida.vencedor
+
+    def stream(self, messages: List[Dict], prazo: Optional[float] = None, hedge: Optional[bool] = None,
+               **parametros) -> Iterator[str]:
+        """
+        Faz uma chamada em streaming e produz os pedaços de texto conforme chegam.
+        Repetições e hedge só acontecem antes do primeiro token; depois disso um erro é propagado.
+
+        Args:
+            messages: Mensagens no formato chat completions
+            prazo: Prazo em segundos até o primeiro token (padrão: LLM_PRAZO_SEGUNDOS)
+            hedge: Liga/desliga a requisição hedge nesta chamada (padrão: LLM_HEDGE)
+            **parametros: Parâmetros repassados ao provedor (temperature, top_p...)
+        """
+        teste = self._verificar_circuito()
+        parametros.setdefault("model", self.modelo)
+        hedge = self.hedge if hedge is None else hedge
+        limite = time.monotonic() + (prazo or self.prazo)
+
+        # O finally libera a chamada de teste do circuito mesmo se o consumidor abandonar o gerador
+        # (GeneratorExit quando o cliente desconecta), o que não conta como sucesso nem como falha
+        try:
+            for tentativa in range(self.tentativas):
+                restante = limite - time.monotonic()
+                try:
+                    primeiro, stream, pedacos, ttft = self._abrir_stream(
+                        messages, max(restante, 0.1), parametros, hedge
+                    )
+                    break
+                except ERROS_TRANSITORIOS as e:
+                    self.disjuntor.registrar_falha()
+                    espera = self._espera_backoff(tentativa, e)
+                    if tentativa + 1 >= self.tentativas or time.monotonic() + espera >= limite:
+                        raise
+                    logger.warning(
+                        "stream falhou; nova tentativa agendada",
+                        extra={"tentativa": tentativa + 1, "erro": type(e).__name__, "espera_s": round(espera, 2)},
+                    )
+                    time.sleep(espera)
+                    teste = self._verificar_circuito()
+                except groq.APIStatusError:
+                    # O provedor respondeu (ex.: 400/401): não é instabilidade, não conta para o circuito
+                    self.disjuntor.registrar_sucesso()
+                    raise
+                except Exception:
+                    self.disjuntor.registrar_falha()
+                    raise
+            else:
+                raise RuntimeError("inalcançável")
+
+            self.ttft.adicionar(ttft)
+            try:
+                if primeiro:
+                    yield primeiro
+                for chunk in pedacos:
+                    if chunk.choices:
+                        content = chunk.choices[0].delta.content or ""
+                        if content:
+                            yield content
+                self.disjuntor.registrar_sucesso()
+            except Exception:
+                self.disjuntor.registrar_falha()
+                raise
+            finally:
+                stream.close()
+        finally:
+            if teste:
+                self.disjuntor.liberar_teste()
+
+
+gateway = GatewayLLM()
@@ -0,0 +1,257 @@
+"""
+Módulo de resolução de localidade (cidade e UF) mencionada num texto.
+É o único lugar do chatbot que reconhece estados e cidades: perfil livre, respostas curtas,
+links do Google Maps e resumo da conversa usam o mesmo resolver.
+
+O gazetteer (municipios.tsv + as 27 UFs) vira, no primeiro uso, uma trie por palavras sem acento,
+percorrida uma vez sobre o texto. Palavras de 5 letras ou mais aceitam um erro de digitação
+(índice de deleções, como no SymSpell). Nomes que também são palavras comuns ("para", "natal",
+"serra", "se", "to") só valem com uma pista de que são lugar: maiúscula no meio da frase,
+"em"/"no"/"na" antes, a UF logo depois ou o nome sozinho na mensagem.
+"""
+import os
+import re
+import threading
+import unicodedata
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from config import BASE_DIR
+
+ARQUIVO_MUNICIPIOS = os.path.join(BASE_DIR, "municipios.tsv")
+
+# Sigla -> (nome, capital)
+ESTADOS: Dict[str, Tuple[str, str]] = {
+    "AC": ("Acre", "Rio Branco"), "AL": ("Alagoas", "Maceió"), "AP": ("Amapá", "Macapá"),
+    "AM": ("Amazonas", "Manaus"), "BA": ("Bahia", "Salvador"), "CE": ("Ceará", "Fortaleza"),
+    "DF": ("Distrito Federal", "Brasília"), "ES": ("Espírito Santo", "Vitória"), "GO": ("Goiás", "Goiânia"),
+    "MA": ("Maranhão", "São Luís"), "MT": ("Mato Grosso", "Cuiabá"), "MS": ("Mato Grosso do Sul", "Campo Grande"),
+    "MG": ("Minas Gerais", "Belo Horizonte"), "PA": ("Pará", "Belém"), "PB": ("Paraíba", "João Pessoa"),
+    "PR": ("Paraná", "Curitiba"), "PE": ("Pernambuco", "Recife"), "PI": ("Piauí", "Teresina"),
+    "RJ": ("Rio de Janeiro", "Rio de Janeiro"), "RN": ("Rio Grande do Norte", "Natal"),
+    "RS": ("Rio Grande do Sul", "Porto Alegre"), "RO": ("Rondônia", "Porto Velho"), "RR": ("Roraima", "Boa Vista"),
+    "SC": ("Santa Catarina", "Florianópolis"), "SP": ("São Paulo", "São Paulo"), "SE": ("Sergipe", "Aracaju"),
+    "TO": ("Tocantins", "Palmas"),
+}
+# Siglas que em minúscula são palavras comuns ("se", "to", "pa", "ma"...): só valem em maiúscula ou após a cidade
+SIGLAS_AMBIGUAS = {"se", "to", "pa", "es", "ma", "pe", "am"}
+# Palavras antes de um nome de uma palavra só que indicam que ele é lugar
+PISTAS_LUGAR = {"em", "no", "na", "cidade", "municipio", "estado", "moro", "mora", "morador", "moradora"}
+# Nomes de estado que sem acento são palavras comuns (valem com acento ou com "no"/"do"/"estado" antes)
+ESTADOS_AMBIGUOS = {"para"}
+# Capitais de uma palavra reconhecidas mesmo sem pista, exceto as que são palavras comuns
+CAPITAIS_COMUNS = {"natal", "vitoria", "palmas", "salvador", "fortaleza"}
+# Palavras menores que isso não são corrigidas (erro de digitação vira outra palavra fácil demais)
+MIN_LETRAS_CORRECAO = 5
+
+_RE_PALAVRA = re.compile(r"[^\W_]+")
+
+
+def dobrar(texto: str) -> str:
+    """Minúsculas e sem acento."""
+    sem_acento = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in sem_acento if not unicodedata.combining(c))
+
+
+def nome_estado(uf: str) -> str:
+    return ESTADOS.get(uf.upper(), (uf, None))[0]
+
+
+class Localidade(NamedTuple):
+    cidade: Optional[str] = None
+    uf: Optional[str] = None
+
+    def formatar(self) -> Optional[str]:
+        """"São Luís, MA", "MA" ou None."""
+        if self.cidade:
+            return f"{self.cidade}, {self.uf}"
+        return self.uf
+
+    def descricao(self) -> Optional[str]:
+        """"São Luís, MA", "Maranhão" ou None."""
+        if self.cidade:
+            return f"{self.cidade}, {self.uf}"
+        return nome_estado(self.uf) if self.uf else None
+
+
+class _No:
+    __slots__ = ("filhos", "cidades", "estado")
+
+    def __init__(self) -> None:
+        self.filhos: Dict[str, "_No"] = {}
+        # (nome, UF) das cidades com exatamente este nome; o mesmo nome existe em vários estados
+        self.cidades: List[Tuple[str, str]] = []
+        self.estado: Optional[str] = None
+
+
+class _Mencao(NamedTuple):
+    inicio: int
+    fim: int
+    no: "_No"
+
+
+class Gazetteer:
+    """
+    Trie de nomes de cidades e estados (por palavra, sem acento) e índice de deleções do vocabulário
+    para tolerar um erro de digitação por palavra.
+    """
+
+    def __init__(self, municipios: List[Tuple[str, str]]) -> None:
+        self.raiz = _No()
+        self._correcoes: Dict[str, Set[str]] = {}
+        for uf, (nome, _) in ESTADOS.items():
+            self._inserir(nome).estado = uf
+        for nome, uf in municipios:
+            self._inserir(nome).cidades.append((nome, uf))
+        # Nome repetido em vários estados: a capital vem primeiro
+        capitais = {(capital, uf) for uf, (_, capital) in ESTADOS.items()}
+        self._ordenar(self.raiz, capitais)
+        self.capitais = {dobrar(capital) for capital, _ in capitais}
+
+    def _inserir(self, nome: str) -> _No:
+        no = self.raiz
+        for palavra in _RE_PALAVRA.findall(dobrar(nome)):
+            no = no.filhos.setdefault(palavra, _No())
+            if len(palavra) >= MIN_LETRAS_CORRECAO:
+                for variante in self._delecoes(palavra) | {palavra}:
+                    self._correcoes.setdefault(variante, set()).add(palavra)
+        return no
+
+    def _ordenar(self, no: _No, capitais) -> None:
+        no.cidades.sort(key=lambda cidade: cidade not in capitais)
+        for filho in no.filhos.values():
+            self._ordenar(filho, capitais)
+
+    @staticmethod
+    def _delecoes(palavra: str) -> Set[str]:
+        return {palavra[:i] + palavra[i + 1:] for i in range(len(palavra))}
+
+    def _filho(self, no: _No, palavra: str) -> Optional[_No]:
+        filho = no.filhos.get(palavra)
+        if filho is not None or len(palavra) < MIN_LETRAS_CORRECAO:
+            return filho
+        candidatos = set()
+        for variante in self._delecoes(palavra) | {palavra}:
+            candidatos |= self._correcoes.get(variante, set())
+        candidatos &= no.filhos.keys()
+        # Empate: a correção que mantém a primeira letra
+        for candidato in sorted(candidatos, key=lambda c: (c[0] != palavra[0], c)):
+            return no.filhos[candidato]
+        return None
+
+    def _mencoes(self, dobradas: List[str]) -> List[_Mencao]:
+        """Em cada posição, o nome mais longo da trie que começa ali."""
+        mencoes: List[_Mencao] = []
+        for inicio in range(len(dobradas)):
+            if mencoes and inicio < mencoes[-1].fim:
+                continue
+            no, melhor = self.raiz, None
+            for fim in range(inicio, len(dobradas)):
+                no = self._filho(no, dobradas[fim])
+                if no is None:
+                    break
+                if no.cidades or no.estado:
+                    melhor = _Mencao(inicio, fim + 1, no)
+            if melhor is not None:
+                mencoes.append(melhor)
+        return mencoes
+
+    def resolver(self, texto: str) -> Localidade:
+        """
+        Cidade e UF mencionadas no texto, numa passada.
+
+        Returns:
+            Localidade(cidade, uf): cidade com a UF dela, só a UF, ou vazia
+        """
+        originais = _RE_PALAVRA.findall(texto)
+        dobradas = [dobrar(p) for p in originais]
+
+        def antes(mencao: _Mencao) -> str:
+            return dobradas[mencao.inicio - 1] if mencao.inicio else ""
+
+        def cidade_com_pista(mencao: _Mencao) -> bool:
+            # Nomes de mais de uma palavra ("são luís") não precisam de pista
+            if mencao.fim - mencao.inicio > 1:
+                return True
+            dobrada = dobradas[mencao.inicio]
+            depois = originais[mencao.fim] if mencao.fim < len(originais) else ""
+            return (
+                len(dobradas) == 1
+                or (originais[mencao.inicio][0].isupper() and mencao.inicio > 0)
+                or antes(mencao) in PISTAS_LUGAR
+                or (len(depois) == 2 and depois.upper() in ESTADOS)
+                or (dobrada in self.capitais and dobrada not in CAPITAIS_COMUNS)
+            )
+
+        def estado_com_pista(mencao: _Mencao) -> bool:
+            dobrada = dobradas[mencao.inicio]
+            if mencao.fim - mencao.inicio > 1 or dobrada not in ESTADOS_AMBIGUOS:
+                return True
+            return originais[mencao.inicio].lower() != dobrada or antes(mencao) in ("no", "do", "estado")
+
+        uf_citada = None
+        cidades: List[Tuple[_Mencao, List[Tuple[str, str]]]] = []
+        for mencao in self._mencoes(dobradas):
+            no = mencao.no
+            if no.estado and estado_com_pista(mencao):
+                # "São Paulo" é cidade e estado: vira a cidade, salvo "estado de São Paulo"
+                mesma_uf = [c for c in no.cidades if c[1] == no.estado]
+                if mesma_uf and "estado" not in dobradas[max(0, mencao.inicio - 2):mencao.inicio]:
+                    cidades.append((mencao, mesma_uf))
+                uf_citada = uf_citada or no.estado
+            elif no.cidades and cidade_com_pista(mencao):
+                cidades.append((mencao, no.cidades))
+
+        # Siglas: "SP", "sp", "Recife/PE", "São Luís - ma"
+        fins_cidades = {mencao.fim for mencao, _ in cidades}
+        if uf_citada is None:
+            for i, (original, dobrada) in enumerate(zip(originais, dobradas)):
+                if len(dobrada) == 2 and dobrada.upper() in ESTADOS and (
+                    original.isupper() or dobrada not in SIGLAS_AMBIGUAS or i in fins_cidades
+                ):
+                    uf_citada = dobrada.upper()
+                    break
+
+        for _, opcoes in cidades:
+            if uf_citada:
+                na_uf = [c for c in opcoes if c[1] == uf_citada]
+                if na_uf:
+                    return Localidade(*na_uf[0])
+            else:
+                return Localidade(*opcoes[0])
+        return Localidade(uf=uf_citada)
+
+
+def carregar_municipios(caminho: str = ARQUIVO_MUNICIPIOS) -> List[Tuple[str, str]]:
+    """
+    Lê o municipios.tsv (linhas "UF<TAB>Nome"; "#" inicia comentário).
+
+    Returns:
+        list: (nome, UF) de cada município
+    """
+    municipios = []
+    with open(caminho, encoding="utf-8") as arquivo:
+        for linha in arquivo:
+            linha = linha.strip()
+            if not linha or linha.startswith("#"):
+                continue
+            uf, nome = linha.split("\t", 1)
+            municipios.append((nome.strip(), uf.strip().upper()))
+    return municipios
+
+
+_gazetteer: Optional[Gazetteer] = None
+_lock = threading.Lock()
+
+
+def gazetteer() -> Gazetteer:
+    """Gazetteer do processo, montado no primeiro uso."""
+    global _gazetteer
+    if _gazetteer is None:
+        with _lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer(carregar_municipios())
+    return _gazetteer
+
+
+def resolver_localidade(texto: str) -> Localidade:
+    return gazetteer().resolver(texto or "")
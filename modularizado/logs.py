@@ -0,0 +1,183 @@
+"""
+Módulo de logs estruturados (uma linha JSON por evento) sem I/O no caminho da requisição.
+O código chama o logger normalmente; o registro vai para uma fila em memória e uma thread de fundo
+escreve no stdout. Se a fila encher (stdout travado), o log é descartado em vez de travar a requisição.
+
+Também cuida do id de correlação: cada requisição HTTP recebe um `request_id` (ou reaproveita o
+cabeçalho X-Request-ID) que aparece em todas as linhas de log daquela requisição.
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+import uuid
+from typing import Optional
+
+from config import LOG_NIVEL, LOG_FILA_MAX, LOG_AMOSTRA_DEBUG
+from metricas import registro
+
+
+id_requisicao: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("id_requisicao", default=None)
+
+# Atributos padrão do LogRecord; o resto veio de `extra=` e vira campo do JSON
+_ATRIBUTOS_PADRAO = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taxa_amostra", "request_id"}
+
+
+class FormatadorJSON(logging.Formatter):
+    """Formata o registro como uma linha JSON com nível, logger, mensagem, request_id e campos extras."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        dados = {
+            "ts": round(record.created, 3),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            dados["request_id"] = record.request_id
+        for chave, valor in record.__dict__.items():
+            if chave not in _ATRIBUTOS_PADRAO and chave not in dados:
+                dados[chave] = valor
+        if record.exc_info:
+            dados["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            dados["exc"] = record.exc_text
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class FiltroAmostragem(logging.Filter):
+    """
+    Deixa passar só uma fração dos logs barulhentos: DEBUG usa LOG_AMOSTRA_DEBUG e qualquer
+    registro pode pedir sua própria taxa com `extra={"taxa_amostra": 0.1}`.
+    """
+
+    def __init__(self, taxa_debug: float) -> None:
+        super().__init__()
+        self.taxa_debug = taxa_debug
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        taxa = getattr(record, "taxa_amostra", None)
+        if taxa is None and record.levelno <= logging.DEBUG:
+            taxa = self.taxa_debug
+        return taxa is None or taxa >= 1 or random.random() < taxa
+
+
+class HandlerFilaNaoBloqueante(logging.handlers.QueueHandler):
+    """
+    QueueHandler com fila limitada: quando a fila está cheia o registro é descartado (e contado),
+    nunca bloqueando a thread que logou.
+    """
+
+    def __init__(self, fila: queue.Queue) -> None:
+        super().__init__(fila)
+        self.descartados = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve mensagem, exceção e request_id aqui, na thread que logou (o contexto da requisição
+        # não existe na thread de escrita), mantendo os campos extras para o FormatadorJSON
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.request_id = id_requisicao.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+_ouvinte: Optional[logging.handlers.QueueListener] = None
+_handler_fila: Optional[HandlerFilaNaoBloqueante] = None
+
+
+def configurar_logs() -> None:
+    """
+    Instala o handler em fila no logger raiz do app ("chatbot"). Idempotente.
+    """
+    global _ouvinte, _handler_fila
+    if _ouvinte is not None:
+        return
+
+    saida = logging.StreamHandler(sys.stdout)
+    saida.setFormatter(FormatadorJSON())
+
+    _handler_fila = HandlerFilaNaoBloqueante(queue.Queue(maxsize=LOG_FILA_MAX))
+    _handler_fila.addFilter(FiltroAmostragem(LOG_AMOSTRA_DEBUG))
+
+    raiz = logging.getLogger("chatbot")
+    raiz.setLevel(LOG_NIVEL)
+    raiz.addHandler(_handler_fila)
+    raiz.propagate = False
+
+    _ouvinte = logging.handlers.QueueListener(_handler_fila.queue, saida, respect_handler_level=True)
+    _ouvinte.start()
+    atexit.register(_ouvinte.stop)
+
+    registro.medidor("logs_descartados", "Linhas de log descartadas por fila cheia").observar(logs_descartados)
+
+
+def obter_logger(nome: str) -> logging.Logger:
+    """
+    Retorna o logger do módulo (ex.: obter_logger("rag") -> "chatbot.rag").
+    """
+    configurar_logs()
+    return logging.getLogger(f"chatbot.{nome}")
+
+
+def logs_descartados() -> int:
+    return _handler_fila.descartados if _handler_fila is not None else 0
+
+
+def novo_id_requisicao() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+class MiddlewareIdRequisicao:
+    """
+    Middleware ASGI que define o request_id da requisição (cabeçalho X-Request-ID ou um novo)
+    e o devolve no cabeçalho da resposta. Funciona também com respostas em streaming.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+        self._logger = obter_logger("http")
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        cabecalhos = dict(scope.get("headers") or [])
+        recebido = cabecalhos.get(b"x-request-id", b"").decode("latin-1").strip()
+        rid = recebido[:64] if recebido else novo_id_requisicao()
+        token = id_requisicao.set(rid)
+        inicio = time.perf_counter()
+        status = {"codigo": None}
+
+        async def enviar(mensagem) -> None:
+            if mensagem["type"] == "http.response.start":
+                status["codigo"] = mensagem["status"]
+                mensagem.setdefault("headers", [])
+                mensagem["headers"] = list(mensagem["headers"]) + [(b"x-request-id", rid.encode("latin-1"))]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            self._logger.debug(
+                "requisição concluída",
+                extra={"metodo": scope.get("method"), "rota": scope.get("path"), "status": status["codigo"],
+                       "ms": round((time.perf_counter() - inicio) * 1000, 1)},
+            )
+            id_requisicao.reset(token)
@@ -0,0 +1,178 @@
+"""
+Módulo de métricas em memória exportadas no formato texto do Prometheus (GET /metrics).
+Implementação mínima, sem dependência externa: contadores, medidores e histogramas com rótulos opcionais.
+"""
+import bisect
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+
+Rotulos = Tuple[Tuple[str, str], ...]
+
+
+def _formatar_rotulos(rotulos: Rotulos) -> str:
+    if not rotulos:
+        return ""
+    partes = []
+    for nome, valor in rotulos:
+        valor = str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        partes.append(f'{nome}="{valor}"')
+    return "{" + ",".join(partes) + "}"
+
+
+def _chave(rotulos: Optional[Dict[str, str]]) -> Rotulos:
+    return tuple(sorted((rotulos or {}).items()))
+
+
+class Contador:
+    """Valor que só cresce (ex.: requisições rejeitadas)."""
+
+    tipo = "counter"
+
+    def __init__(self, nome: str, descricao: str) -> None:
+        self.nome = nome
+        self.descricao = descricao
+        self._valores: Dict[Rotulos, float] = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, valor: float = 1.0, rotulos: Optional[Dict[str, str]] = None) -> None:
+        chave = _chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0.0) + valor
+
+    def valor(self, rotulos: Optional[Dict[str, str]] = None) -> float:
+        with self._lock:
+            return self._valores.get(_chave(rotulos), 0.0)
+
+    def amostras(self) -> List[str]:
+        with self._lock:
+            itens = list(self._valores.items())
+        return [f"{self.nome}{_formatar_rotulos(r)} {v}" for r, v in itens]
+
+
+class Medidor:
+    """
+    Valor que sobe e desce (ex.: tamanho da fila). Pode ser definido diretamente
+    ou lido na hora da exportação por uma função (`observar`).
+    """
+
+    tipo = "gauge"
+
+    def __init__(self, nome: str, descricao: str) -> None:
+        self.nome = nome
+        self.descricao = descricao
+        self._valores: Dict[Rotulos, float] = {}
+        self._funcoes: Dict[Rotulos, Callable[[], float]] = {}
+        self._lock = threading.Lock()
+
+    def definir(self, valor: float, rotulos: Optional[Dict[str, str]] = None) -> None:
+        with self._lock:
+            self._valores[_chave(rotulos)] = valor
+
+    def observar(self, funcao: Callable[[], float], rotulos: Optional[Dict[str, str]] = None) -> None:
+        with self._lock:
+            self._funcoes[_chave(rotulos)] = funcao
+
+    def amostras(self) -> List[str]:
+        with self._lock:
+            itens = dict(self._valores)
+            funcoes = list(self._funcoes.items())
+        for rotulos, funcao in funcoes:
+            try:
+                itens[rotulos] = float(funcao())
+            except Exception:
+                continue
+        return [f"{self.nome}{_formatar_rotulos(r)} {v}" for r, v in itens.items()]
+
+
+# Limites (em segundos) pensados para etapas de um turno: de consultas locais (ms) a gerações longas
+LIMITES_PADRAO_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histograma:
+    """
+    Distribuição de valores em faixas cumulativas (ex.: latência por etapa), permitindo calcular
+    p95/p99 no Prometheus com histogram_quantile.
+    """
+
+    tipo = "histogram"
+
+    def __init__(self, nome: str, descricao: str, limites: Sequence[float] = LIMITES_PADRAO_SEGUNDOS) -> None:
+        self.nome = nome
+        self.descricao = descricao
+        self.limites = tuple(sorted(limites))
+        # Por conjunto de rótulos: [contagens por faixa (+Inf no fim), soma, total]
+        self._series: Dict[Rotulos, list] = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, rotulos: Optional[Dict[str, str]] = None) -> None:
+        chave = _chave(rotulos)
+        indice = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = [[0] * (len(self.limites) + 1), 0.0, 0]
+                self._series[chave] = serie
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def amostras(self) -> List[str]:
+        with self._lock:
+            itens = [(r, list(s[0]), s[1], s[2]) for r, s in self._series.items()]
+        linhas = []
+        for rotulos, contagens, soma, total in itens:
+            acumulado = 0
+            for limite, contagem in zip(self.limites + (float("inf"),), contagens):
+                acumulado += contagem
+                le = "+Inf" if limite == float("inf") else repr(limite)
+                linhas.append(f"{self.nome}_bucket{_formatar_rotulos(rotulos + (('le', le),))} {acumulado}")
+            linhas.append(f"{self.nome}_sum{_formatar_rotulos(rotulos)} {soma}")
+            linhas.append(f"{self.nome}_count{_formatar_rotulos(rotulos)} {total}")
+        return linhas
+
+
+class RegistroMetricas:
+    """
+    Guarda as métricas da aplicação. Pedir a mesma métrica duas vezes devolve a mesma instância.
+    """
+
+    def __init__(self) -> None:
+        self._metricas: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _obter(self, classe, nome: str, descricao: str, **opcoes):
+        with self._lock:
+            metrica = self._metricas.get(nome)
+            if metrica is None:
+                metrica = classe(nome, descricao, **opcoes)
+                self._metricas[nome] = metrica
+            elif not isinstance(metrica, classe):
+                raise ValueError(f"Métrica {nome} já registrada com outro tipo")
+            return metrica
+
+    def contador(self, nome: str, descricao: str) -> Contador:
+        return self._obter(Contador, nome, descricao)
+
+    def medidor(self, nome: str, descricao: str) -> Medidor:
+        return self._obter(Medidor, nome, descricao)
+
+    def histograma(self, nome: str, descricao: str,
+                   limites: Sequence[float] = LIMITES_PADRAO_SEGUNDOS) -> Histograma:
+        return self._obter(Histograma, nome, descricao, limites=limites)
+
+    def exportar(self) -> str:
+        """
+        Retorna todas as métricas no formato de exposição em texto do Prometheus.
+        """
+        with self._lock:
+            metricas = list(self._metricas.values())
+        linhas: List[str] = []
+        for metrica in metricas:
+            linhas.append(f"# HELP {metrica.nome} {metrica.descricao}")
+            linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            linhas.extend(metrica.amostras())
+        return "\n".join(linhas) + "\n"
+
+
+registro = RegistroMetricas()
@@ -0,0 +1,242 @@
+"""
+Módulo para montar o contexto do prompt respeitando um orçamento de tokens por seção.
+Remove do histórico recente o que já aparece no histórico da conversa e corta primeiro
+o conteúdo de menor valor (trechos com pior pontuação na busca e mensagens mais antigas).
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+from contexto_conversa import formatar_historico_conversa
+from prompt_base import PROMPT_BASE
+from logs import obter_logger
+
+logger = obter_logger("prompt")
+
+
+# Orçamento de tokens por seção do prompt (estimativa, não o tokenizador exato do modelo)
+ORCAMENTO_SECOES = {
+    "perfil": 250,
+    "documentos": 1500,
+    "links": 250,
+    "historico": 450,
+}
+
+# Trecho parcial só entra se sobrar pelo menos isso de orçamento (evita fragmentos inúteis)
+MIN_TOKENS_TRECHO_PARCIAL = 80
+
+_RE_PEDACO = re.compile(r"\w+|[^\w\s]")
+_RE_FIM_FRASE = re.compile(r"[.!?;:\n]")
+
+
+def estimar_tokens(texto: str) -> int:
+    """
+    Estima o número de tokens de um texto em português sem depender do tokenizador do modelo.
+    Tokenizadores BPE quebram palavras longas em pedaços de ~4 caracteres e costumam gastar
+    um token extra em palavras acentuadas (ç, ã, é...); números são quebrados a cada 3 dígitos
+    e cada sinal de pontuação vira um token.
+
+    Args:
+        texto: Texto a ser estimado
+
+    Returns:
+        Número estimado de tokens
+    """
+    if not texto:
+        return 0
+
+    total = 0
+    for pedaco in _RE_PEDACO.findall(texto):
+        if not pedaco[0].isalnum() and pedaco[0] != "_":
+            total += 1
+        elif pedaco.isdigit():
+            total += (len(pedaco) + 2) // 3
+        else:
+            total += (len(pedaco) + 3) // 4
+            if not pedaco.isascii():
+                total += 1
+    return total
+
+
+def cortar_para_tokens(texto: str, max_tokens: int) -> str:
+    """
+    Corta o texto para caber em max_tokens, preferindo terminar em fim de frase.
+    """
+    if estimar_tokens(texto) <= max_tokens:
+        return texto
+
+    # Busca binária pelo maior prefixo que cabe no orçamento
+    baixo, alto = 0, len(texto)
+    while baixo < alto:
+        meio = (baixo + alto + 1) // 2
+        if estimar_tokens(texto[:meio]) <= max_tokens:
+            baixo = meio
+        else:
+            alto = meio - 1
+    corte = texto[:baixo]
+
+    fins = [m.end() for m in _RE_FIM_FRASE.finditer(corte)]
+    if fins and fins[-1] > len(corte) // 2:
+        corte = corte[:fins[-1]]
+    return corte.rstrip()
+
+
+def deduplicar_mensagens_recentes(mensagens_recentes: List[str], historico: List[Tuple[str, str]],
+                                  pergunta: str) -> List[str]:
+    """
+    Remove das mensagens recentes a pergunta atual (já vai em PERGUNTA DO USUARIO)
+    e as perguntas que já aparecem no histórico da conversa.
+    """
+    def chave(texto: str) -> str:
+        return " ".join(texto.lower().split())
+
+    vistas = {chave(p) for p, _ in historico}
+    vistas.add(chave(pergunta))
+
+    restantes = []
+    for mensagem in mensagens_recentes:
+        k = chave(mensagem)
+        if k and k not in vistas:
+            restantes.append(mensagem)
+            vistas.add(k)
+    return restantes
+
+
+def montar_bloco_perfil(perfil_dict: Dict, mensagens_recentes: List[str]) -> str:
+    # Monta bloco de perfil apenas com campos preenchidos (sem bloquear fluxo se faltar algo)
+    partes_perfil = []
+    if perfil_dict.get('nome'):
+        partes_perfil.append(f"Nome: {perfil_dict.get('nome')}")
+    if perfil_dict.get('localidade'):
+        partes_perfil.append(f"Localidade: {perfil_dict.get('localidade')}")
+    if perfil_dict.get('papel'):
+        partes_perfil.append(f"Situação: {perfil_dict.get('papel')}")
+    if perfil_dict.get('eixo'):
+        partes_perfil.append(f"Assunto: {perfil_dict.get('eixo')}")
+
+    bloco_perfil = ""
+    if partes_perfil:
+        bloco_perfil = "INFORMAÇÕES DO USUÁRIO:\n- " + "\n- ".join(partes_perfil) + "\n\n"
+
+    faltando = []
+    if not perfil_dict.get("localidade"):
+        faltando.append("Localidade não informada (responder de forma geral).")
+    if not perfil_dict.get("papel"):
+        faltando.append("Papel não informado (se é para você ou dependente).")
+    if not perfil_dict.get("nome"):
+        faltando.append("Nome não informado.")
+    if faltando:
+        bloco_perfil += "DADOS FALTANTES PARA PERSONALIZAR MELHOR:\n- " + "\n- ".join(faltando) + "\n\n"
+
+    if mensagens_recentes:
+        bloco_perfil += "HISTÓRICO RECENTE (mensagens ainda não respondidas):\n- " + "\n- ".join(mensagens_recentes) + "\n\n"
+
+    return bloco_perfil
+
+
+def montar_bloco_links(links_maps: List[Dict[str, str]]) -> str:
+    if not links_maps:
+        return ""
+    links_texto = [f"{link_info['nome']}: {link_info['link']}" for link_info in links_maps]
+    return "\n\nLINKS DO GOOGLE MAPS PARA ENCONTRAR OS ÓRGÃOS:\n" + "\n".join(links_texto) + "\n"
+
+
+def selecionar_trechos(trechos: List[Dict], orcamento: int) -> List[str]:
+    """
+    Seleciona trechos do mais relevante (menor distância) para o menos relevante até o orçamento.
+    O primeiro trecho que não cabe inteiro entra cortado se ainda sobrar espaço útil.
+    """
+    selecionados = []
+    restante = orcamento
+    for trecho in sorted(trechos, key=lambda t: t.get("distancia", 0.0)):
+        # separador "\n---\n" conta como ~3 tokens
+        custo = estimar_tokens(trecho["texto"]) + 3
+        if custo <= restante:
+            selecionados.append(trecho["texto"])
+            restante -= custo
+        else:
+            if restante >= MIN_TOKENS_TRECHO_PARCIAL:
+                selecionados.append(cortar_para_tokens(trecho["texto"], restante - 3))
+            break
+    return selecionados
+
+
+def selecionar_historico(historico: List[Tuple[str, str]], orcamento: int) -> str:
+    """
+    Formata o histórico mantendo as mensagens mais recentes que cabem no orçamento.
+    Se nem a última mensagem couber, a resposta dela é cortada.
+    """
+    texto = formatar_historico_conversa(historico, max_chars=orcamento, medir=estimar_tokens)
+    if estimar_tokens(texto) <= orcamento or not historico:
+        return texto
+
+    pergunta, resposta = historico[-1]
+    resposta = cortar_para_tokens(resposta, max(orcamento - estimar_tokens(pergunta) - 20, 0))
+    return formatar_historico_conversa([(pergunta, resposta)], max_chars=orcamento, medir=estimar_tokens)
+
+
+def montar_contexto_prompt(pergunta: str, perfil_dict: Dict, mensagens_recentes: List[str],
+                           trechos: List[Dict], links_maps: List[Dict[str, str]],
+                           historico: List[Tuple[str, str]],
+                           orcamento: Optional[Dict[str, int]] = None) -> Dict:
+    """
+    Monta o contexto e o histórico que vão para o PROMPT_BASE, cada seção dentro do seu orçamento.
+
+    Args:
+        pergunta: Pergunta do usuário
+        perfil_dict: Perfil da sessão
+        mensagens_recentes: Últimas perguntas do usuário (incluindo a atual)
+        trechos: Trechos da busca com "texto" e "distancia"
+        links_maps: Links gerados por gerar_links_orgaos
+        historico: Lista de tuplas (pergunta, resposta) da conversa
+        orcamento: Orçamento por seção (padrão: ORCAMENTO_SECOES)
+
+    Returns:
+        Dicionário com "contexto", "historico", "tokens" (estimativa do prompt final) e "secoes"
+    """
+    orcamento = {**ORCAMENTO_SECOES, **(orcamento or {})}
+
+    recentes = deduplicar_mensagens_recentes(mensagens_recentes, historico, pergunta)
+    bloco_perfil = montar_bloco_perfil(perfil_dict, recentes)
+    # Se o perfil estourar, as mensagens recentes são a primeira coisa a sair
+    while recentes and estimar_tokens(bloco_perfil) > orcamento["perfil"]:
+        recentes = recentes[1:]
+        bloco_perfil = montar_bloco_perfil(perfil_dict, recentes)
+
+    bloco_links = montar_bloco_links(links_maps)
+    if estimar_tokens(bloco_links) > orcamento["links"]:
+        bloco_links = cortar_para_tokens(bloco_links, orcamento["links"])
+
+    documentos = selecionar_trechos(trechos, orcamento["documentos"])
+    historico_formatado = selecionar_historico(historico, orcamento["historico"])
+
+    contexto = "\n---\n".join(documentos)
+    contexto_final = f"{bloco_perfil}DADOS DOS DOCUMENTOS:\n{contexto}{bloco_links}"
+
+    secoes = {
+        "perfil": estimar_tokens(bloco_perfil),
+        "documentos": estimar_tokens(contexto),
+        "links": estimar_tokens(bloco_links),
+        "historico": estimar_tokens(historico_formatado),
+    }
+    tokens = estimar_tokens(PROMPT_BASE.format(
+        contexto=contexto_final,
+        historico_conversa=historico_formatado,
+        pergunta=pergunta
+    ))
+    # INFO: DEBUG é amostrado (LOG_AMOSTRA_DEBUG) e o tamanho do prompt precisa estar em todo turno
+    logger.info(
+        "prompt montado",
+        extra={
+            "tokens": tokens,
+            **{f"tokens_{secao}": n for secao, n in secoes.items()},
+            "tokens_pergunta": estimar_tokens(pergunta),
+            "trechos": f"{len(documentos)}/{len(trechos)}",
+        },
+    )
+
+    return {
+        "contexto": contexto_final,
+        "historico": historico_formatado,
+        "tokens": tokens,
+        "secoes": secoes,
+    }
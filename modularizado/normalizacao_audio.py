@@ -0,0 +1,214 @@
+"""
+Módulo de normalização do áudio antes do reconhecimento.
+Os clientes mandam o que gravaram (às vezes WAV estéreo a 48 kHz), mas o Speech-to-Text só precisa
+de mono a 16 kHz. O PCM é convertido para mono, reamostrado para 16 kHz e tem o silêncio do começo
+e do fim aparado. Depois é recodificado em FLAC (soundfile, em requirements.txt); sem a libsndfile
+disponível, vai em WAV 16 bits.
+
+Também lê dos cabeçalhos a taxa de amostragem e os canais reais (WAV, FLAC, Opus em Ogg/WebM e MP3),
+em vez de supor um valor fixo na configuração do reconhecimento. Os formatos comprimidos não são
+decodificados aqui: seguem como vieram, só com a configuração certa.
+"""
+import io
+import struct
+from typing import Optional, Tuple
+
+import numpy as np
+
+from segmentacao_audio import (
+    PISO_VOZ_DBFS, QUADRO_MS, LeitorWav, energia_quadros, ler_cabecalho_wav, mono, para_wav, quadros_com_voz,
+)
+
+try:
+    import soundfile
+except ImportError:  # sem libsndfile o áudio normalizado vai em WAV 16 bits
+    soundfile = None
+
+TAXA_ALVO = 16000
+# Silêncio mantido antes e depois da fala ao aparar (o reconhecimento erra menos com uma folga)
+MARGEM_SILENCIO_MS = 200
+# Taxas de Opus aceitas pelo Speech-to-Text
+TAXAS_OPUS = (8000, 12000, 16000, 24000, 48000)
+# Até onde procurar o cabeçalho no começo do arquivo
+BYTES_CABECALHO = 8192
+
+_TAXAS_MP3 = (44100, 48000, 32000)
+
+
+def _streaminfo_flac(inicio: bytes) -> Optional[Tuple[int, int]]:
+    # "fLaC" + cabeçalho do bloco (4 bytes) + STREAMINFO; a taxa são 20 bits a partir do byte 10
+    if inicio[:4] != b"fLaC" or len(inicio) < 22 or inicio[4] & 0x7F != 0:
+        return None
+    taxa = (inicio[18] << 12) | (inicio[19] << 4) | (inicio[20] >> 4)
+    canais = ((inicio[20] >> 1) & 0x07) + 1
+    return taxa, canais
+
+
+def _opus_head(inicio: bytes) -> Optional[Tuple[int, int]]:
+    # OpusHead: no primeiro pacote do Ogg e no CodecPrivate do WebM
+    posicao = inicio.find(b"OpusHead")
+    if posicao < 0 or len(inicio) < posicao + 16:
+        return None
+    canais = inicio[posicao + 9]
+    taxa = struct.unpack_from("<I", inicio, posicao + 12)[0]
+    # A taxa do OpusHead é a da gravação original; fora das aceitas, vale a de decodificação
+    return (taxa if taxa in TAXAS_OPUS else 48000), canais
+
+
+def _quadro_mp3(inicio: bytes) -> Optional[Tuple[int, int]]:
+    posicao = 0
+    if inicio[:3] == b"ID3" and len(inicio) >= 10:
+        posicao = 10 + ((inicio[6] & 0x7F) << 21 | (inicio[7] & 0x7F) << 14 | (inicio[8] & 0x7F) << 7 | inicio[9] & 0x7F)
+    for i in range(posicao, len(inicio) - 3):
+        if inicio[i] != 0xFF or inicio[i + 1] & 0xE0 != 0xE0:
+            continue
+        versao, camada = (inicio[i + 1] >> 3) & 0x03, (inicio[i + 1] >> 1) & 0x03
+        indice_taxa, indice_bitrate = (inicio[i + 2] >> 2) & 0x03, inicio[i + 2] >> 4
+        if versao == 1 or camada == 0 or indice_taxa == 3 or indice_bitrate in (0, 15):
+            continue
+        # MPEG 1 = taxa cheia, MPEG 2 = metade, MPEG 2.5 = um quarto
+        taxa = _TAXAS_MP3[indice_taxa] >> {3: 0, 2: 1, 0: 2}[versao]
+        canais = 1 if inicio[i + 3] >> 6 == 3 else 2
+        return taxa, canais
+    return None
+
+
+def ler_taxa_e_canais(inicio: bytes, encoding: str) -> Optional[Tuple[int, int]]:
+    """
+    Taxa de amostragem e canais declarados no cabeçalho do arquivo.
+
+    Args:
+        inicio: Primeiros bytes do áudio (até BYTES_CABECALHO)
+        encoding: AudioEncoding esperado pelo tipo MIME
+
+    Returns:
+        (sample_rate, canais), ou None se o cabeçalho não foi encontrado
+    """
+    try:
+        if encoding == "LINEAR16":
+            cabecalho = ler_cabecalho_wav(inicio)
+            return (cabecalho.sample_rate, cabecalho.canais) if cabecalho else None
+        if encoding == "FLAC":
+            return _streaminfo_flac(inicio)
+        if encoding in ("OGG_OPUS", "WEBM_OPUS"):
+            return _opus_head(inicio)
+        if encoding == "MP3":
+            return _quadro_mp3(inicio)
+    except (ValueError, struct.error):
+        return None
+    return None
+
+
+class Reamostrador:
+    """
+    Converte a taxa de amostragem de um sinal mono em blocos, mantendo a continuidade entre eles:
+    média móvel como passa-baixa (contra aliasing ao reduzir a taxa) e interpolação linear.
+    """
+
+    def __init__(self, origem: int, destino: int = TAXA_ALVO) -> None:
+        self.passo = origem / destino
+        tamanho_filtro = max(1, round(self.passo)) if origem > destino else 1
+        self._filtro = np.full(tamanho_filtro, 1 / tamanho_filtro, dtype=np.float32)
+        self._cauda = np.zeros(tamanho_filtro - 1, dtype=np.float32)
+        self._pendente = np.zeros(0, dtype=np.float32)
+        self._t = 0.0
+
+    def processar(self, amostras: np.ndarray) -> np.ndarray:
+        if self.passo == 1:
+            return amostras
+        if len(self._filtro) > 1:
+            estendido = np.concatenate((self._cauda, amostras))
+            self._cauda = estendido[-(len(self._filtro) - 1):]
+            amostras = np.convolve(estendido, self._filtro, mode="valid")
+        sinal = np.concatenate((self._pendente, amostras))
+        if len(sinal) < 2:
+            self._pendente = sinal
+            return np.zeros(0, dtype=np.float32)
+        tempos = np.arange(self._t, len(sinal) - 1, self.passo)
+        saida = np.interp(tempos, np.arange(len(sinal)), sinal).astype(np.float32)
+        # Guarda o que a próxima saída ainda precisa (ao menos a última amostra, para interpolar)
+        proximo = self._t + len(tempos) * self.passo
+        descartar = min(int(proximo), len(sinal) - 1)
+        self._pendente = sinal[descartar:]
+        self._t = proximo - descartar
+        return saida
+
+
+def aparar_silencio(amostras: np.ndarray, sample_rate: int, margem_ms: int = MARGEM_SILENCIO_MS) -> np.ndarray:
+    """Remove o silêncio antes da primeira e depois da última fala, mantendo `margem_ms` de folga."""
+    voz = np.flatnonzero(quadros_com_voz(energia_quadros(amostras, sample_rate)))
+    if len(voz) == 0:
+        return amostras[:0]
+    quadro = sample_rate * QUADRO_MS // 1000
+    margem = sample_rate * margem_ms // 1000
+    return amostras[max(0, voz[0] * quadro - margem):(voz[-1] + 1) * quadro + margem]
+
+
+def _pcm16(amostras: np.ndarray) -> np.ndarray:
+    return (np.clip(amostras, -1, 1) * 32767).astype("<i2")
+
+
+def codificar(amostras: np.ndarray, sample_rate: int = TAXA_ALVO) -> Tuple[bytes, str]:
+    """
+    Returns:
+        (áudio codificado, AudioEncoding): FLAC com soundfile; senão WAV 16 bits (LINEAR16)
+    """
+    pcm = _pcm16(amostras)
+    if soundfile is not None:
+        saida = io.BytesIO()
+        soundfile.write(saida, pcm, sample_rate, format="FLAC", subtype="PCM_16")
+        return saida.getvalue(), "FLAC"
+    return para_wav(pcm.tobytes(), sample_rate), "LINEAR16"
+
+
+def normalizar_pcm(pcm: bytes, sample_rate: int, canais: int) -> Tuple[bytes, str]:
+    """
+    PCM 16 bits intercalado -> mono, 16 kHz, sem silêncio nas pontas, codificado.
+
+    Returns:
+        (áudio codificado, AudioEncoding), com b"" se não sobrou fala
+    """
+    amostras = aparar_silencio(Reamostrador(sample_rate).processar(mono(pcm, canais)), TAXA_ALVO)
+    if len(amostras) == 0:
+        return b"", "LINEAR16"
+    return codificar(amostras)
+
+
+class NormalizadorWavStream:
+    """
+    Normalização incremental para o reconhecimento em streaming: recebe os bytes de um WAV conforme
+    chegam e devolve PCM 16 bits mono a 16 kHz, sem cabeçalho (LINEAR16). Só o silêncio do começo é
+    aparado (o do fim só se conhece quando o áudio acaba) e o áudio não vira FLAC, que não é por blocos.
+    """
+
+    def __init__(self) -> None:
+        self._leitor = LeitorWav()
+        self._reamostrador: Optional[Reamostrador] = None
+        self._espera = np.zeros(0, dtype=np.float32)
+        self._falou = False
+
+    def processar(self, dados: bytes) -> bytes:
+        """
+        Raises:
+            ValueError: o áudio não é WAV PCM 16 bits
+        """
+        pcm = self._leitor.ler(dados)
+        if not pcm:
+            return b""
+        cabecalho = self._leitor.cabecalho
+        if self._reamostrador is None:
+            self._reamostrador = Reamostrador(cabecalho.sample_rate)
+        amostras = self._reamostrador.processar(mono(pcm, cabecalho.canais))
+        if not self._falou:
+            margem = TAXA_ALVO * MARGEM_SILENCIO_MS // 1000
+            amostras = np.concatenate((self._espera, amostras))
+            voz = np.flatnonzero(energia_quadros(amostras, TAXA_ALVO) > PISO_VOZ_DBFS)
+            if len(voz) == 0:
+                self._espera = amostras[-margem:]
+                return b""
+            self._falou = True
+            amostras = amostras[max(0, voz[0] * (TAXA_ALVO * QUADRO_MS // 1000) - margem):]
+        return _pcm16(amostras).tobytes()
+
+    def finalizar(self) -> None:
+        self._leitor.finalizar()
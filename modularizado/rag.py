@@ -1,66 +1,248 @@
-from banco_dados import obter_colecao_usuario, colecao_global
-from resposta_ia import gerar_resposta
+import threading
+from collections import OrderedDict
+
+from banco_dados import obter_colecao_usuario, obter_colecao_global, funcao_embedding
 from verificador_base_fixa import buscar_resposta_fixa
+from instrumentacao import medir_etapa
+from relevancia import refinar_trechos
+from logs import obter_logger
 
-def buscar_contexto(pergunta, session_id: str = None, combinar_global: bool = True):
+logger = obter_logger("rag")
+
+N_RESULTADOS_PADRAO = 5
+# Constante do reciprocal rank fusion: quanto maior, menos peso para o topo de cada ranking
+K_RRF = 60
+# Embeddings de consultas recentes (a compressão do contexto reaproveita o da pergunta)
+MAX_CACHE_CONSULTAS = 512
+
+_cache_consultas: "OrderedDict[str, object]" = OrderedDict()
+_lock_cache = threading.Lock()
+
+
+def embeddar_consultas(consultas, tempos=None) -> list:
     """
-    Busca contexto no banco vetorial.
+    Embeddings das consultas, calculando num lote só as que não estão no cache.
+    
+    Args:
+        consultas: Textos das consultas
+        tempos: TemposTurno do turno atual (o cálculo entra como etapa "embedding")
+    
+    Returns:
+        list: Um vetor por consulta, na mesma ordem
+    """
+    unicas = list(dict.fromkeys(consultas))
+    with _lock_cache:
+        vetores = {c: _cache_consultas[c] for c in unicas if c in _cache_consultas}
+        for consulta in vetores:
+            _cache_consultas.move_to_end(consulta)
+
+    faltando = [c for c in unicas if c not in vetores]
+    if faltando:
+        with medir_etapa("embedding", tempos):
+            novos = funcao_embedding()(faltando)
+        vetores.update(zip(faltando, novos))
+        with _lock_cache:
+            for consulta, vetor in zip(faltando, novos):
+                _cache_consultas[consulta] = vetor
+            while len(_cache_consultas) > MAX_CACHE_CONSULTAS:
+                _cache_consultas.popitem(last=False)
+
+    return [vetores[c] for c in consultas]
+
+def _campos_busca(refinar: bool) -> list:
+    # O MMR compara os trechos entre si, então precisa dos embeddings deles
+    return ["documents", "distances", "embeddings"] if refinar else ["documents", "distances"]
+
+def buscar_trechos(pergunta, session_id: str = None, combinar_global: bool = True,
+                   n_results: int = N_RESULTADOS_PADRAO, colecao=None, tempos=None, refinar: bool = True):
+    """
+    Busca trechos no banco vetorial mantendo a distância retornada pelo Chroma.
+    Com `refinar`, os resultados das coleções são juntados pela distância e passam por
+    limite de distância, k adaptativo e MMR (relevancia.refinar_trechos).
     
     Args:
         pergunta: Pergunta do usuário
         session_id: ID da sessão do usuário (opcional)
         combinar_global: Se True, combina resultados da coleção global e do usuário
+        n_results: Número de trechos pedidos a cada coleção
+        colecao: Coleção base a consultar no lugar da global (ex.: índice do benchmark)
+        tempos: TemposTurno do turno atual, para o tempo das consultas entrar no Server-Timing
+        refinar: Se False, devolve todos os resultados das coleções, só sem duplicatas
     
     Returns:
-        str: Contexto encontrado
+        list: Trechos {"texto", "distancia", "origem"} ordenados do mais para o menos relevante
     """
-    contexto_parts = []
+    trechos = []
+    colecao_base = colecao if colecao is not None else obter_colecao_global()
     
     try:
-        # Aumenta número de resultados para melhor cobertura
-        n_results = 5
-        
         # Busca na coleção do usuário (se houver session_id)
         if session_id:
             colecao_usuario = obter_colecao_usuario(session_id)
-            resultados_usuario = colecao_usuario.query(
-                query_texts=[pergunta],
-                n_results=n_results
-            )
-            
-            if resultados_usuario["documents"] and resultados_usuario["documents"][0]:
-                contexto_parts.extend(resultados_usuario["documents"][0])
+            with medir_etapa("chroma_query", tempos):
+                resultados_usuario = colecao_usuario.query(
+                    query_texts=[pergunta],
+                    n_results=n_results,
+                    include=_campos_busca(refinar)
+                )
+            trechos.extend(_extrair_trechos(resultados_usuario, "usuario"))
         
         # Busca na coleção global (documentos base)
         if combinar_global or not session_id:
-            resultados_global = colecao_global.query(
-                query_texts=[pergunta],
-                n_results=n_results
-            )
-            
-            if resultados_global["documents"] and resultados_global["documents"][0]:
-                contexto_parts.extend(resultados_global["documents"][0])
+            with medir_etapa("chroma_query", tempos):
+                resultados_global = colecao_base.query(
+                    query_texts=[pergunta],
+                    n_results=n_results,
+                    include=_campos_busca(refinar)
+                )
+            trechos.extend(_extrair_trechos(resultados_global, "global"))
         
-        # Remove duplicatas mantendo ordem
-        contexto_unico = []
-        visto = set()
-        for doc in contexto_parts:
-            if doc not in visto:
-                contexto_unico.append(doc)
-                visto.add(doc)
+        # Remove duplicatas mantendo a menor distância de cada texto
+        unicos = {}
+        for trecho in trechos:
+            atual = unicos.get(trecho["texto"])
+            if atual is None or trecho["distancia"] < atual["distancia"]:
+                unicos[trecho["texto"]] = trecho
         
-        if contexto_unico:
-            return "\n---\n".join(contexto_unico)
+        if unicos and refinar:
+            return refinar_trechos(list(unicos.values()), k_max=n_results)
+        if unicos:
+            return sorted(unicos.values(), key=lambda t: t["distancia"])
         
-        # Log para debug
-        print(f"[buscar_contexto] Nenhum resultado encontrado para: {pergunta}")
+        logger.debug("nenhum resultado encontrado", extra={"pergunta": pergunta})
 
-    except Exception as e:
-        print(f"[buscar_contexto] Erro na busca: {e}")
+    except Exception:
+        logger.exception("erro na busca")
 
-    return ""
+    return []
+
+def buscar_trechos_multi(consultas, session_id: str = None, combinar_global: bool = True,
+                         n_results: int = N_RESULTADOS_PADRAO, colecao=None, tempos=None, k_rrf: int = K_RRF,
+                         refinar: bool = True):
+    """
+    Busca várias variações da consulta de uma vez: os embeddings saem em um lote só, cada coleção
+    recebe uma única consulta com todos os vetores e os rankings são fundidos por reciprocal rank
+    fusion (soma de 1 / (k_rrf + posição) em cada ranking onde o trecho aparece).
+    
+    Args:
+        consultas: Variações da consulta (repetidas e vazias são ignoradas)
+        session_id: ID da sessão do usuário (opcional)
+        combinar_global: Se True, combina resultados da coleção global e do usuário
+        n_results: Número de trechos pedidos a cada coleção, por consulta
+        colecao: Coleção base a consultar no lugar da global (ex.: índice do benchmark)
+        tempos: TemposTurno do turno atual, para o tempo da busca entrar no Server-Timing
+        k_rrf: Constante do RRF
+        refinar: Se True, o RRF só escolhe os candidatos (2 * n_results) e a seleção final é
+            por distância (limite, k adaptativo e MMR), com no máximo n_results trechos
+    
+    Returns:
+        list: Trechos {"texto", "distancia", "origem", "rrf"}; sem `refinar`, do maior para o
+        menor RRF e no máximo n_results por coleção consultada
+    """
+    return buscar_trechos_lote([consultas], session_id=session_id, combinar_global=combinar_global,
+                               n_results=n_results, colecao=colecao, tempos=tempos, k_rrf=k_rrf,
+                               refinar=refinar)[0]
+
+def buscar_trechos_lote(grupos, session_id: str = None, combinar_global: bool = True,
+                        n_results: int = N_RESULTADOS_PADRAO, colecao=None, tempos=None, k_rrf: int = K_RRF,
+                        refinar: bool = True):
+    """
+    Versão em lote de buscar_trechos_multi para perguntas independentes (ex.: /chat/lote): as
+    consultas de todos os grupos são embeddadas numa chamada só e cada coleção recebe uma única
+    consulta com todos os vetores; o RRF e o refinamento são feitos por grupo.
+    
+    Args:
+        grupos: Uma lista de variações da consulta por pergunta
+        (demais argumentos como em buscar_trechos_multi)
+    
+    Returns:
+        list: Os trechos de cada grupo, na ordem dos grupos
+    """
+    grupos = [list(dict.fromkeys(c.strip() for c in consultas if c and c.strip())) for consultas in grupos]
+    # Consultas repetidas entre grupos são buscadas uma vez só
+    unicas = list(dict.fromkeys(c for consultas in grupos for c in consultas))
+    if not unicas:
+        return [[] for _ in grupos]
+
+    colecoes = []
+    if session_id:
+        colecoes.append((obter_colecao_usuario(session_id), "usuario"))
+    if combinar_global or not session_id:
+        colecoes.append((colecao if colecao is not None else obter_colecao_global(), "global"))
+
+    try:
+        vetores = embeddar_consultas(unicas, tempos)
+        indice_consulta = {c: i for i, c in enumerate(unicas)}
+
+        fundidos = [{} for _ in grupos]
+        for colecao_busca, origem in colecoes:
+            with medir_etapa("chroma_query", tempos):
+                resultados = colecao_busca.query(
+                    query_embeddings=vetores,
+                    n_results=n_results,
+                    include=_campos_busca(refinar)
+                )
+            for consultas, fundidos_grupo in zip(grupos, fundidos):
+                for consulta in consultas:
+                    trechos = _extrair_trechos(resultados, origem, indice_consulta[consulta])
+                    for posicao, trecho in enumerate(trechos, start=1):
+                        atual = fundidos_grupo.get(trecho["texto"])
+                        if atual is None:
+                            atual = fundidos_grupo[trecho["texto"]] = {**trecho, "rrf": 0.0}
+                        elif trecho["distancia"] < atual["distancia"]:
+                            atual.update(distancia=trecho["distancia"], origem=origem)
+                        atual["rrf"] += 1.0 / (k_rrf + posicao)
+
+        resultado = []
+        for consultas, fundidos_grupo in zip(grupos, fundidos):
+            if not fundidos_grupo:
+                if consultas:
+                    logger.debug("nenhum resultado encontrado", extra={"consultas": consultas})
+                resultado.append([])
+                continue
+            ordenados = sorted(fundidos_grupo.values(), key=lambda t: (-t["rrf"], t["distancia"]))
+            if refinar:
+                resultado.append(refinar_trechos(ordenados[:2 * n_results], k_max=n_results))
+            else:
+                resultado.append(ordenados[:n_results * len(colecoes)])
+        return resultado
+
+    except Exception:
+        logger.exception("erro na busca")
+
+    return [[] for _ in grupos]
+
+def _extrair_trechos(resultados, origem, indice: int = 0):
+    if not resultados["documents"] or len(resultados["documents"]) <= indice or not resultados["documents"][indice]:
+        return []
+    documentos = resultados["documents"][indice]
+    distancias = (resultados.get("distances") or [[]] * (indice + 1))[indice] or [0.0] * len(documentos)
+    embeddings = resultados.get("embeddings")
+    embeddings = embeddings[indice] if embeddings is not None else [None] * len(documentos)
+    return [
+        {"texto": doc, "distancia": dist, "origem": origem, **({"embedding": emb} if emb is not None else {})}
+        for doc, dist, emb in zip(documentos, distancias, embeddings)
+        if doc
+    ]
+
+def buscar_contexto(pergunta, session_id: str = None, combinar_global: bool = True):
+    """
+    Busca contexto no banco vetorial.
+    
+    Args:
+        pergunta: Pergunta do usuário
+        session_id: ID da sessão do usuário (opcional)
+        combinar_global: Se True, combina resultados da coleção global e do usuário
+    
+    Returns:
+        str: Contexto encontrado
+    """
+    trechos = buscar_trechos(pergunta, session_id=session_id, combinar_global=combinar_global)
+    return "\n---\n".join(t["texto"] for t in trechos)
 
 def responder(pergunta):
+    from resposta_ia import gerar_resposta
+
     # 🔹 1. Tenta base fixa
     resposta_fixa = buscar_resposta_fixa(pergunta)
     if resposta_fixa:
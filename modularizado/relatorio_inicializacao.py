@@ -0,0 +1,135 @@
+"""
+Relatório do custo de inicialização (cold start) da API.
+Importa `api` em um processo novo com `python -X importtime`, separa o tempo por módulo do projeto
+(inclui a inicialização feita no import, como o cliente do Chroma e o gateway do LLM) e por pacote
+externo, e compara o total com um orçamento.
+
+Sai com código 1 quando o cold start passa do orçamento, para ser usado como verificação de regressão
+(ex.: no CI ou antes do deploy):
+    python relatorio_inicializacao.py --orcamento-ms 3000
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from config import BASE_DIR
+
+
+ORCAMENTO_PADRAO_MS = float(os.getenv("ORCAMENTO_INICIALIZACAO_MS", "4000"))
+# Os logs da API também vão para o stdout; a medição sai numa linha marcada
+MARCADOR = "@@inicializacao@@"
+PADRAO_LINHA = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)$")
+CODIGO_MEDICAO = (
+    f"MARCADOR = {MARCADOR!r}\n"
+    "import json, sys, time\n"
+    "inicio = time.perf_counter()\n"
+    "import api\n"
+    "total = (time.perf_counter() - inicio) * 1000\n"
+    "sys.stdout.write('\\n' + MARCADOR + json.dumps({'import_api_ms': total}) + '\\n')\n"
+)
+
+
+def modulos_do_projeto() -> set:
+    return {os.path.splitext(nome)[0] for nome in os.listdir(BASE_DIR) if nome.endswith(".py")}
+
+
+def medir_uma_vez(modulo_alvo: str = "api") -> Tuple[float, List[Tuple[str, int, int, int]]]:
+    """
+    Importa o módulo em um processo novo.
+
+    Returns:
+        (tempo total do import em ms, linhas do importtime como (modulo, self_us, cumulativo_us, profundidade))
+    """
+    codigo = CODIGO_MEDICAO.replace("import api", f"import {modulo_alvo}")
+    ambiente = dict(os.environ)
+    ambiente.setdefault("GROQ_API_KEY", "relatorio-inicializacao")
+    processo = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", codigo],
+        cwd=BASE_DIR, env=ambiente, capture_output=True, text=True,
+    )
+    if processo.returncode != 0:
+        raise RuntimeError(f"falha ao importar {modulo_alvo}:\n{processo.stderr[-2000:]}")
+
+    linhas = []
+    for linha in processo.stderr.splitlines():
+        casamento = PADRAO_LINHA.match(linha)
+        if casamento:
+            self_us, cumulativo_us, recuo, nome = casamento.groups()
+            linhas.append((nome, int(self_us), int(cumulativo_us), len(recuo) // 2))
+    marcada = [l for l in processo.stdout.splitlines() if l.startswith(MARCADOR)][-1]
+    total_ms = json.loads(marcada[len(MARCADOR):])["import_api_ms"]
+    return total_ms, linhas
+
+
+def agrupar(linhas: List[Tuple[str, int, int, int]]) -> Dict[str, Dict[str, float]]:
+    """
+    Separa o custo em:
+        projeto: módulos deste diretório, tempo cumulativo (o que o import deles arrasta + a inicialização)
+        pacotes: pacotes externos agrupados pelo nome de topo, somando o tempo próprio de cada submódulo
+    """
+    proprios = modulos_do_projeto()
+    projeto: Dict[str, float] = {}
+    pacotes: Dict[str, float] = defaultdict(float)
+    for nome, self_us, cumulativo_us, _ in linhas:
+        topo = nome.split(".")[0]
+        if topo in proprios:
+            projeto[nome] = max(projeto.get(nome, 0.0), cumulativo_us / 1000)
+        else:
+            pacotes[topo] += self_us / 1000
+    return {"projeto": projeto, "pacotes": dict(pacotes)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Relatório de tempo de inicialização da API")
+    parser.add_argument("--orcamento-ms", type=float, default=ORCAMENTO_PADRAO_MS,
+                        help="tempo máximo aceitável para importar a API (env ORCAMENTO_INICIALIZACAO_MS)")
+    parser.add_argument("--repeticoes", type=int, default=3, help="processos medidos; usa a mediana")
+    parser.add_argument("--top", type=int, default=12, help="itens mostrados por grupo")
+    parser.add_argument("--modulo", default="api", help="módulo a importar")
+    parser.add_argument("--json", action="store_true", help="imprime o relatório em JSON")
+    args = parser.parse_args()
+
+    medicoes = [medir_uma_vez(args.modulo) for _ in range(max(1, args.repeticoes))]
+    totais = [total for total, _ in medicoes]
+    mediana = statistics.median(totais)
+    # Detalhamento da execução mais próxima da mediana
+    _, linhas = min(medicoes, key=lambda m: abs(m[0] - mediana))
+    grupos = agrupar(linhas)
+
+    relatorio = {
+        "modulo": args.modulo,
+        "import_ms_mediana": round(mediana, 1),
+        "import_ms_execucoes": [round(t, 1) for t in totais],
+        "orcamento_ms": args.orcamento_ms,
+        "dentro_do_orcamento": mediana <= args.orcamento_ms,
+        "projeto_ms": dict(sorted(((k, round(v, 1)) for k, v in grupos["projeto"].items()),
+                                  key=lambda i: -i[1])[:args.top]),
+        "pacotes_ms": dict(sorted(((k, round(v, 1)) for k, v in grupos["pacotes"].items()),
+                                  key=lambda i: -i[1])[:args.top]),
+    }
+
+    if args.json:
+        print(json.dumps(relatorio, ensure_ascii=False, indent=2))
+    else:
+        print(f"[inicializacao] import {args.modulo}: {relatorio['import_ms_mediana']} ms (mediana de "
+              f"{len(totais)}: {relatorio['import_ms_execucoes']}) | orçamento {args.orcamento_ms:.0f} ms")
+        print("[inicializacao] módulos do projeto (cumulativo, inclui inicialização no import):")
+        for nome, ms in relatorio["projeto_ms"].items():
+            print(f"    {nome:<28} {ms:>9.1f} ms")
+        print("[inicializacao] pacotes externos (soma do tempo próprio dos submódulos):")
+        for nome, ms in relatorio["pacotes_ms"].items():
+            print(f"    {nome:<28} {ms:>9.1f} ms")
+        if not relatorio["dentro_do_orcamento"]:
+            print(f"[inicializacao] ❌ cold start acima do orçamento ({mediana:.0f} ms > {args.orcamento_ms:.0f} ms)")
+
+    sys.exit(0 if relatorio["dentro_do_orcamento"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Módulo de seleção dos trechos recuperados antes de irem para o prompt.
+Junta os resultados das coleções (usuário e global) pela distância, descarta os fracos,
+escolhe quantos manter pelo maior salto de distância (k adaptativo) e remove os redundantes
+com Maximal Marginal Relevance (chunks vizinhos têm overlap e repetem o mesmo texto).
+
+As distâncias são as do Chroma (L2 ao quadrado sobre vetores normalizados, de 0 a 4):
+similaridade de cosseno = 1 - distancia / 2.
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import RAG_DISTANCIA_MAXIMA, RAG_MMR_LAMBDA
+
+# Só corta no maior salto se ele for pelo menos deste tamanho; senão mantém todos
+SALTO_MINIMO = 0.08
+# Trecho quase igual a um já escolhido (cosseno acima disto) é descartado
+SIMILARIDADE_REDUNDANTE = 0.92
+
+
+def k_adaptativo(distancias: List[float], k_min: int = 1, salto_minimo: float = SALTO_MINIMO) -> int:
+    """
+    Escolhe quantos resultados manter cortando no maior salto entre distâncias consecutivas.
+
+    Args:
+        distancias: Distâncias em ordem crescente
+        k_min: Mínimo de resultados mantidos
+        salto_minimo: Salto mínimo para haver corte
+
+    Returns:
+        int: Número de resultados a manter
+    """
+    if len(distancias) <= k_min:
+        return len(distancias)
+    saltos = [distancias[i + 1] - distancias[i] for i in range(k_min - 1, len(distancias) - 1)]
+    maior = max(range(len(saltos)), key=saltos.__getitem__)
+    if saltos[maior] < salto_minimo:
+        return len(distancias)
+    return k_min + maior
+
+
+def _similaridades(vetores: np.ndarray) -> np.ndarray:
+    normas = np.linalg.norm(vetores, axis=1, keepdims=True)
+    unitarios = vetores / np.where(normas == 0, 1, normas)
+    return unitarios @ unitarios.T
+
+
+def mmr(trechos: List[Dict], k: int, lambda_: float = RAG_MMR_LAMBDA,
+        redundancia: float = SIMILARIDADE_REDUNDANTE) -> List[Dict]:
+    """
+    Seleciona até k trechos equilibrando relevância (distância à consulta) e novidade
+    (similaridade com os já escolhidos). Trechos quase idênticos a um escolhido são descartados.
+    Sem embeddings nos trechos, devolve os k primeiros.
+    """
+    if k <= 0 or not trechos:
+        return []
+    if any(t.get("embedding") is None for t in trechos):
+        return trechos[:k]
+
+    relevancia = [1 - t["distancia"] / 2 for t in trechos]
+    similaridade = _similaridades(np.asarray([t["embedding"] for t in trechos], dtype=np.float32))
+
+    escolhidos: List[int] = []
+    candidatos = list(range(len(trechos)))
+    while candidatos and len(escolhidos) < k:
+        def pontuacao(i: int) -> float:
+            parecido = max((similaridade[i, j] for j in escolhidos), default=0.0)
+            return lambda_ * relevancia[i] - (1 - lambda_) * parecido
+
+        melhor = max(candidatos, key=pontuacao)
+        candidatos.remove(melhor)
+        if escolhidos and max(similaridade[melhor, j] for j in escolhidos) >= redundancia:
+            continue
+        escolhidos.append(melhor)
+    return [trechos[i] for i in escolhidos]
+
+
+def refinar_trechos(trechos: List[Dict], k_max: int, distancia_maxima: Optional[float] = None,
+                    lambda_: float = RAG_MMR_LAMBDA) -> List[Dict]:
+    """
+    Aplica limite de distância, k adaptativo e MMR aos trechos de uma busca.
+
+    Args:
+        trechos: Trechos {"texto", "distancia", "origem", "embedding"?, ...} de uma ou mais coleções
+        k_max: Máximo de trechos devolvidos
+        distancia_maxima: Trechos mais distantes que isso são descartados (padrão: RAG_DISTANCIA_MAXIMA)
+        lambda_: Peso da relevância no MMR (1 = só relevância)
+
+    Returns:
+        list: Trechos escolhidos, sem o campo "embedding", do mais para o menos relevante
+    """
+    limite = RAG_DISTANCIA_MAXIMA if distancia_maxima is None else distancia_maxima
+    candidatos = sorted((t for t in trechos if t["distancia"] <= limite), key=lambda t: t["distancia"])
+    if not candidatos:
+        return []
+
+    k = min(k_max, k_adaptativo([t["distancia"] for t in candidatos]))
+    # O MMR escolhe entre todos os candidatos: se um dos k primeiros for redundante,
+    # o próximo menos parecido entra no lugar dele
+    escolhidos = mmr(candidatos, k, lambda_)
+    return [{chave: valor for chave, valor in t.items() if chave != "embedding"} for t in escolhidos]
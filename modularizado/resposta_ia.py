@@ -1,10 +1,9 @@
-from groq import Groq
-from config import GROQ_API_KEY, MODELO_IA
+from coalescencia import chave_geracao, geracoes
+from fluxo_resposta import agrupar_pedacos, limpar_markdown
+from llm_gateway import gateway
 from prompt_base import PROMPT_BASE
 
 
-client = Groq(api_key=GROQ_API_KEY)
-
 def gerar_resposta(pergunta, contexto):
     if not contexto:
         contexto = "Nenhuma informação encontrada nos documentos."
@@ -14,32 +13,32 @@ def gerar_resposta(pergunta, contexto):
         pergunta=pergunta
     )
 
-    stream = client.chat.completions.create(
-        model=MODELO_IA,
-        messages=[{"role": "user", "content": prompt}],
+    stream = gateway.stream(
+        [{"role": "user", "content": prompt}],
         temperature=0.3,
         top_p=0.1,
-        reasoning_effort="medium",
-        stream=True
+        reasoning_effort="medium"
     )
 
     print("\nIA: ", end="")
-    for chunk in stream:
-        content = chunk.choices[0].delta.content or ""
-        content = content.replace("*", "")
+    for content in limpar_markdown(stream):
         print(content, end="")
     print()
 
 
-def stream_resposta(pergunta, contexto, historico_conversa: str = ""):
+def stream_resposta(pergunta, contexto, historico_conversa: str = "", coalescer: bool = True):
     """
     Gera resposta em modo streaming, produzindo pedaços de texto para consumo
-    em APIs (ex.: FastAPI + StreamingResponse). Remove asteriscos/markdown.
+    em APIs (ex.: FastAPI + StreamingResponse). Remove markdown e agrupa os deltas
+    do LLM em pedaços maiores (até ~64 bytes ou 20 ms) para reduzir escritas na conexão.
+    Perguntas idênticas e simultâneas (mesma pergunta normalizada, contexto e histórico)
+    compartilham uma única chamada ao LLM.
     
     Args:
         pergunta: Pergunta do usuário
         contexto: Contexto dos documentos
         historico_conversa: Histórico formatado da conversa (opcional)
+        coalescer: Se True, agrupa gerações idênticas em andamento
     """
     if not contexto:
         contexto = "Nenhuma informação encontrada nos documentos."
@@ -53,17 +52,19 @@ def stream_resposta(pergunta, contexto, historico_conversa: str = ""):
         pergunta=pergunta
     )
 
-    stream = client.chat.completions.create(
-        model=MODELO_IA,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.1,
-        top_p=0.05,
-        reasoning_effort="medium",
-        stream=True
-    )
+    def gerar():
+        stream = gateway.stream(
+            [{"role": "user", "content": prompt}],
+            temperature=0.1,
+            top_p=0.05,
+            reasoning_effort="medium"
+        )
+
+        yield from agrupar_pedacos(limpar_markdown(stream), max_bytes=64, max_ms=20)
+
+    if not coalescer:
+        yield from gerar()
+        return
 
-    for chunk in stream:
-        content = chunk.choices[0].delta.content or ""
-        content = content.replace("*", "")
-        if content:
-            yield content
+    chave = chave_geracao(pergunta, contexto, historico_formatado)
+    yield from geracoes.executar(chave, gerar)
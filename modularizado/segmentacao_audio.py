@@ -0,0 +1,261 @@
+"""
+Módulo de segmentação de áudio por detecção de voz (VAD por energia).
+Áudios longos (ex.: mensagens de voz de 1 minuto) são cortados nos silêncios em segmentos de até
+VAD_SEGMENTO_MAX_S, reconhecidos em paralelo e juntados na ordem (transcricao.py). O corte é feito
+à medida que o upload chega: o primeiro segmento vai para o reconhecimento antes do fim do upload.
+
+Só WAV PCM 16 bits é segmentado (decodificável com a biblioteca padrão + numpy); os demais
+formatos seguem pelo reconhecimento em streaming.
+"""
+import io
+import struct
+import wave
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+from config import VAD_SEGMENTO_MAX_S, VAD_SILENCIO_MIN_MS
+
+# Duração de cada quadro avaliado pelo VAD
+QUADRO_MS = 30
+# Quadro é voz se a energia passar o ruído de fundo estimado por esta margem (dB)...
+MARGEM_RUIDO_DB = 10.0
+# ...e também este piso absoluto (dBFS), para gravações sem ruído nenhum
+PISO_VOZ_DBFS = -50.0
+# Sem silêncio no trecho o "ruído" estimado é a própria fala: o limiar nunca passa de pico - isto
+FAIXA_FALA_DB = 30.0
+# Não corta antes disso: segmentos muito curtos perdem o contexto da frase
+SEGMENTO_MIN_S = 2.0
+
+
+@dataclass
+class CabecalhoWav:
+    sample_rate: int
+    canais: int
+    bits: int
+    formato: int
+    inicio_dados: int
+    tamanho_dados: Optional[int]
+
+    @property
+    def bytes_por_quadro(self) -> int:
+        return self.canais * self.bits // 8
+
+
+def ler_cabecalho_wav(dados: bytes) -> Optional[CabecalhoWav]:
+    """
+    Lê o cabeçalho RIFF/WAVE até o início do chunk "data".
+
+    Returns:
+        CabecalhoWav, ou None se os bytes ainda não chegam ao chunk "data"
+
+    Raises:
+        ValueError: não é WAV ou falta o chunk "fmt "
+    """
+    if len(dados) < 12:
+        return None
+    if dados[:4] != b"RIFF" or dados[8:12] != b"WAVE":
+        raise ValueError("o arquivo não é WAV (RIFF/WAVE)")
+    posicao, fmt = 12, None
+    while len(dados) >= posicao + 8:
+        nome = dados[posicao:posicao + 4]
+        tamanho = struct.unpack_from("<I", dados, posicao + 4)[0]
+        corpo = posicao + 8
+        if nome == b"data":
+            if fmt is None:
+                raise ValueError("WAV sem chunk 'fmt ' antes dos dados")
+            # Gravadores em streaming escrevem 0 ou 0xFFFFFFFF quando não sabem o tamanho
+            tamanho_dados = tamanho if 0 < tamanho < 0xFFFFFFFF else None
+            return CabecalhoWav(fmt[2], fmt[1], fmt[3], fmt[0], corpo, tamanho_dados)
+        if nome == b"fmt ":
+            if tamanho < 16:
+                raise ValueError("chunk 'fmt ' do WAV inválido")
+            if len(dados) < corpo + min(tamanho, 26):
+                return None
+            formato, canais, sample_rate, _, _, bits = struct.unpack_from("<HHIIHH", dados, corpo)
+            if formato == 0xFFFE and tamanho >= 26:
+                # WAVE_FORMAT_EXTENSIBLE: o formato real está no início do GUID do subformato
+                formato = struct.unpack_from("<H", dados, corpo + 24)[0]
+            fmt = (formato, canais, sample_rate, bits)
+        posicao = corpo + tamanho + (tamanho & 1)
+    return None
+
+
+def para_wav(pcm: bytes, sample_rate: int, canais: int = 1) -> bytes:
+    """Empacota PCM 16 bits num WAV."""
+    saida = io.BytesIO()
+    with wave.open(saida, "wb") as arquivo:
+        arquivo.setnchannels(canais)
+        arquivo.setsampwidth(2)
+        arquivo.setframerate(sample_rate)
+        arquivo.writeframes(pcm)
+    return saida.getvalue()
+
+
+def mono(pcm: bytes, canais: int) -> np.ndarray:
+    """PCM 16 bits intercalado -> amostras mono em float32 (-1 a 1)."""
+    amostras = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768
+    if canais > 1:
+        amostras = amostras[:len(amostras) // canais * canais].reshape(-1, canais).mean(axis=1)
+    return amostras
+
+
+def energia_quadros(amostras: np.ndarray, sample_rate: int, quadro_ms: int = QUADRO_MS) -> np.ndarray:
+    """Energia (dBFS) de cada quadro completo de `quadro_ms`."""
+    n = max(1, sample_rate * quadro_ms // 1000)
+    total = len(amostras) // n
+    if total == 0:
+        return np.empty(0, dtype=np.float32)
+    quadros = amostras[:total * n].reshape(total, n)
+    rms = np.sqrt(np.mean(quadros ** 2, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-6))
+
+
+def quadros_com_voz(energias: np.ndarray) -> np.ndarray:
+    """Marca como voz os quadros acima do ruído de fundo (percentil 10 da energia) + margem."""
+    if len(energias) == 0:
+        return np.zeros(0, dtype=bool)
+    ruido = float(np.percentile(energias, 10)) + MARGEM_RUIDO_DB
+    limiar = max(PISO_VOZ_DBFS, min(ruido, float(np.max(energias)) - FAIXA_FALA_DB))
+    return energias > limiar
+
+
+def ponto_de_corte(amostras: np.ndarray, sample_rate: int, max_s: float = VAD_SEGMENTO_MAX_S,
+                   min_s: float = SEGMENTO_MIN_S, silencio_min_ms: int = VAD_SILENCIO_MIN_MS) -> int:
+    """
+    Onde terminar o próximo segmento: no meio do silêncio mais longo entre min_s e max_s.
+
+    Args:
+        amostras: Áudio mono a partir do início do segmento
+        sample_rate: Taxa de amostragem
+        max_s: Duração máxima do segmento
+        min_s: Duração mínima do segmento
+        silencio_min_ms: Silêncios mais curtos não são pontos de corte
+
+    Returns:
+        int: Posição do corte em amostras (max_s, se não houver silêncio que sirva)
+    """
+    max_amostras = int(max_s * sample_rate)
+    voz = quadros_com_voz(energia_quadros(amostras[:max_amostras], sample_rate))
+    # Trechos de silêncio [inicio, fim) em quadros
+    bordas = np.flatnonzero(np.diff(np.concatenate(([1], voz.astype(np.int8), [1]))))
+    inicios, fins = bordas[0::2], bordas[1::2]
+
+    quadro = sample_rate * QUADRO_MS // 1000
+    primeiro_quadro = int(min_s * 1000 / QUADRO_MS)
+    melhor, maior = None, 0
+    for inicio, fim in zip(inicios, fins):
+        meio = (inicio + fim) // 2
+        if meio < primeiro_quadro or (fim - inicio) * QUADRO_MS < silencio_min_ms:
+            continue
+        if fim - inicio > maior:
+            melhor, maior = meio, fim - inicio
+    return int(melhor * quadro) if melhor is not None else max_amostras
+
+
+def tem_voz(amostras: np.ndarray, sample_rate: int) -> bool:
+    return bool(np.any(energia_quadros(amostras, sample_rate) > PISO_VOZ_DBFS))
+
+
+class LeitorWav:
+    """
+    Separa o cabeçalho de um WAV PCM 16 bits que chega em blocos e devolve só o áudio,
+    sempre em quadros inteiros (todas as amostras de um instante, de todos os canais).
+    """
+
+    def __init__(self) -> None:
+        self.cabecalho: Optional[CabecalhoWav] = None
+        self._inicio = bytearray()
+        self._sobra = b""
+        self._restante: Optional[int] = None
+
+    def ler(self, dados: bytes) -> bytes:
+        """
+        Raises:
+            ValueError: o áudio não é WAV PCM 16 bits
+        """
+        if self.cabecalho is None:
+            self._inicio.extend(dados)
+            self.cabecalho = ler_cabecalho_wav(bytes(self._inicio))
+            if self.cabecalho is None:
+                return b""
+            if self.cabecalho.formato != 1 or self.cabecalho.bits != 16:
+                raise ValueError("WAV precisa ser PCM 16 bits")
+            self._restante = self.cabecalho.tamanho_dados
+            dados = bytes(self._inicio[self.cabecalho.inicio_dados:])
+            self._inicio = bytearray()
+        if self._restante is not None:
+            # Chunks depois de "data" (ex.: LIST) não são áudio
+            dados = dados[:self._restante]
+            self._restante -= len(dados)
+        dados = self._sobra + dados
+        inteiros = len(dados) // self.cabecalho.bytes_por_quadro * self.cabecalho.bytes_por_quadro
+        self._sobra = dados[inteiros:]
+        return dados[:inteiros]
+
+    def finalizar(self) -> None:
+        """
+        Raises:
+            ValueError: o áudio terminou antes do início dos dados
+        """
+        if self.cabecalho is None:
+            raise ValueError("WAV incompleto: cabeçalho sem o chunk 'data'")
+
+
+class SegmentadorWav:
+    """
+    Recebe os bytes de um WAV PCM 16 bits conforme chegam e devolve os segmentos prontos
+    (PCM no formato do cabeçalho, de até max_s), cortados nos silêncios. Segmentos sem voz são descartados.
+    """
+
+    def __init__(self, max_s: float = VAD_SEGMENTO_MAX_S) -> None:
+        self.max_s = max_s
+        self.segmentos = 0
+        self.duracao_s = 0.0
+        self._leitor = LeitorWav()
+        self._pcm = bytearray()
+
+    @property
+    def cabecalho(self) -> Optional[CabecalhoWav]:
+        return self._leitor.cabecalho
+
+    def _segmento(self, pcm: bytes) -> Optional[bytes]:
+        cabecalho = self.cabecalho
+        self.duracao_s += len(pcm) / cabecalho.bytes_por_quadro / cabecalho.sample_rate
+        if not tem_voz(mono(pcm, cabecalho.canais), cabecalho.sample_rate):
+            return None
+        self.segmentos += 1
+        return pcm
+
+    def adicionar(self, dados: bytes) -> List[bytes]:
+        """
+        Raises:
+            ValueError: o áudio não é WAV PCM 16 bits
+        """
+        self._pcm.extend(self._leitor.ler(dados))
+        prontos = []
+        cabecalho = self.cabecalho
+        if cabecalho is None:
+            return prontos
+        por_quadro = cabecalho.bytes_por_quadro
+        max_bytes = int(self.max_s * cabecalho.sample_rate) * por_quadro
+        while len(self._pcm) > max_bytes:
+            corte = ponto_de_corte(mono(bytes(self._pcm[:max_bytes]), cabecalho.canais),
+                                   cabecalho.sample_rate, self.max_s) * por_quadro
+            segmento = self._segmento(bytes(self._pcm[:corte]))
+            del self._pcm[:corte]
+            if segmento is not None:
+                prontos.append(segmento)
+        return prontos
+
+    def finalizar(self) -> List[bytes]:
+        """
+        Raises:
+            ValueError: o áudio terminou antes do início dos dados
+        """
+        self._leitor.finalizar()
+        pcm = bytes(self._pcm)
+        self._pcm = bytearray()
+        segmento = self._segmento(pcm) if pcm else None
+        return [segmento] if segmento is not None else []
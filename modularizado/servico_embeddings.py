@@ -0,0 +1,276 @@
+"""
+Serviço local de embeddings compartilhado pelos workers do uvicorn.
+Um único processo carrega o modelo ONNX padrão do Chroma e atende todos os workers por um
+Unix socket, agrupando em micro-lotes os textos que chegam ao mesmo tempo. Cada worker usa
+`FuncaoEmbeddingRemota` como embedding function das coleções e não carrega o modelo.
+
+Uso:
+    python servico_embeddings.py --socket /tmp/chatbot-embeddings.sock &
+    EMBEDDINGS_SOCKET=/tmp/chatbot-embeddings.sock uvicorn api:app --workers 4
+
+Protocolo (quadros com 4 bytes de tamanho, big-endian, seguidos do conteúdo):
+    pedido:   JSON {"textos": [...]}
+    resposta: JSON {"n": N, "dim": D} + quadro binário com N*D float32 (little-endian),
+              ou JSON {"erro": "..."}
+"""
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+from config import EMBEDDINGS_SOCKET, EMBEDDINGS_MAX_LOTE, EMBEDDINGS_ESPERA_MS
+from logs import obter_logger
+
+logger = obter_logger("servico_embeddings")
+
+CABECALHO = struct.Struct(">I")
+SOCKET_PADRAO = "/tmp/chatbot-embeddings.sock"
+
+
+def _receber_exato(conexao: socket.socket, tamanho: int) -> bytes:
+    partes = []
+    while tamanho:
+        parte = conexao.recv(min(tamanho, 1 << 20))
+        if not parte:
+            raise ConnectionError("conexão encerrada pelo outro lado")
+        partes.append(parte)
+        tamanho -= len(parte)
+    return b"".join(partes)
+
+
+def enviar_quadro(conexao: socket.socket, dados: bytes) -> None:
+    conexao.sendall(CABECALHO.pack(len(dados)) + dados)
+
+
+def receber_quadro(conexao: socket.socket) -> bytes:
+    (tamanho,) = CABECALHO.unpack(_receber_exato(conexao, CABECALHO.size))
+    return _receber_exato(conexao, tamanho)
+
+
+# ---------------------------------------------------------------------- servidor
+
+
+class LoteadorEmbeddings:
+    """
+    Junta os pedidos que chegam de vários workers em um lote só: espera até `max_espera_ms`
+    depois do primeiro pedido ou até juntar `max_lote` textos, e chama o modelo uma vez.
+    """
+
+    def __init__(self, funcao: Callable[[List[str]], Any], max_lote: int = EMBEDDINGS_MAX_LOTE,
+                 max_espera_ms: float = EMBEDDINGS_ESPERA_MS) -> None:
+        self._funcao = funcao
+        self.max_lote = max(1, max_lote)
+        self.max_espera = max_espera_ms / 1000
+        self._fila: "queue.Queue" = queue.Queue()
+        self.lotes = 0
+        self.textos = 0
+        threading.Thread(target=self._laco, daemon=True, name="loteador-embeddings").start()
+
+    def embeddar(self, textos: List[str]) -> np.ndarray:
+        futuro: Future = Future()
+        self._fila.put((textos, futuro))
+        return futuro.result()
+
+    def _laco(self) -> None:
+        while True:
+            pedidos = [self._fila.get()]
+            total = len(pedidos[0][0])
+            prazo = time.monotonic() + self.max_espera
+            while total < self.max_lote:
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    pedido = self._fila.get(timeout=restante)
+                except queue.Empty:
+                    break
+                pedidos.append(pedido)
+                total += len(pedido[0])
+
+            textos = [texto for lote, _ in pedidos for texto in lote]
+            try:
+                vetores = np.asarray(self._funcao(textos), dtype=np.float32) if textos else np.zeros((0, 0), np.float32)
+            except Exception as e:
+                for _, futuro in pedidos:
+                    futuro.set_exception(e)
+                continue
+
+            self.lotes += 1
+            self.textos += len(textos)
+            inicio = 0
+            for lote, futuro in pedidos:
+                futuro.set_result(vetores[inicio:inicio + len(lote)])
+                inicio += len(lote)
+            logger.debug("lote de embeddings", extra={"pedidos": len(pedidos), "textos": len(textos)})
+
+
+class ServidorEmbeddings(socketserver.ThreadingUnixStreamServer):
+    # Todos os workers conectam juntos no startup; o backlog padrão (5) recusaria conexões
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def criar_servidor(caminho_socket: str, loteador: LoteadorEmbeddings) -> ServidorEmbeddings:
+    class HandlerEmbeddings(socketserver.BaseRequestHandler):
+        def handle(self) -> None:
+            # Conexões são persistentes: cada worker mantém uma por thread
+            while True:
+                try:
+                    pedido = json.loads(receber_quadro(self.request))
+                except (ConnectionError, OSError):
+                    return
+                try:
+                    if pedido.get("op") == "status":
+                        enviar_quadro(self.request, json.dumps(
+                            {"lotes": loteador.lotes, "textos": loteador.textos}
+                        ).encode())
+                        continue
+                    vetores = loteador.embeddar([str(t) for t in pedido.get("textos") or []])
+                    n, dim = vetores.shape if vetores.size else (0, 0)
+                    enviar_quadro(self.request, json.dumps({"n": n, "dim": dim}).encode())
+                    enviar_quadro(self.request, vetores.astype("<f4").tobytes())
+                except (ConnectionError, OSError):
+                    return
+                except Exception as e:
+                    enviar_quadro(self.request, json.dumps({"erro": f"{type(e).__name__}: {e}"}).encode())
+
+    if os.path.exists(caminho_socket):
+        os.unlink(caminho_socket)
+    servidor = ServidorEmbeddings(caminho_socket, HandlerEmbeddings)
+    os.chmod(caminho_socket, 0o660)
+    return servidor
+
+
+# ---------------------------------------------------------------------- cliente
+
+
+class FuncaoEmbeddingRemota(EmbeddingFunction[Documents]):
+    """
+    Embedding function do Chroma que pede os vetores ao serviço compartilhado.
+    Se o serviço estiver fora do ar, cai para o modelo padrão carregado neste processo
+    (mais memória, mas o chat continua funcionando).
+    """
+
+    def __init__(self, caminho_socket: str = EMBEDDINGS_SOCKET or SOCKET_PADRAO, prazo: float = 30.0) -> None:
+        self.caminho_socket = caminho_socket
+        self.prazo = prazo
+        self._local = threading.local()
+        self._reserva = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def name() -> str:
+        # Mesmo modelo e mesmo espaço vetorial do padrão do Chroma: coleções criadas com uma
+        # função podem ser abertas com a outra sem conflito de configuração
+        return "default"
+
+    def get_config(self) -> Dict[str, Any]:
+        return {}
+
+    @staticmethod
+    def build_from_config(config: Dict[str, Any]) -> "FuncaoEmbeddingRemota":
+        return FuncaoEmbeddingRemota()
+
+    def _conexao(self) -> socket.socket:
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None:
+            conexao = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conexao.settimeout(self.prazo)
+            try:
+                conexao.connect(self.caminho_socket)
+            except OSError:
+                conexao.close()
+                raise
+            self._local.conexao = conexao
+        return conexao
+
+    def _descartar_conexao(self) -> None:
+        conexao = getattr(self._local, "conexao", None)
+        self._local.conexao = None
+        if conexao is not None:
+            try:
+                conexao.close()
+            except OSError:
+                pass
+
+    def _pedir(self, textos: List[str]) -> List[np.ndarray]:
+        conexao = self._conexao()
+        enviar_quadro(conexao, json.dumps({"textos": textos}, ensure_ascii=False).encode("utf-8"))
+        cabecalho = json.loads(receber_quadro(conexao))
+        if "erro" in cabecalho:
+            raise RuntimeError(f"serviço de embeddings: {cabecalho['erro']}")
+        vetores = np.frombuffer(receber_quadro(conexao), dtype="<f4")
+        return list(vetores.reshape(cabecalho["n"], cabecalho["dim"])) if cabecalho["n"] else []
+
+    def _funcao_reserva(self):
+        with self._lock:
+            if self._reserva is None:
+                from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+                logger.warning("serviço de embeddings indisponível; usando o modelo local",
+                               extra={"socket": self.caminho_socket})
+                self._reserva = DefaultEmbeddingFunction()
+            return self._reserva
+
+    def __call__(self, input: Documents) -> Embeddings:
+        textos = list(input)
+        # Uma nova tentativa com conexão nova (o serviço pode ter reiniciado)
+        for _ in range(2):
+            try:
+                return self._pedir(textos)
+            except OSError:
+                # Inclui socket inexistente, conexão recusada/encerrada e timeout
+                self._descartar_conexao()
+        return self._funcao_reserva()(textos)
+
+
+def status_servico(caminho_socket: str = EMBEDDINGS_SOCKET or SOCKET_PADRAO) -> Optional[Dict]:
+    """
+    Retorna os contadores do serviço ({"lotes", "textos"}) ou None se ele não responder.
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conexao:
+            conexao.settimeout(2.0)
+            conexao.connect(caminho_socket)
+            enviar_quadro(conexao, b'{"op": "status"}')
+            return json.loads(receber_quadro(conexao))
+    except OSError:
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serviço de embeddings compartilhado (Unix socket)")
+    parser.add_argument("--socket", default=EMBEDDINGS_SOCKET or SOCKET_PADRAO)
+    parser.add_argument("--max-lote", type=int, default=EMBEDDINGS_MAX_LOTE, help="textos por lote")
+    parser.add_argument("--espera-ms", type=float, default=EMBEDDINGS_ESPERA_MS,
+                        help="quanto esperar por mais pedidos antes de rodar o lote")
+    args = parser.parse_args()
+
+    from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+    modelo = DefaultEmbeddingFunction()
+    modelo(["aquecimento"])  # carrega o modelo antes de aceitar conexões
+
+    loteador = LoteadorEmbeddings(modelo, args.max_lote, args.espera_ms)
+    servidor = criar_servidor(args.socket, loteador)
+    logger.info("serviço de embeddings ouvindo", extra={"socket": args.socket, "max_lote": args.max_lote})
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
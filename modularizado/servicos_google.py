@@ -0,0 +1,39 @@
+"""
+Módulo de acesso preguiçoso ao SDK do Google Speech-to-Text.
+O pacote é pesado para importar e não é usado no caminho do chat; só é carregado na
+primeira chamada, então workers que nunca transcrevem não pagam esse custo.
+"""
+import threading
+from typing import Any
+
+_lock = threading.Lock()
+_speech = None
+_cliente_speech = None
+
+
+def modulo_speech() -> Any:
+    """
+    Retorna o módulo google.cloud.speech, importando-o no primeiro uso.
+    """
+    global _speech
+    if _speech is None:
+        with _lock:
+            if _speech is None:
+                from google.cloud import speech
+                _speech = speech
+    return _speech
+
+
+def cliente_speech() -> Any:
+    """
+    Retorna o SpeechClient do processo, criado no primeiro uso. O cliente gRPC é seguro entre threads;
+    reaproveitá-lo evita refazer a autenticação e a conexão TLS a cada transcrição.
+    """
+    global _cliente_speech
+    if _cliente_speech is None:
+        speech = modulo_speech()
+        with _lock:
+            if _cliente_speech is None:
+                _cliente_speech = speech.SpeechClient()
+    return _cliente_speech
+
@@ -0,0 +1,234 @@
+"""
+Servidor LLM falso, compatível com a API de chat completions do Groq/OpenAI, para testes de carga offline.
+Responde com tokens determinísticos e permite configurar o tempo até o primeiro token, o intervalo
+entre tokens e a injeção de erros, sem gastar cota nem depender da latência do provedor.
+
+Uso:
+    python servidor_llm_falso.py --porta 8765 --ttft-ms 300 --token-ms 25 --taxa-erro 0.02
+    LLM_BASE_URL=http://127.0.0.1:8765 GROQ_API_KEY=falsa uvicorn api:app
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+
+RESPOSTA_BASE = (
+    "Para tirar o documento, procure o posto de atendimento mais próximo levando um documento "
+    "original com foto e o comprovante de residência. O atendimento costuma ser gratuito na primeira "
+    "via e a entrega leva de cinco a quinze dias úteis. Se preferir, agende pela internet antes de ir."
+)
+
+
+class ConfigFalso:
+    """
+    Parâmetros do servidor falso (alteráveis em tempo de execução via POST /config).
+
+    Atributos:
+        ttft_ms: Tempo até o primeiro token, em ms
+        token_ms: Intervalo entre tokens, em ms
+        jitter: Variação relativa aplicada aos tempos (0.2 = ±20%)
+        tokens: Quantidade de tokens por resposta em streaming
+        taxa_erro: Fração das requisições respondidas com erro HTTP
+        status_erro: Status usado nos erros injetados (429, 500, 503...)
+        taxa_corte: Fração dos streams interrompidos no meio
+    """
+
+    def __init__(self, ttft_ms: float = 300, token_ms: float = 25, jitter: float = 0.2, tokens: int = 60,
+                 taxa_erro: float = 0.0, status_erro: int = 503, taxa_corte: float = 0.0, semente: int = 42) -> None:
+        self.ttft_ms = ttft_ms
+        self.token_ms = token_ms
+        self.jitter = jitter
+        self.tokens = tokens
+        self.taxa_erro = taxa_erro
+        self.status_erro = status_erro
+        self.taxa_corte = taxa_corte
+        self._aleatorio = random.Random(semente)
+        self._lock = threading.Lock()
+        self.requisicoes = 0
+        self.erros = 0
+
+    def sortear(self) -> float:
+        with self._lock:
+            return self._aleatorio.random()
+
+    def atraso(self, base_ms: float) -> float:
+        if base_ms <= 0:
+            return 0.0
+        with self._lock:
+            fator = 1 + self._aleatorio.uniform(-self.jitter, self.jitter)
+        return max(0.0, base_ms * fator) / 1000
+
+    def atualizar(self, dados: Dict) -> None:
+        for campo in ("ttft_ms", "token_ms", "jitter", "tokens", "taxa_erro", "status_erro", "taxa_corte"):
+            if campo in dados:
+                setattr(self, campo, type(getattr(self, campo))(dados[campo]))
+
+    def como_dict(self) -> Dict:
+        return {
+            "ttft_ms": self.ttft_ms, "token_ms": self.token_ms, "jitter": self.jitter, "tokens": self.tokens,
+            "taxa_erro": self.taxa_erro, "status_erro": self.status_erro, "taxa_corte": self.taxa_corte,
+            "requisicoes": self.requisicoes, "erros": self.erros,
+        }
+
+
+def gerar_tokens(mensagens: List[Dict], quantidade: int) -> List[str]:
+    """
+    Gera tokens determinísticos: a mesma conversa sempre produz a mesma resposta.
+    """
+    ultima = mensagens[-1].get("content", "") if mensagens else ""
+    semente = int(hashlib.sha256(ultima.encode("utf-8")).hexdigest()[:8], 16)
+    palavras = RESPOSTA_BASE.split(" ")
+    inicio = semente % len(palavras)
+    return [palavras[(inicio + i) % len(palavras)] + " " for i in range(quantidade)]
+
+
+def resposta_nao_streaming(mensagens: List[Dict]) -> str:
+    """
+    Respostas curtas para as chamadas auxiliares do chat (extração de perfil em JSON e papel).
+    """
+    prompt = " ".join(m.get("content", "") for m in mensagens).lower()
+    if "json" in prompt:
+        return "{}"
+    if "titular" in prompt or "responsavel" in prompt or "responsável" in prompt:
+        return "titular"
+    return "".join(gerar_tokens(mensagens, 20)).strip()
+
+
+def criar_handler(config: ConfigFalso):
+    class HandlerLLMFalso(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def _json(self, status: int, dados: Dict) -> None:
+            corpo = json.dumps(dados).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def _pedaco(self, texto: str) -> None:
+            dados = texto.encode("utf-8")
+            self.wfile.write(f"{len(dados):x}\r\n".encode() + dados + b"\r\n")
+            self.wfile.flush()
+
+        def do_GET(self) -> None:
+            if self.path.rstrip("/") == "/config":
+                self._json(200, config.como_dict())
+            else:
+                self._json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self) -> None:
+            tamanho = int(self.headers.get("Content-Length") or 0)
+            try:
+                corpo = json.loads(self.rfile.read(tamanho) or b"{}")
+            except json.JSONDecodeError:
+                self._json(400, {"error": {"message": "invalid json"}})
+                return
+
+            if self.path.rstrip("/") == "/config":
+                config.atualizar(corpo)
+                self._json(200, config.como_dict())
+                return
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._json(404, {"error": {"message": "not found"}})
+                return
+
+            config.requisicoes += 1
+            if config.sortear() < config.taxa_erro:
+                config.erros += 1
+                time.sleep(config.atraso(config.ttft_ms / 2))
+                self._json(config.status_erro, {"error": {"message": "erro injetado", "type": "fake_error"}})
+                return
+
+            mensagens = corpo.get("messages") or []
+            modelo = corpo.get("model", "falso")
+            criado = int(time.time())
+
+            if not corpo.get("stream"):
+                time.sleep(config.atraso(config.ttft_ms))
+                self._json(200, {
+                    "id": "falso", "object": "chat.completion", "created": criado, "model": modelo,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": resposta_nao_streaming(mensagens)}}],
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            cortar_em = None
+            if config.sortear() < config.taxa_corte:
+                cortar_em = max(1, config.tokens // 2)
+
+            try:
+                time.sleep(config.atraso(config.ttft_ms))
+                for i, token in enumerate(gerar_tokens(mensagens, config.tokens)):
+                    if cortar_em is not None and i == cortar_em:
+                        # Simula queda de conexão no meio do stream
+                        self.close_connection = True
+                        return
+                    if i:
+                        time.sleep(config.atraso(config.token_ms))
+                    pedaco = {
+                        "id": "falso", "object": "chat.completion.chunk", "created": criado, "model": modelo,
+                        "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                    }
+                    self._pedaco(f"data: {json.dumps(pedaco)}\n\n")
+                self._pedaco("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+
+    return HandlerLLMFalso
+
+
+def iniciar_servidor(config: ConfigFalso, host: str = "127.0.0.1", porta: int = 8765) -> ThreadingHTTPServer:
+    """
+    Sobe o servidor falso em uma thread de fundo (útil para scripts que controlam o ciclo de vida).
+
+    Returns:
+        Instância do servidor (use `shutdown()` para parar)
+    """
+    servidor = ThreadingHTTPServer((host, porta), criar_handler(config))
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Servidor LLM falso (API compatível com Groq/OpenAI)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--ttft-ms", type=float, default=300, help="tempo até o primeiro token")
+    parser.add_argument("--token-ms", type=float, default=25, help="intervalo entre tokens")
+    parser.add_argument("--jitter", type=float, default=0.2, help="variação relativa dos tempos")
+    parser.add_argument("--tokens", type=int, default=60, help="tokens por resposta")
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="fração de requisições com erro HTTP")
+    parser.add_argument("--status-erro", type=int, default=503)
+    parser.add_argument("--taxa-corte", type=float, default=0.0, help="fração de streams interrompidos")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    config = ConfigFalso(args.ttft_ms, args.token_ms, args.jitter, args.tokens,
+                         args.taxa_erro, args.status_erro, args.taxa_corte, args.semente)
+    servidor = ThreadingHTTPServer((args.host, args.porta), criar_handler(config))
+    servidor.daemon_threads = True
+    print(f"[llm-falso] ouvindo em http://{args.host}:{args.porta} {config.como_dict()}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
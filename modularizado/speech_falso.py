@@ -0,0 +1,56 @@
+"""
+Reconhecedor de fala falso, com a mesma interface do ReconhecedorGoogle (transcricao.py), para
+testar /transcribe sem credenciais nem rede. Devolve um texto fixo, com latência configurável
+e proporcional ao tamanho do áudio, e parciais progressivas no modo streaming.
+
+Uso:
+    SPEECH_FALSO=1 SPEECH_FALSO_TEXTO="quero tirar o cpf" uvicorn api:app
+    curl -F "file=@audio.wav;type=audio/wav" "http://localhost:8000/transcribe?parcial=1"
+"""
+import time
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+from config import SPEECH_FALSO_TEXTO, SPEECH_FALSO_LATENCIA_MS, SPEECH_FALSO_MS_POR_KB
+
+
+class ReconhecedorFalso:
+    """
+    Atributos:
+        texto: Transcrição devolvida (ou `transcrever(audio) -> str`, para variar por áudio)
+        latencia_ms: Tempo fixo de cada reconhecimento (ida e volta ao serviço)
+        ms_por_kb: Tempo de processamento por KB de áudio
+        pedacos_por_parcial: No streaming, a cada quantos pedaços sai uma parcial
+    """
+
+    def __init__(self, texto: str = SPEECH_FALSO_TEXTO, latencia_ms: float = SPEECH_FALSO_LATENCIA_MS,
+                 ms_por_kb: float = SPEECH_FALSO_MS_POR_KB, pedacos_por_parcial: int = 4,
+                 transcrever: Optional[Callable[[bytes], str]] = None) -> None:
+        self.texto = texto
+        self.latencia_ms = latencia_ms
+        self.ms_por_kb = ms_por_kb
+        self.pedacos_por_parcial = pedacos_por_parcial
+        self.transcrever = transcrever
+        self.chamadas = 0
+
+    def _processar(self, tamanho: int) -> None:
+        time.sleep(tamanho / 1024 * self.ms_por_kb / 1000)
+
+    def reconhecer(self, audio: bytes, formato=None) -> str:
+        self.chamadas += 1
+        time.sleep(self.latencia_ms / 1000)
+        self._processar(len(audio))
+        return self.transcrever(audio) if self.transcrever else self.texto
+
+    def reconhecer_stream(self, pedacos: Iterable[bytes], formato=None) -> Iterator[Tuple[str, bool]]:
+        self.chamadas += 1
+        palavras = self.texto.split()
+        recebido = bytearray() if self.transcrever else None
+        for n, pedaco in enumerate(pedacos, start=1):
+            self._processar(len(pedaco))
+            if recebido is not None:
+                recebido.extend(pedaco)
+            if n % self.pedacos_por_parcial == 0:
+                # Parcial cresce uma palavra a cada grupo de pedaços, sem chegar ao texto inteiro
+                yield " ".join(palavras[:min(len(palavras) - 1, n // self.pedacos_por_parcial)]), False
+        time.sleep(self.latencia_ms / 1000)
+        yield (self.transcrever(bytes(recebido)) if recebido is not None else self.texto), True
@@ -0,0 +1,14 @@
+"""
+Configuração dos testes: os módulos do projeto são importados como no uvicorn (`from config import ...`),
+então a pasta modularizado entra no sys.path. Nada aqui acessa a rede externa.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("GROQ_API_KEY", "falsa")
+os.environ.setdefault("AQUECIMENTO", "0")
+os.environ.setdefault("LOG_NIVEL", "WARNING")
+# /transcribe usa o reconhecedor falso (speech_falso.py): sem credenciais nem rede do Google
+os.environ.setdefault("SPEECH_FALSO", "1")
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+import compressao_contexto
+
+
+class EmbeddingFalso:
+    """Conta as frases enviadas ao modelo e devolve vetores determinísticos."""
+
+    def __init__(self):
+        self.frases = []
+
+    def __call__(self, frases):
+        self.frases.extend(frases)
+        return [np.full(4, len(f), dtype=np.float32) for f in frases]
+
+
+@pytest.fixture
+def embedding(monkeypatch):
+    falso = EmbeddingFalso()
+    monkeypatch.setattr(compressao_contexto, "funcao_embedding", lambda: falso)
+    monkeypatch.setattr(compressao_contexto, "_cache_frases", compressao_contexto.OrderedDict())
+    return falso
+
+
+def test_frases_repetidas_nao_voltam_ao_modelo(embedding):
+    primeiro = compressao_contexto.embeddar_frases(["RG é gratuito.", "Leve foto."])
+    segundo = compressao_contexto.embeddar_frases(["Leve foto.", "Agende antes.", "RG é gratuito."])
+
+    assert embedding.frases == ["RG é gratuito.", "Leve foto.", "Agende antes."]
+    assert np.array_equal(segundo[0], primeiro[1])
+    assert np.array_equal(segundo[2], primeiro[0])
+
+
+def test_cache_descarta_as_menos_usadas(embedding, monkeypatch):
+    monkeypatch.setattr(compressao_contexto, "COMPRESSAO_CACHE_FRASES", 2)
+    compressao_contexto.embeddar_frases(["a", "b"])
+    compressao_contexto.embeddar_frases(["a", "c"])
+    compressao_contexto.embeddar_frases(["a", "b"])
+
+    assert embedding.frases == ["a", "b", "c", "b"]
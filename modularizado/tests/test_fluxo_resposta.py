@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pytest
+
+from fluxo_resposta import agrupar_pedacos
+
+
+def stream_falso(roteiro):
+    """Produz os deltas do roteiro; números são pausas em segundos."""
+    for passo in roteiro:
+        if isinstance(passo, str):
+            yield passo
+        else:
+            time.sleep(passo)
+
+
+def cronometrar(pedacos):
+    inicio = time.monotonic()
+    return [(pedaco, time.monotonic() - inicio) for pedaco in pedacos]
+
+
+def test_primeiro_delta_sai_na_hora():
+    recebidos = cronometrar(agrupar_pedacos(stream_falso(["Olá", 0.2, " mundo"]), max_bytes=64, max_ms=20))
+    assert recebidos[0][0] == "Olá"
+    assert recebidos[0][1] < 0.1
+
+
+def test_delta_antes_de_pausa_sai_no_prazo():
+    roteiro = ["Para", " tirar", " o", 0.4, " RG", " leve"]
+    recebidos = cronometrar(agrupar_pedacos(stream_falso(roteiro), max_bytes=64, max_ms=20))
+    assert "".join(p for p, _ in recebidos) == "Para tirar o RG leve"
+    # " tirar o" fica retido no máximo ~20 ms, não durante a pausa inteira do modelo
+    segundo, quando = recebidos[1]
+    assert segundo == " tirar o"
+    assert quando < 0.2
+
+
+def test_agrupa_por_tamanho():
+    recebidos = [p for p, _ in cronometrar(agrupar_pedacos(iter(["a"] + ["bb"] * 10), max_bytes=8, max_ms=1000))]
+    assert recebidos[0] == "a"
+    assert all(len(p) >= 8 for p in recebidos[1:-1])
+    assert "".join(recebidos) == "a" + "bb" * 10
+
+
+def test_erro_do_stream_e_propagado():
+    def quebrado():
+        yield "a"
+        raise RuntimeError("queda do provedor")
+
+    with pytest.raises(RuntimeError):
+        list(agrupar_pedacos(quebrado()))
+
+
+def test_consumidor_desiste_e_o_stream_e_fechado():
+    fechado = threading.Event()
+
+    def infinito():
+        try:
+            while True:
+                yield "x"
+                time.sleep(0.005)
+        finally:
+            fechado.set()
+
+    pedacos = agrupar_pedacos(infinito())
+    next(pedacos)
+    pedacos.close()
+    assert fechado.wait(1)
@@ -0,0 +1,55 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from etapas import GrafoEtapas
+from instrumentacao import TemposTurno, medir_etapa
+
+
+def busca_falsa(tempos):
+    with medir_etapa("busca", tempos):
+        with medir_etapa("embedding", tempos):
+            pass
+        for _ in range(2):
+            with medir_etapa("chroma_query", tempos):
+                pass
+
+
+def test_etapas_internas_levam_o_nome_da_pai():
+    tempos = TemposTurno()
+    busca_falsa(tempos)
+    with tempos.medir("compressao"):
+        pass
+    assert list(tempos.como_dict()) == ["busca.embedding", "busca.chroma_query", "busca", "compressao"]
+
+
+def test_etapas_do_grafo_aninham_nas_threads_do_pool():
+    tempos = TemposTurno()
+    grafo = GrafoEtapas()
+    grafo.adicionar("contexto", lambda _: busca_falsa(tempos))
+    grafo.adicionar("historico", lambda _: threading.current_thread().name)
+    resultados = grafo.executar()
+    for nome, ms in grafo.tempos.items():
+        tempos.registrar(nome, ms / 1000)
+
+    assert resultados["historico"].startswith("pool-etapas")
+    assert set(tempos.como_dict()) == {
+        "contexto.busca.embedding", "contexto.busca.chroma_query", "contexto.busca", "contexto", "historico",
+    }
+    ms = tempos.como_dict()
+    assert ms["contexto.busca"] <= ms["contexto"]
+
+
+def test_grafo_com_executor_sem_copia_de_contexto():
+    tempos = TemposTurno()
+    with ThreadPoolExecutor(2) as executor:
+        grafo = GrafoEtapas(executor)
+        grafo.adicionar("contexto", lambda _: busca_falsa(tempos))
+        grafo.executar()
+    assert "contexto.busca" in tempos.como_dict()
+
+
+def test_server_timing_com_nomes_aninhados():
+    tempos = TemposTurno()
+    tempos.registrar("contexto", 0.035)
+    tempos.registrar("contexto.busca", 0.0331)
+    assert tempos.server_timing() == "contexto;dur=35.0, contexto.busca;dur=33.1"
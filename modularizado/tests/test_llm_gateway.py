@@ -0,0 +1,114 @@
+import time
+
+import groq
+import pytest
+
+import llm_gateway
+from llm_gateway import DisjuntorCircuito, GatewayLLM
+from servidor_llm_falso import ConfigFalso, iniciar_servidor
+
+MENSAGENS = [{"role": "user", "content": "como tirar o rg?"}]
+
+
+@pytest.fixture
+def servidor():
+    config = ConfigFalso(ttft_ms=0, token_ms=5, jitter=0, tokens=20)
+    servidor = iniciar_servidor(config, porta=0)
+    yield config, f"http://127.0.0.1:{servidor.server_address[1]}"
+    servidor.shutdown()
+
+
+def gateway_para(url: str, **kwargs) -> GatewayLLM:
+    kwargs.setdefault("hedge", False)
+    return GatewayLLM(api_key="falsa", base_url=url, **kwargs)
+
+
+def abrir_meio_aberto(gateway: GatewayLLM) -> None:
+    gateway.disjuntor = DisjuntorCircuito(limite_falhas=1, tempo_aberto=0.05)
+    gateway.disjuntor.registrar_falha()
+    time.sleep(0.06)
+    assert gateway.disjuntor.estado == "meio_aberto"
+
+
+def test_teste_abandonado_libera_o_circuito(servidor):
+    _, url = servidor
+    gateway = gateway_para(url)
+    abrir_meio_aberto(gateway)
+
+    pedacos = gateway.stream(MENSAGENS)
+    assert next(pedacos)
+    # Cliente desconectou no meio da chamada de teste: nem sucesso, nem falha
+    pedacos.close()
+
+    assert gateway.disjuntor.estado == "meio_aberto"
+    assert "".join(gateway.stream(MENSAGENS))
+    assert gateway.disjuntor.estado == "fechado"
+
+
+def test_erro_depois_do_primeiro_token_conta_como_falha(servidor, monkeypatch):
+    _, url = servidor
+    gateway = gateway_para(url)
+    abrir_meio_aberto(gateway)
+
+    pedacos = gateway.stream(MENSAGENS)
+    next(pedacos)
+    with pytest.raises(ValueError):
+        pedacos.throw(ValueError("erro ao processar o pedaço"))
+
+    assert gateway.disjuntor.estado == "aberto"
+    time.sleep(0.06)
+    assert gateway.disjuntor.permitir() == "teste"
+
+
+def test_completar_com_erro_inesperado_libera_o_teste(servidor, monkeypatch):
+    _, url = servidor
+    gateway = gateway_para(url)
+    abrir_meio_aberto(gateway)
+
+    def quebrar(**_):
+        raise ValueError("resposta inesperada")
+
+    monkeypatch.setattr(gateway._cliente.chat.completions, "create", quebrar)
+    with pytest.raises(ValueError):
+        gateway.completar(MENSAGENS)
+    assert gateway.disjuntor.estado == "aberto"
+    time.sleep(0.06)
+    assert gateway.disjuntor.permitir() == "teste"
+
+
+def test_tentativa_atrasada_fecha_o_proprio_stream(servidor, monkeypatch):
+    config, url = servidor
+    config.ttft_ms = 400
+    reivindicacoes = []
+
+    class CorridaEspiada(llm_gateway._CorridaHedge):
+        def reivindicar(self, resultado) -> bool:
+            ganhou = super().reivindicar(resultado)
+            reivindicacoes.append(ganhou)
+            return ganhou
+
+    monkeypatch.setattr(llm_gateway, "_CorridaHedge", CorridaEspiada)
+    fechados = []
+    gateway = gateway_para(url, tentativas=1)
+    original = gateway._cliente.chat.completions.create
+
+    def criar(**kwargs):
+        # A conexão da tentativa sobrevive ao prazo do chamador (ex.: hedge disparado depois, ou o
+        # provedor mandando bytes sem conteúdo): o timeout de leitura dela ainda não venceu
+        kwargs["timeout"] = 5
+        stream = original(**kwargs)
+        fechar = stream.close
+        stream.close = lambda: (fechados.append(stream), fechar())
+        return stream
+
+    monkeypatch.setattr(gateway._cliente.chat.completions, "create", criar)
+
+    with pytest.raises(groq.APITimeoutError):
+        list(gateway.stream(MENSAGENS, prazo=0.1))
+
+    # O primeiro token chega depois que o chamador desistiu: a tentativa não pode vencer e fecha o stream
+    limite = time.monotonic() + 3
+    while not fechados and time.monotonic() < limite:
+        time.sleep(0.02)
+    assert reivindicacoes == [False]
+    assert len(fechados) == 1
@@ -0,0 +1,60 @@
+import pytest
+
+from localidades import Localidade, carregar_municipios, resolver_localidade
+
+
+@pytest.mark.parametrize("texto", [
+    "para mim",
+    "Quero tirar o RG para meu filho",
+    "o natal chegou",
+])
+def test_palavras_comuns_nao_viram_lugar(texto):
+    assert resolver_localidade(texto) == Localidade()
+
+
+@pytest.mark.parametrize("texto", ["Moro no Pará", "moro no para", "sou do estado do Pará"])
+def test_estado_para_com_pista(texto):
+    assert resolver_localidade(texto) == Localidade(uf="PA")
+
+
+@pytest.mark.parametrize("texto", ["moro em curitba", "moro em Curitiba", "Curitiba"])
+def test_tolera_erro_de_digitacao(texto):
+    assert resolver_localidade(texto) == Localidade("Curitiba", "PR")
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("Moro em Palmas PR", Localidade("Palmas", "PR")),
+    ("moro em palmas, pr", Localidade("Palmas", "PR")),
+    ("Palmas/TO", Localidade("Palmas", "TO")),
+    # Sem UF, o nome repetido resolve para a capital
+    ("Moro em Palmas", Localidade("Palmas", "TO")),
+])
+def test_uf_desempata_cidades_homonimas(texto, esperado):
+    assert resolver_localidade(texto) == esperado
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("quero saber se posso", Localidade()),
+    ("tenho 30 anos e moro em am", Localidade()),
+    ("vou lá se der, moro em SE", Localidade(uf="SE")),
+    ("moro em Manaus, AM", Localidade("Manaus", "AM")),
+    ("Recife/pe", Localidade("Recife", "PE")),
+])
+def test_siglas_que_sao_palavras_comuns(texto, esperado):
+    assert resolver_localidade(texto) == esperado
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("moro em goiana", Localidade("Goiana", "PE")),
+    ("moro em goiania", Localidade("Goiânia", "GO")),
+    ("Moro em Goiânia", Localidade("Goiânia", "GO")),
+    ("sou goiana e preciso do RG", Localidade()),
+])
+def test_homografos_nao_sao_corrigidos_entre_si(texto, esperado):
+    assert resolver_localidade(texto) == esperado
+
+
+def test_carregar_municipios_ignora_comentarios(tmp_path):
+    caminho = tmp_path / "municipios.tsv"
+    caminho.write_text("# UF<TAB>nome\n\nPE\tRecife\nsp\tSorocaba \n", encoding="utf-8")
+    assert carregar_municipios(str(caminho)) == [("Recife", "PE"), ("Sorocaba", "SP")]
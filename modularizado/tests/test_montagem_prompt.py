@@ -0,0 +1,48 @@
+import logging
+
+import pytest
+
+import montagem_prompt
+from logs import FiltroAmostragem
+from montagem_prompt import montar_contexto_prompt
+
+
+class Coletor(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.registros = []
+
+    def emit(self, record):
+        self.registros.append(record)
+
+
+@pytest.fixture
+def registros():
+    coletor = Coletor()
+    raiz = logging.getLogger("chatbot")
+    nivel = raiz.level
+    raiz.setLevel(logging.INFO)
+    montagem_prompt.logger.addHandler(coletor)
+    yield coletor.registros
+    montagem_prompt.logger.removeHandler(coletor)
+    raiz.setLevel(nivel)
+
+
+def test_tamanho_do_prompt_sai_em_info_por_secao(registros):
+    trechos = [{"texto": "Para tirar o RG, leve a certidão de nascimento.", "distancia": 0.3}]
+    resultado = montar_contexto_prompt(
+        "Como tiro o RG?", {"localidade": "Recife, PE"}, ["Como tiro o RG?"], trechos,
+        [{"nome": "Poupatempo", "link": "https://maps.google.com/?q=poupatempo"}],
+        [("Oi", "Olá! Como posso ajudar?")],
+    )
+
+    [registro] = [r for r in registros if r.getMessage() == "prompt montado"]
+    assert registro.levelno == logging.INFO
+    # DEBUG é amostrado; INFO passa sempre, mesmo com LOG_AMOSTRA_DEBUG=0
+    assert FiltroAmostragem(0.0).filter(registro)
+    assert registro.tokens == resultado["tokens"]
+    for secao, tokens in resultado["secoes"].items():
+        assert getattr(registro, f"tokens_{secao}") == tokens
+    assert registro.tokens_documentos > 0
+    assert registro.tokens_pergunta > 0
+    assert registro.trechos == "1/1"
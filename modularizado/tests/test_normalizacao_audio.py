@@ -0,0 +1,53 @@
+import io
+
+import numpy as np
+import pytest
+
+import normalizacao_audio
+from normalizacao_audio import TAXA_ALVO, codificar, normalizar_pcm
+from segmentacao_audio import ler_cabecalho_wav
+
+
+def tom(segundos: float, taxa: int, amplitude: float = 0.3) -> np.ndarray:
+    t = np.arange(int(segundos * taxa)) / taxa
+    return amplitude * np.sin(2 * np.pi * 440 * t)
+
+
+def pcm16(amostras: np.ndarray, canais: int = 1) -> bytes:
+    return (np.repeat(amostras, canais) * 32767).astype("<i2").tobytes()
+
+
+def test_flac_quando_soundfile_disponivel():
+    soundfile = pytest.importorskip("soundfile")
+    amostras = tom(1.0, TAXA_ALVO)
+    dados, encoding = codificar(amostras)
+    assert encoding == "FLAC"
+    assert dados[:4] == b"fLaC"
+    decodificado, taxa = soundfile.read(io.BytesIO(dados), dtype="int16")
+    assert taxa == TAXA_ALVO
+    assert np.array_equal(decodificado, (amostras * 32767).astype("<i2"))
+
+
+def test_wav_sem_soundfile(monkeypatch):
+    monkeypatch.setattr(normalizacao_audio, "soundfile", None)
+    dados, encoding = codificar(tom(1.0, TAXA_ALVO))
+    assert encoding == "LINEAR16"
+    cabecalho = ler_cabecalho_wav(dados)
+    assert (cabecalho.sample_rate, cabecalho.canais, cabecalho.bits) == (TAXA_ALVO, 1, 16)
+
+
+def test_estereo_48k_vira_mono_16k_sem_silencio_nas_pontas(monkeypatch):
+    monkeypatch.setattr(normalizacao_audio, "soundfile", None)
+    silencio = np.zeros(48000)
+    pcm = pcm16(np.concatenate((silencio, tom(1.0, 48000), silencio)), canais=2)
+
+    dados, encoding = normalizar_pcm(pcm, 48000, 2)
+    cabecalho = ler_cabecalho_wav(dados)
+    segundos = (len(dados) - cabecalho.inicio_dados) / 2 / TAXA_ALVO
+    assert (encoding, cabecalho.sample_rate, cabecalho.canais) == ("LINEAR16", TAXA_ALVO, 1)
+    # 1 s de fala + as margens (MARGEM_SILENCIO_MS) dos 2 s de silêncio
+    assert segundos == pytest.approx(1.4, abs=0.05)
+
+
+def test_so_silencio_nao_vai_ao_reconhecimento():
+    assert normalizar_pcm(bytes(32000), TAXA_ALVO, 1) == (b"", "LINEAR16")
@@ -0,0 +1,35 @@
+"""
+Orçamento de cold start: roda o relatorio_inicializacao.py como no deploy, para que uma importação pesada
+nova no caminho da API (ex.: um SDK carregado no topo de um módulo) quebre os testes.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from relatorio_inicializacao import ORCAMENTO_PADRAO_MS
+
+PASTA = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def rodar_relatorio(*args):
+    return subprocess.run(
+        [sys.executable, "relatorio_inicializacao.py", "--json", *args],
+        cwd=PASTA, capture_output=True, text=True, timeout=120,
+    )
+
+
+def test_importar_api_cabe_no_orcamento():
+    processo = rodar_relatorio("--orcamento-ms", str(ORCAMENTO_PADRAO_MS), "--repeticoes", "3")
+    relatorio = json.loads(processo.stdout)
+    assert processo.returncode == 0, (
+        f"import api levou {relatorio['import_ms_mediana']} ms (orçamento {ORCAMENTO_PADRAO_MS:.0f} ms); "
+        f"mais lentos: {relatorio['pacotes_ms']}"
+    )
+    assert relatorio["dentro_do_orcamento"]
+
+
+def test_relatorio_falha_acima_do_orcamento():
+    processo = rodar_relatorio("--orcamento-ms", "1", "--repeticoes", "1")
+    assert processo.returncode == 1
+    assert not json.loads(processo.stdout)["dentro_do_orcamento"]
@@ -0,0 +1,152 @@
+import asyncio
+import io
+import random
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import transcricao
+from segmentacao_audio import SegmentadorWav, ler_cabecalho_wav, para_wav, ponto_de_corte
+from speech_falso import ReconhecedorFalso
+
+TAXA = 16000
+
+
+def fala(segundos: float, amplitude: float = 0.3) -> np.ndarray:
+    t = np.arange(int(segundos * TAXA)) / TAXA
+    return amplitude * np.sin(2 * np.pi * 440 * t)
+
+
+def silencio(segundos: float) -> np.ndarray:
+    return np.zeros(int(segundos * TAXA))
+
+
+def pcm(*trechos: np.ndarray) -> bytes:
+    return (np.concatenate(trechos) * 32767).astype("<i2").tobytes()
+
+
+def segmentar(audio: bytes, max_s: float, bloco: int = 4096):
+    segmentador = SegmentadorWav(max_s=max_s)
+    wav = para_wav(audio, TAXA)
+    segmentos = []
+    for inicio in range(0, len(wav), bloco):
+        segmentos += segmentador.adicionar(wav[inicio:inicio + bloco])
+    return segmentos + segmentador.finalizar(), segmentador
+
+
+def duracao(segmento: bytes) -> float:
+    return len(segmento) / 2 / TAXA
+
+
+def test_corta_no_silencio_mais_longo():
+    amostras = np.concatenate((fala(3), silencio(0.4), fala(2), silencio(1.0), fala(3)))
+    corte = ponto_de_corte(amostras, TAXA, max_s=10)
+    # Meio do silêncio de 1 s (5,4 s a 6,4 s), não o de 0,4 s
+    assert corte / TAXA == pytest.approx(5.9, abs=0.05)
+
+
+def test_segmentador_corta_nos_silencios_durante_o_upload():
+    audio = pcm(fala(3), silencio(0.4), fala(2), silencio(1.0), fala(3), silencio(0.6), fala(4))
+    segmentos, segmentador = segmentar(audio, max_s=8)
+    # Cortes no meio dos silêncios de 1 s (5,9 s) e de 0,6 s (9,7 s); o resto sai no finalizar
+    assert [duracao(s) for s in segmentos] == pytest.approx([5.9, 3.8, 4.3], abs=0.05)
+    assert b"".join(segmentos) == audio
+    assert segmentador.duracao_s == pytest.approx(14.0, abs=0.01)
+
+
+def test_sem_silencio_corta_no_maximo():
+    segmentos, _ = segmentar(pcm(fala(25)), max_s=10)
+    assert [round(duracao(s), 2) for s in segmentos] == [10.0, 10.0, 5.0]
+
+
+def test_silencio_abaixo_do_minimo_nao_e_ponto_de_corte():
+    # Pausas de 150 ms (abaixo de VAD_SILENCIO_MIN_MS) entre palavras: corta no máximo
+    palavras = [t for _ in range(10) for t in (fala(0.85), silencio(0.15))]
+    segmentos, _ = segmentar(pcm(*palavras), max_s=4)
+    assert [round(duracao(s), 2) for s in segmentos] == [4.0, 4.0, 2.0]
+
+
+def test_segmentos_sem_voz_sao_descartados():
+    audio = pcm(fala(3), silencio(20), fala(3))
+    segmentos, segmentador = segmentar(audio, max_s=10)
+    # 0-6,5 s (fala + metade do silêncio), dois segmentos de 5 s só de silêncio descartados, 16,5-26 s
+    assert len(segmentos) == segmentador.segmentos == 2
+    assert [duracao(s) for s in segmentos] == pytest.approx([6.5, 9.5], abs=0.1)
+    assert segmentador.duracao_s == pytest.approx(26, abs=0.01)
+    assert all(np.abs(np.frombuffer(s, "<i2")).max() > 1000 for s in segmentos)
+
+
+def test_wav_invalido():
+    with pytest.raises(ValueError):
+        SegmentadorWav().adicionar(b"RIFF\x00\x00\x00\x00WAVX" + bytes(64))
+
+
+class ReconhecedorLento(ReconhecedorFalso):
+    """
+    Cada segmento tem amplitude própria (0,1 x número do segmento); o reconhecedor devolve esse número
+    depois de um atraso aleatório e registra quantos reconhecimentos estavam em andamento ao mesmo tempo.
+    """
+
+    def __init__(self, semente: int = 7) -> None:
+        super().__init__(latencia_ms=0, ms_por_kb=0)
+        self._aleatorio = random.Random(semente)
+        self._lock = threading.Lock()
+        self.em_andamento = 0
+        self.maximo = 0
+
+    def reconhecer(self, audio: bytes, formato=None) -> str:
+        with self._lock:
+            self.chamadas += 1
+            self.em_andamento += 1
+            self.maximo = max(self.maximo, self.em_andamento)
+            atraso = self._aleatorio.uniform(0.01, 0.12)
+        try:
+            time.sleep(atraso)
+            if formato.encoding == "FLAC":
+                import soundfile
+                amostras, _ = soundfile.read(io.BytesIO(audio), dtype="int16")
+            else:
+                cabecalho = ler_cabecalho_wav(audio)
+                amostras = np.frombuffer(audio[cabecalho.inicio_dados:], "<i2")
+            return f"s{round(np.abs(amostras).max() / 32767 * 10)}"
+        finally:
+            with self._lock:
+                self.em_andamento -= 1
+
+
+@pytest.fixture
+def reconhecedor(monkeypatch):
+    falso = ReconhecedorLento()
+    monkeypatch.setattr(transcricao, "_reconhecedor", falso)
+    monkeypatch.setattr(transcricao, "SegmentadorWav", lambda: SegmentadorWav(max_s=3))
+    return falso
+
+
+def audio_em_segmentos(quantidade: int) -> bytes:
+    trechos = [t for i in range(1, quantidade + 1) for t in (fala(2.4, amplitude=i / 10), silencio(0.4))]
+    return para_wav(pcm(*trechos), TAXA)
+
+
+async def _blocos(dados: bytes, tamanho: int = 8192):
+    for inicio in range(0, len(dados), tamanho):
+        yield dados[inicio:inicio + tamanho]
+
+
+def test_transcricoes_na_ordem_do_audio(reconhecedor):
+    textos = asyncio.run(transcricao.transcrever_segmentado(_blocos(audio_em_segmentos(8)), paralelismo=8))
+    assert textos == [f"s{i}" for i in range(1, 9)]
+    assert reconhecedor.chamadas == 8
+
+
+def test_no_maximo_paralelismo_em_andamento(reconhecedor):
+    textos = asyncio.run(transcricao.transcrever_segmentado(_blocos(audio_em_segmentos(8)), paralelismo=3))
+    assert textos == [f"s{i}" for i in range(1, 9)]
+    assert reconhecedor.maximo == 3
+
+
+def test_audio_vazio(reconhecedor):
+    with pytest.raises(transcricao.ErroTranscricao) as erro:
+        asyncio.run(transcricao.transcrever_segmentado(_blocos(b"")))
+    assert erro.value.status == 400
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import threading
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import transcricao
+from api import app
+from segmentacao_audio import para_wav
+from speech_falso import ReconhecedorFalso
+from transcricao import TAMANHO_PEDACO_AUDIO, FilaAudio
+
+TAXA = 16000
+
+
+def wav_com_fala(segundos: float = 1.0) -> bytes:
+    t = np.arange(int(segundos * TAXA)) / TAXA
+    return para_wav((0.3 * np.sin(2 * np.pi * 440 * t) * 32767).astype("<i2").tobytes(), TAXA)
+
+
+def eventos_sse(corpo: str):
+    eventos = []
+    for bloco in corpo.strip().split("\n\n"):
+        linhas = dict(linha.split(": ", 1) for linha in bloco.splitlines())
+        eventos.append((linhas["event"], json.loads(linhas["data"])))
+    return eventos
+
+
+@pytest.fixture
+def reconhecedor(monkeypatch):
+    falso = ReconhecedorFalso(texto="quero tirar o cpf", latencia_ms=0, ms_por_kb=0)
+    monkeypatch.setattr(transcricao, "_reconhecedor", falso)
+    return falso
+
+
+@pytest.fixture(scope="module")
+def cliente():
+    # Sem o `with`: o startup (ingestão dos documentos) não roda
+    return TestClient(app)
+
+
+def test_multipart_wav(cliente, reconhecedor):
+    resposta = cliente.post("/transcribe", files={"file": ("audio.wav", wav_com_fala(), "audio/wav")})
+    assert resposta.status_code == 200
+    assert resposta.json() == {"text": "quero tirar o cpf"}
+    assert reconhecedor.chamadas == 1
+
+
+def test_multipart_sem_arquivo(cliente, reconhecedor):
+    resposta = cliente.post("/transcribe", files={"outro": ("a.ogg", b"x", "audio/ogg")})
+    assert resposta.status_code == 400
+
+
+def test_corpo_audio_em_blocos_chega_inteiro(cliente, reconhecedor):
+    reconhecedor.transcrever = lambda audio: f"{len(audio)} bytes"
+    blocos = [bytes([i]) * 10000 for i in range(7)]
+    resposta = cliente.post("/transcribe", content=iter(blocos), headers={"Content-Type": "audio/ogg"})
+    assert resposta.status_code == 200
+    assert resposta.json() == {"text": "70000 bytes"}
+
+
+def test_formato_nao_suportado(cliente, reconhecedor):
+    resposta = cliente.post("/transcribe", content=b"abc", headers={"Content-Type": "audio/aac"})
+    assert resposta.status_code == 400
+
+
+def test_sse_parciais_final_e_done(cliente, reconhecedor):
+    reconhecedor.pedacos_por_parcial = 2
+    corpo = bytes(5 * TAMANHO_PEDACO_AUDIO)
+    resposta = cliente.post("/transcribe?parcial=1", content=corpo, headers={"Content-Type": "audio/ogg"})
+    assert resposta.headers["content-type"].startswith("text/event-stream")
+
+    eventos = eventos_sse(resposta.text)
+    assert [tipo for tipo, _ in eventos] == ["partial", "partial", "final", "done"]
+    assert [dados["text"] for _, dados in eventos[:2]] == ["quero", "quero tirar"]
+    assert eventos[2][1] == {"text": "quero tirar o cpf"}
+    assert eventos[3][1] == {"text": "quero tirar o cpf"}
+
+
+def test_sse_erro_do_reconhecedor_vira_evento(cliente, monkeypatch):
+    class ReconhecedorQuebrado(ReconhecedorFalso):
+        def reconhecer_stream(self, pedacos, formato=None):
+            yield "quero", False
+            raise RuntimeError("conexão perdida")
+
+    monkeypatch.setattr(transcricao, "_reconhecedor", ReconhecedorQuebrado(latencia_ms=0, ms_por_kb=0))
+    resposta = cliente.post("/transcribe?parcial=1", content=bytes(1000), headers={"Content-Type": "audio/ogg"})
+
+    eventos = eventos_sse(resposta.text)
+    assert [tipo for tipo, _ in eventos] == ["partial", "error"]
+    assert eventos[1][1]["status"] == 500
+    assert "conexão perdida" in eventos[1][1]["detail"]
+
+
+def test_sse_audio_vazio(cliente, reconhecedor):
+    resposta = cliente.post("/transcribe?parcial=1", content=b"", headers={"Content-Type": "audio/ogg"})
+    assert eventos_sse(resposta.text) == [("error", {"status": 400, "detail": "Arquivo de áudio vazio."})]
+
+
+def test_fila_limita_o_audio_em_memoria():
+    async def cenario():
+        fila = FilaAudio(max_pedacos=2)
+        lidos = []
+
+        async def upload():
+            for i in range(20):
+                lidos.append(i)
+                yield bytes(TAMANHO_PEDACO_AUDIO)
+
+        alimentacao = asyncio.create_task(fila.alimentar(upload()))
+        await asyncio.sleep(0.1)
+        # Sem consumo, o upload para de ser lido: 2 pedaços na fila + 1 esperando vaga
+        parado_em = len(lidos)
+        assert fila._fila.qsize() == 2
+        assert parado_em == 3
+
+        recebidos = await asyncio.to_thread(lambda: list(fila.pedacos()))
+        await alimentacao
+        return recebidos
+
+    recebidos = asyncio.run(cenario())
+    assert len(recebidos) == 20
+    assert all(len(p) == TAMANHO_PEDACO_AUDIO for p in recebidos)
+
+
+def test_fila_reparte_blocos_grandes():
+    async def cenario():
+        fila = FilaAudio()
+
+        async def upload():
+            yield bytes(int(2.5 * TAMANHO_PEDACO_AUDIO))
+
+        await fila.alimentar(upload())
+        return [len(p) for p in fila.pedacos()], fila.total_bytes
+
+    tamanhos, total = asyncio.run(cenario())
+    assert tamanhos == [TAMANHO_PEDACO_AUDIO, TAMANHO_PEDACO_AUDIO, TAMANHO_PEDACO_AUDIO // 2]
+    assert total == int(2.5 * TAMANHO_PEDACO_AUDIO)
+
+
+def test_cancelar_libera_upload_e_reconhecimento():
+    async def cenario():
+        fila = FilaAudio(max_pedacos=1)
+
+        async def upload():
+            while True:
+                yield bytes(TAMANHO_PEDACO_AUDIO)
+
+        alimentacao = asyncio.create_task(fila.alimentar(upload()))
+        await asyncio.sleep(0.05)
+        consumidor_terminou = threading.Event()
+
+        def consumir():
+            next(fila.pedacos())
+            fila.cancelar()
+            for _ in fila.pedacos():
+                pass
+            consumidor_terminou.set()
+
+        await asyncio.to_thread(consumir)
+        await asyncio.wait_for(alimentacao, timeout=1)
+        return consumidor_terminou.is_set()
+
+    assert asyncio.run(cenario())
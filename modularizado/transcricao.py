@@ -0,0 +1,347 @@
+"""
+Módulo de transcrição de áudio (Speech-to-Text).
+O áudio é enviado ao reconhecimento em streaming, em pedaços, à medida que chega do upload:
+a memória por requisição fica limitada à fila de pedaços e as transcrições parciais podem
+ser repassadas ao cliente antes do fim do áudio.
+
+WAV (PCM 16 bits) sem parciais segue outro caminho: é cortado nos silêncios (segmentacao_audio.py)
+e os segmentos são reconhecidos em paralelo, então um áudio de 1 minuto leva mais ou menos o tempo
+do seu segmento mais longo. Antes de ir para o serviço, o WAV vira mono a 16 kHz sem silêncio nas
+pontas (normalizacao_audio.py); nos outros formatos a taxa e os canais vêm do cabeçalho do arquivo.
+
+O reconhecedor é escolhido uma vez por processo: o do Google (cliente único, reaproveitado
+entre requisições) ou, com SPEECH_FALSO=1, o falso local de speech_falso.py.
+"""
+import asyncio
+import os
+import queue
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, Tuple
+
+from config import SPEECH_FALSO, TRANSCRICAO_PARALELISMO
+from executores import pool
+from logs import obter_logger
+from metricas import registro
+from normalizacao_audio import (
+    BYTES_CABECALHO, TAXA_ALVO, NormalizadorWavStream, ler_taxa_e_canais, normalizar_pcm,
+)
+from segmentacao_audio import SegmentadorWav
+
+logger = obter_logger("transcricao")
+_bytes_audio = registro.contador("transcricao_bytes_total", "Bytes de áudio recebidos do cliente e enviados ao Speech-to-Text")
+
+# Cada StreamingRecognizeRequest leva no máximo isto de áudio (o limite do Google é 25 KB)
+TAMANHO_PEDACO_AUDIO = 16 * 1024
+# Pedaços esperando o reconhecimento; com o upload mais rápido que o Google, o upload espera
+FILA_MAX_PEDACOS = 32
+
+# Tipo MIME do upload -> nome do AudioEncoding do Speech-to-Text
+ENCODINGS = {
+    "audio/webm": "WEBM_OPUS",
+    "audio/ogg": "OGG_OPUS",
+    "audio/opus": "OGG_OPUS",
+    "audio/wav": "LINEAR16",
+    "audio/x-wav": "LINEAR16",
+    "audio/wave": "LINEAR16",
+    "audio/flac": "FLAC",
+    "audio/mpeg": "MP3",
+    "audio/mp3": "MP3",
+}
+
+
+class ErroTranscricao(Exception):
+    """Erro da transcrição com o status HTTP a devolver."""
+
+    def __init__(self, status: int, detalhe: str) -> None:
+        super().__init__(detalhe)
+        self.status = status
+        self.detalhe = detalhe
+
+
+@dataclass
+class FormatoAudio:
+    encoding: str
+    sample_rate: Optional[int] = None
+    canais: int = 1
+
+
+def formato_do_mime(mime: str) -> FormatoAudio:
+    """
+    Raises:
+        ErroTranscricao: formato não suportado (400)
+    """
+    encoding = ENCODINGS.get((mime or "").split(";")[0].strip().lower())
+    if encoding is None:
+        raise ErroTranscricao(400, f"Formato de áudio não suportado: {mime}. Use webm/ogg opus, wav, flac ou mp3.")
+    # Taxa e canais vêm do cabeçalho do arquivo (formato_do_cabecalho)
+    return FormatoAudio(encoding)
+
+
+def formato_do_cabecalho(formato: FormatoAudio, inicio: bytes) -> FormatoAudio:
+    """Completa o formato com a taxa de amostragem e os canais lidos do começo do arquivo."""
+    lido = ler_taxa_e_canais(inicio, formato.encoding)
+    if lido is None:
+        # Sem cabeçalho legível: Opus é decodificado a 48 kHz; nos outros o serviço detecta sozinho
+        opus = formato.encoding in ("WEBM_OPUS", "OGG_OPUS")
+        return FormatoAudio(formato.encoding, 48000 if opus else None, formato.canais)
+    return FormatoAudio(formato.encoding, *lido)
+
+
+class ReconhecedorGoogle:
+    """Speech-to-Text do Google com um SpeechClient único por processo."""
+
+    def _config(self, formato: FormatoAudio):
+        from servicos_google import modulo_speech
+        speech = modulo_speech()
+        return speech.RecognitionConfig(
+            encoding=getattr(speech.RecognitionConfig.AudioEncoding, formato.encoding),
+            language_code="pt-BR",
+            enable_automatic_punctuation=True,
+            audio_channel_count=formato.canais,
+            sample_rate_hertz=formato.sample_rate,
+        )
+
+    def reconhecer(self, audio: bytes, formato: FormatoAudio) -> str:
+        """Reconhecimento síncrono de um áudio curto (até ~1 minuto)."""
+        from servicos_google import modulo_speech, cliente_speech
+        speech = modulo_speech()
+        resposta = cliente_speech().recognize(config=self._config(formato), audio=speech.RecognitionAudio(content=audio))
+        return " ".join(r.alternatives[0].transcript for r in resposta.results if r.alternatives).strip()
+
+    def reconhecer_stream(self, pedacos: Iterable[bytes], formato: FormatoAudio) -> Iterator[Tuple[str, bool]]:
+        """
+        Reconhecimento em streaming: consome os pedaços de áudio conforme chegam.
+
+        Yields:
+            (texto, final): transcrições parciais (final=False) e de cada trecho concluído (final=True)
+        """
+        from servicos_google import modulo_speech, cliente_speech
+        speech = modulo_speech()
+        config = speech.StreamingRecognitionConfig(config=self._config(formato), interim_results=True)
+        requisicoes = (speech.StreamingRecognizeRequest(audio_content=pedaco) for pedaco in pedacos)
+        for resposta in cliente_speech().streaming_recognize(config=config, requests=requisicoes):
+            for resultado in resposta.results:
+                if resultado.alternatives:
+                    yield resultado.alternatives[0].transcript, resultado.is_final
+
+
+_reconhecedor = None
+
+
+def obter_reconhecedor():
+    global _reconhecedor
+    if _reconhecedor is None:
+        if SPEECH_FALSO:
+            from speech_falso import ReconhecedorFalso
+            _reconhecedor = ReconhecedorFalso()
+        else:
+            _reconhecedor = ReconhecedorGoogle()
+    return _reconhecedor
+
+
+def verificar_credenciais() -> None:
+    """
+    Raises:
+        ErroTranscricao: Speech-to-Text real sem GOOGLE_APPLICATION_CREDENTIALS (500)
+    """
+    if not SPEECH_FALSO and not os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
+        raise ErroTranscricao(500, "GOOGLE_APPLICATION_CREDENTIALS não configurada para Speech-to-Text.")
+
+
+class FilaAudio:
+    """
+    Ponte entre o upload (event loop) e o reconhecimento (thread do pool): fila limitada de pedaços.
+    O lado assíncrono nunca bloqueia o loop; se a fila está cheia, espera sem ocupar thread.
+    """
+
+    _FIM = object()
+
+    def __init__(self, max_pedacos: int = FILA_MAX_PEDACOS) -> None:
+        self._fila: queue.Queue = queue.Queue(maxsize=max_pedacos)
+        self.total_bytes = 0
+        self.cancelada = False
+
+    async def colocar(self, pedaco) -> None:
+        while True:
+            try:
+                self._fila.put_nowait(pedaco)
+                return
+            except queue.Full:
+                if self.cancelada:
+                    return
+                await asyncio.sleep(0.005)
+
+    async def alimentar(self, origem: AsyncIterator[bytes]) -> None:
+        """Lê a origem, reparte em pedaços de até TAMANHO_PEDACO_AUDIO e fecha a fila no fim."""
+        try:
+            async for bloco in origem:
+                for inicio in range(0, len(bloco), TAMANHO_PEDACO_AUDIO):
+                    if self.cancelada:
+                        return
+                    pedaco = bloco[inicio:inicio + TAMANHO_PEDACO_AUDIO]
+                    self.total_bytes += len(pedaco)
+                    await self.colocar(pedaco)
+        finally:
+            await self.colocar(self._FIM)
+
+    def pedacos(self) -> Iterator[bytes]:
+        """Consumido na thread do reconhecimento."""
+        while True:
+            pedaco = self._fila.get()
+            if pedaco is self._FIM:
+                return
+            yield pedaco
+
+    def cancelar(self) -> None:
+        self.cancelada = True
+        # Desbloqueia o reconhecimento se ele estiver esperando pedaço
+        try:
+            self._fila.put_nowait(self._FIM)
+        except queue.Full:
+            pass
+
+
+async def ler_upload(upload, tamanho: int = TAMANHO_PEDACO_AUDIO) -> AsyncIterator[bytes]:
+    """Lê um UploadFile em blocos, sem carregar o arquivo inteiro, e o fecha no fim."""
+    try:
+        while True:
+            bloco = await upload.read(tamanho)
+            if not bloco:
+                return
+            yield bloco
+    finally:
+        await upload.close()
+
+
+async def ler_inicio(origem: AsyncIterator[bytes], tamanho: int = BYTES_CABECALHO) -> bytes:
+    """Lê da origem ao menos `tamanho` bytes (ou até ela acabar), para achar o cabeçalho do áudio."""
+    inicio = bytearray()
+    while len(inicio) < tamanho:
+        bloco = await anext(origem, None)
+        if bloco is None:
+            break
+        inicio.extend(bloco)
+    return bytes(inicio)
+
+
+def _reconhecer_segmento(reconhecedor, pcm: bytes, sample_rate: int, canais: int) -> str:
+    """Normaliza (na thread do pool, fora do event loop) e reconhece um segmento."""
+    dados, encoding = normalizar_pcm(pcm, sample_rate, canais)
+    if not dados:
+        return ""
+    _bytes_audio.incrementar(len(dados), {"etapa": "enviado"})
+    return reconhecedor.reconhecer(dados, FormatoAudio(encoding, TAXA_ALVO))
+
+
+async def transcrever_stream(origem: AsyncIterator[bytes], formato: FormatoAudio) -> AsyncIterator[Tuple[str, bool]]:
+    """
+    Transcreve o áudio enquanto ele chega: o upload alimenta a fila no event loop e o
+    reconhecimento roda no pool de transcrição.
+
+    Yields:
+        (texto, final) na ordem devolvida pelo reconhecedor
+    """
+    origem = aiter(origem)
+    inicio = await ler_inicio(origem)
+    # Sem nenhum byte não há o que mandar ao reconhecimento
+    if not inicio:
+        raise ErroTranscricao(400, "Arquivo de áudio vazio.")
+    _bytes_audio.incrementar(len(inicio), {"etapa": "recebido"})
+
+    normalizador = None
+    if formato.encoding == "LINEAR16":
+        # WAV vai normalizado, como PCM mono a 16 kHz sem cabeçalho
+        normalizador = NormalizadorWavStream()
+        formato = FormatoAudio("LINEAR16", TAXA_ALVO)
+        try:
+            inicio = normalizador.processar(inicio)
+        except ValueError as e:
+            raise ErroTranscricao(400, f"Áudio WAV inválido: {e}")
+    else:
+        formato = formato_do_cabecalho(formato, inicio)
+
+    async def audio() -> AsyncIterator[bytes]:
+        yield inicio
+        async for bloco in origem:
+            _bytes_audio.incrementar(len(bloco), {"etapa": "recebido"})
+            yield normalizador.processar(bloco) if normalizador else bloco
+
+    fila = FilaAudio()
+    alimentacao = asyncio.create_task(fila.alimentar(audio()))
+    try:
+        reconhecimento = obter_reconhecedor().reconhecer_stream(fila.pedacos(), formato)
+        async for texto, final in pool("transcricao").iterar(reconhecimento):
+            yield texto, final
+        await alimentacao
+        _bytes_audio.incrementar(fila.total_bytes, {"etapa": "enviado"})
+        logger.debug("áudio transcrito", extra={"encoding": formato.encoding, "bytes": fila.total_bytes})
+    finally:
+        fila.cancelar()
+        if not alimentacao.done():
+            alimentacao.cancel()
+
+
+async def transcrever_segmentado(origem: AsyncIterator[bytes], paralelismo: int = TRANSCRICAO_PARALELISMO) -> List[str]:
+    """
+    Transcreve um WAV PCM 16 bits cortado nos silêncios: cada segmento é reconhecido assim que
+    fica pronto (no máximo `paralelismo` de uma vez, no pool de transcrição), ainda durante o upload.
+
+    Returns:
+        list: Transcrição de cada segmento, na ordem do áudio
+
+    Raises:
+        ErroTranscricao: áudio vazio ou WAV inválido (400)
+    """
+    reconhecedor = obter_reconhecedor()
+    segmentador = SegmentadorWav()
+    semaforo = asyncio.Semaphore(paralelismo)
+    tarefas: List[asyncio.Task] = []
+    total_bytes = 0
+
+    async def reconhecer(segmento: bytes) -> str:
+        cabecalho = segmentador.cabecalho
+        async with semaforo:
+            return await pool("transcricao").executar(
+                _reconhecer_segmento, reconhecedor, segmento, cabecalho.sample_rate, cabecalho.canais
+            )
+
+    def disparar(segmentos: List[bytes]) -> None:
+        tarefas.extend(asyncio.create_task(reconhecer(segmento)) for segmento in segmentos)
+
+    try:
+        try:
+            async for bloco in origem:
+                total_bytes += len(bloco)
+                _bytes_audio.incrementar(len(bloco), {"etapa": "recebido"})
+                disparar(segmentador.adicionar(bloco))
+            if not total_bytes:
+                raise ErroTranscricao(400, "Arquivo de áudio vazio.")
+            disparar(segmentador.finalizar())
+        except ValueError as e:
+            raise ErroTranscricao(400, f"Áudio WAV inválido: {e}")
+        textos = await asyncio.gather(*tarefas)
+    finally:
+        for tarefa in tarefas:
+            tarefa.cancel()
+    logger.debug("áudio segmentado transcrito", extra={
+        "segmentos": segmentador.segmentos, "duracao_s": round(segmentador.duracao_s, 1), "bytes": total_bytes,
+    })
+    return list(textos)
+
+
+async def transcrever(origem: AsyncIterator[bytes], formato: FormatoAudio) -> str:
+    """
+    Transcrição completa: WAV PCM é segmentado e reconhecido em paralelo; os outros formatos
+    juntam os trechos finais do streaming.
+
+    Raises:
+        ErroTranscricao: áudio vazio ou inválido (400) ou transcrição vazia (500)
+    """
+    if formato.encoding == "LINEAR16":
+        finais = await transcrever_segmentado(origem)
+    else:
+        finais = [texto async for texto, final in transcrever_stream(origem, formato) if final]
+    texto = " ".join(t.strip() for t in finais if t.strip())
+    if not texto:
+        raise ErroTranscricao(500, "Transcrição vazia retornada pelo Speech-to-Text.")
+    return texto